@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""Size and scan speed of columnar log archives compared with JSONL.
+
+Writes ``--rows`` synthetic log entries as JSONL, gzipped JSONL and a
+``log_archive`` archive, then times two analytics queries on each:
+
+* ``fake_by_threat``: Fake detections in one quarter, grouped by threat level
+* ``latency_p95``: p95 ``processing_time_ms`` of live detections
+
+JSONL has to be read and parsed in full for every query. The archive query
+opens the archive cold and memory-maps only the columns it needs.
+
+    python benchmarks/bench_log_archive.py --rows 1000000
+"""
+
+import argparse
+import gzip
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_log_store import synthetic_entries  # noqa: E402
+from log_archive import LogArchive, write_archive  # noqa: E402
+
+Q_START = datetime(2025, 4, 1)
+Q_END = datetime(2025, 6, 30, 23, 59, 59)
+
+
+def size_of(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def jsonl_fake_by_threat(path, opener=open):
+    low, high = Q_START.isoformat(), Q_END.isoformat()
+    counts = {}
+    with opener(path, "rt") as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry["prediction"] == "Fake" and low <= entry["timestamp"] <= high:
+                counts[entry["threat_level"]] = counts.get(entry["threat_level"], 0) + 1
+    return counts
+
+
+def jsonl_latency_p95(path, opener=open):
+    values = []
+    with opener(path, "rt") as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry["source_type"] == "live":
+                values.append(entry["processing_time_ms"])
+    return round(statistics.quantiles(values, n=100)[94], 2)
+
+
+def archive_fake_by_threat(path):
+    return LogArchive(path).group_count("threat_level", prediction="Fake", start=Q_START, end=Q_END)
+
+
+def archive_latency_p95(path):
+    return LogArchive(path).quantiles("processing_time_ms", (0.95,), source_type="live")["p95"]
+
+
+def timed(fn, *args, repeat=3):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_log_archive_")
+    try:
+        jsonl_path = os.path.join(workdir, "detection_logs.jsonl")
+        gzip_path = jsonl_path + ".gz"
+        archive_path = os.path.join(workdir, "bench.logarc")
+        with open(jsonl_path, "w") as f:
+            for entry in synthetic_entries(args.rows):
+                f.write(json.dumps(entry) + "\n")
+        with open(jsonl_path, "rb") as src, gzip.open(gzip_path, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        started = time.perf_counter()
+        write_archive(archive_path, synthetic_entries(args.rows))
+        build_s = time.perf_counter() - started
+
+        jsonl_size = size_of(jsonl_path)
+        report = {
+            "rows": args.rows,
+            "archive_build_s": round(build_s, 3),
+            "bytes": {
+                "jsonl": jsonl_size,
+                "jsonl_gzip": size_of(gzip_path),
+                "archive": size_of(archive_path),
+            },
+            "queries": [],
+        }
+        report["bytes"]["archive_vs_jsonl"] = round(report["bytes"]["archive"] / jsonl_size, 3)
+
+        cases = [
+            ("fake_by_threat", jsonl_fake_by_threat, archive_fake_by_threat),
+            ("latency_p95", jsonl_latency_p95, archive_latency_p95),
+        ]
+        for name, jsonl_query, archive_query in cases:
+            jsonl_s, expected = timed(jsonl_query, jsonl_path, repeat=args.repeat)
+            archive_s, actual = timed(archive_query, archive_path, repeat=args.repeat)
+            report["queries"].append({
+                "query": name,
+                "jsonl_ms": round(jsonl_s * 1000, 2),
+                "archive_ms": round(archive_s * 1000, 2),
+                "speedup": round(jsonl_s / archive_s, 1) if archive_s else None,
+                "jsonl_result": expected,
+                "archive_result": actual,
+            })
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""Query latency of the local forensic log stores at different history sizes.
+
+Builds a synthetic log of N entries per size in a temporary directory and
+times the queries ``GET /api/logs`` issues: first page, user filter, source
+filter, date range and a deep page. SQLite is measured at every size; the
+JSONL store reads the whole file per query, so it is only measured up to
+``--jsonl-max`` entries.
+
+    python benchmarks/bench_log_store.py --sizes 10000,1000000,10000000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from log_store import JsonlLogStore, SqliteLogStore  # noqa: E402
+
+USERS = [f"user-{i}" for i in range(50)]
+SOURCES = ["upload", "live"]
+START = datetime(2025, 1, 1)
+
+
+def synthetic_entries(count, seed=0):
+    rng = random.Random(seed)
+    step = timedelta(days=365) / max(count, 1)
+    for i in range(count):
+        fake = rng.random() > 0.5
+        yield {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "timestamp": (START + step * i).isoformat(),
+            "filename": f"{uuid.UUID(int=rng.getrandbits(128))}_sample.jpg",
+            "prediction": "Fake" if fake else "Real",
+            "confidence": round(rng.uniform(50, 100), 2),
+            "threat_level": rng.choice(["low", "medium", "high"]),
+            "model_used": "Verifixia AI Xception v2.4.1",
+            "model_version": "Xception v2.4.1",
+            "processing_time_ms": round(rng.uniform(20, 400), 2),
+            "latency_ms": round(rng.uniform(20, 400), 2),
+            "session_id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "source_type": rng.choice(SOURCES),
+            "user_id": rng.choice(USERS),
+        }
+
+
+def build_sqlite(path, count):
+    store = SqliteLogStore(path)
+    batch = []
+    for entry in synthetic_entries(count):
+        batch.append(entry)
+        if len(batch) >= 50000:
+            store.insert_many(batch)
+            batch = []
+    if batch:
+        store.insert_many(batch)
+    return store
+
+
+def build_jsonl(path, count):
+    with open(path, "w") as f:
+        for entry in synthetic_entries(count):
+            f.write(json.dumps(entry) + "\n")
+    return JsonlLogStore(path)
+
+
+def scenarios():
+    mid = (START + timedelta(days=180)).isoformat()
+    week_later = (START + timedelta(days=187)).isoformat()
+    return {
+        "first_page": {},
+        "user_filter": {"user_id": USERS[7]},
+        "source_filter": {"source_type": "live"},
+        "date_range_week": {"start_date": mid, "end_date": week_later},
+        "deep_page_offset_5000": {"offset": 5000},
+    }
+
+
+def time_query(store, params, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        store.query(limit=50, **params)
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "min_ms": round(min(samples), 3),
+        "max_ms": round(max(samples), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,1000000,10000000")
+    parser.add_argument("--jsonl-max", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = {"generated_at": datetime.utcnow().isoformat(), "results": []}
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in [int(s) for s in args.sizes.split(",") if s]:
+            backends = [("sqlite", build_sqlite, os.path.join(workdir, f"logs_{size}.sqlite3"))]
+            if size <= args.jsonl_max:
+                backends.append(("jsonl", build_jsonl, os.path.join(workdir, f"logs_{size}.jsonl")))
+            for name, builder, path in backends:
+                started = time.perf_counter()
+                store = builder(path, size)
+                build_s = time.perf_counter() - started
+                row = {
+                    "backend": name,
+                    "entries": size,
+                    "build_s": round(build_s, 2),
+                    "queries": {
+                        label: time_query(store, params, args.repeat)
+                        for label, params in scenarios().items()
+                    },
+                }
+                report["results"].append(row)
+                print(json.dumps(row), flush=True)
+                del store
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(path + suffix):
+                        os.remove(path + suffix)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Detection-log insert throughput against Postgres: single-row vs batched.
+
+Inserts ``--rows`` rows into ``detection_logs`` in three ways and reports
+rows/s for each:
+
+* ``single``: one ``INSERT ... RETURNING`` per row (``save_detection_log``)
+* ``batched``: multi-row ``execute_values`` inserts of ``--batch-size`` rows
+* ``batcher``: ``--threads`` concurrent callers going through
+  ``DetectionLogBatcher``, as uploads do
+
+Rows are tagged with a run id and deleted afterwards.
+
+    DATABASE_URL=postgresql://localhost/postgres python benchmarks/bench_neon_inserts.py --rows 5000
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from neon_db import DetectionLogBatcher, NeonDB  # noqa: E402
+
+
+def make_rows(run_id, mode, count):
+    return [
+        {
+            "filename": f"bench-{run_id}-{mode}-{i}.jpg",
+            "prediction": "Fake" if i % 3 else "Real",
+            "confidence": (i % 100) / 100.0,
+            "user_id": None,
+        }
+        for i in range(count)
+    ]
+
+
+def bench_single(db, rows):
+    started = time.perf_counter()
+    for row in rows:
+        db.save_detection_log(**row)
+    return time.perf_counter() - started
+
+
+def bench_batched(db, rows, batch_size):
+    started = time.perf_counter()
+    for start in range(0, len(rows), batch_size):
+        db.save_detection_logs(rows[start:start + batch_size])
+    return time.perf_counter() - started
+
+
+def bench_batcher(db, rows, batch_size, delay_ms, threads):
+    batcher = DetectionLogBatcher(db, batch_size=batch_size, max_delay_ms=delay_ms)
+    chunks = [rows[i::threads] for i in range(threads)]
+    ids = []
+    lock = threading.Lock()
+
+    def caller(chunk):
+        for row in chunk:
+            result = batcher.submit(row).result(timeout=60)
+            with lock:
+                ids.append(result["id"])
+
+    workers = [threading.Thread(target=caller, args=(chunk,)) for chunk in chunks]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    batcher.stop()
+    if len(set(ids)) != len(rows):
+        raise SystemExit(f"batcher returned {len(set(ids))} distinct ids for {len(rows)} rows")
+    return elapsed, batcher.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--delay-ms", type=int, default=20, help="Batcher max delay")
+    parser.add_argument("--threads", type=int, default=32, help="Concurrent callers in batcher mode")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    db = NeonDB()
+    if db.pool is None:
+        raise SystemExit("Set DATABASE_URL to a reachable Postgres")
+    db.create_tables()
+    run_id = uuid.uuid4().hex[:8]
+
+    report = {"rows": args.rows, "batch_size": args.batch_size, "results": []}
+    try:
+        elapsed = bench_single(db, make_rows(run_id, "single", args.rows))
+        report["results"].append({"mode": "single", "seconds": round(elapsed, 3), "rows_per_s": round(args.rows / elapsed, 1)})
+
+        elapsed = bench_batched(db, make_rows(run_id, "batched", args.rows), args.batch_size)
+        report["results"].append({"mode": "batched", "seconds": round(elapsed, 3), "rows_per_s": round(args.rows / elapsed, 1)})
+
+        elapsed, stats = bench_batcher(db, make_rows(run_id, "batcher", args.rows), args.batch_size, args.delay_ms, args.threads)
+        report["results"].append({
+            "mode": "batcher",
+            "threads": args.threads,
+            "seconds": round(elapsed, 3),
+            "rows_per_s": round(args.rows / elapsed, 1),
+            "avg_batch_size": stats["avg_batch_size"],
+        })
+    finally:
+        deleted = db.execute_update("DELETE FROM detection_logs WHERE filename LIKE %s", (f"bench-{run_id}-%",))
+        report["cleaned_up_rows"] = deleted
+        report["pool"] = db.pool.stats()
+        db.close()
+
+    single = report["results"][0]["rows_per_s"] if report["results"] else None
+    for row in report["results"]:
+        if single:
+            row["speedup_vs_single"] = round(row["rows_per_s"] / single, 2)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""Check Firestore log totals and their cache against an in-process fake.
+
+Runs ``FirebaseService.get_forensic_logs`` on a minimal fake Firestore
+passed as ``firestore_client``, so neither firebase-admin nor the emulator
+is needed. It checks that:
+
+* ``total`` matches the stored documents for each filter
+* a repeated query inside ``total_cache_ttl_s`` is served from the cache,
+  without a count aggregation
+* writes, deletes and clears by a user drop that user's and the unfiltered
+  totals, and leave other users' cached totals alone
+* a write from outside this worker shows up once the TTL has expired
+* ``include_total=False`` never counts, and cursor paging returns every
+  document once
+
+Exits with status 1 when a check fails.
+
+    python benchmarks/check_firestore_totals.py
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from firebase_service import FirebaseService  # noqa: E402
+from pagination import decode_cursor  # noqa: E402
+
+# ----------------------------------------------------------------- fake Firestore
+
+OPS = {
+    "==": lambda a, b: a == b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "<=": lambda a, b: a is not None and a <= b,
+}
+
+
+class FakeSnapshot:
+    def __init__(self, ref, data):
+        self.reference = ref
+        self.id = ref.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocument:
+    def __init__(self, store, doc_id):
+        self._store = store
+        self.id = doc_id
+
+    def set(self, payload, merge=False):
+        if merge and self.id in self._store.docs:
+            self._store.docs[self.id].update(payload)
+        else:
+            self._store.docs[self.id] = dict(payload)
+
+    def get(self):
+        return FakeSnapshot(self, self._store.docs.get(self.id))
+
+    def delete(self):
+        self._store.docs.pop(self.id, None)
+
+
+class FakeCount:
+    def __init__(self, value):
+        self.value = value
+
+
+class FakeAggregate:
+    def __init__(self, query):
+        self._query = query
+
+    def get(self):
+        self._query.store.count_queries += 1
+        return [[FakeCount(len(self._query._matching()))]]
+
+
+class FakeQuery:
+    def __init__(self, store, filters=(), order=(), after=None, skip=0, limit=None):
+        self.store = store
+        self._filters = tuple(filters)
+        self._order = tuple(order)
+        self._after = after
+        self._skip = skip
+        self._limit = limit
+
+    def _copy(self, **changes):
+        state = {
+            "filters": self._filters, "order": self._order, "after": self._after,
+            "skip": self._skip, "limit": self._limit,
+        }
+        state.update(changes)
+        return FakeQuery(self.store, **state)
+
+    def where(self, field, op, value):
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self._copy(order=self._order + ((field, direction),))
+
+    def start_after(self, values):
+        return self._copy(after=values)
+
+    def offset(self, count):
+        return self._copy(skip=count)
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def select(self, fields):
+        return self
+
+    def count(self, alias=None):
+        return FakeAggregate(self)
+
+    def _matching(self):
+        return [
+            (doc_id, data) for doc_id, data in self.store.docs.items()
+            if all(OPS[op](data.get(field), value) for field, op, value in self._filters)
+        ]
+
+    def stream(self):
+        self.store.stream_queries += 1
+        rows = self._matching()
+        # Every sort key descends in the queries the service issues, and
+        # Firestore breaks remaining ties on the document id in that direction.
+        fields = [field for field, _ in self._order if field != "__name__"] + ["__name__"]
+
+        def key(row):
+            return tuple(row[0] if field == "__name__" else row[1].get(field) for field in fields)
+
+        rows.sort(key=key, reverse=True)
+        if self._after is not None:
+            bound = tuple(self._after[field] for field, _ in self._order)
+            rows = [row for row in rows if key(row)[:len(bound)] < bound]
+        rows = rows[self._skip:]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        return [FakeSnapshot(FakeDocument(self.store, doc_id), data) for doc_id, data in rows]
+
+
+class FakeCollection(FakeQuery):
+    def document(self, doc_id=None):
+        return FakeDocument(self.store, doc_id or uuid.uuid4().hex)
+
+
+class FakeBatch:
+    def __init__(self):
+        self._ops = []
+
+    def set(self, ref, payload, merge=False):
+        self._ops.append(lambda: ref.set(payload, merge=merge))
+
+    def delete(self, ref):
+        self._ops.append(ref.delete)
+
+    def commit(self):
+        for op in self._ops:
+            op()
+
+
+class FakeStore:
+    def __init__(self):
+        self.docs = {}
+        self.count_queries = 0
+        self.stream_queries = 0
+
+
+class FakeFirestore:
+    """Only what FirebaseService uses: one collection, filters, ordering, batches and count()."""
+
+    def __init__(self):
+        self._collections = {}
+
+    def collection(self, name):
+        return FakeCollection(self._collections.setdefault(name, FakeStore()))
+
+    def batch(self):
+        return FakeBatch()
+
+    def store(self, name):
+        return self._collections.setdefault(name, FakeStore())
+
+
+# ----------------------------------------------------------------- checks
+
+START = datetime(2025, 1, 1)
+
+
+def log_entry(i, user_id, source_type="upload"):
+    return {
+        "id": f"log-{i:05d}",
+        "timestamp": (START + timedelta(minutes=i)).isoformat(),
+        "filename": f"sample-{i}.jpg",
+        "prediction": "Fake" if i % 2 else "Real",
+        "confidence": 50 + i % 50,
+        "source_type": source_type,
+        "user_id": user_id,
+    }
+
+
+def run(entries, ttl_s):
+    fake = FakeFirestore()
+    service = FirebaseService(firestore_client=fake, total_cache_ttl_s=ttl_s, write_parallelism=2)
+    logs = fake.store("forensic_logs")
+    alice, bob = {"uid": "alice"}, {"uid": "bob"}
+    checks = []
+
+    def check(name, ok, **details):
+        checks.append({"check": name, "ok": bool(ok), **details})
+
+    def total(user=None, **filters):
+        return service.get_forensic_logs(page_size=10, user=user, **filters)["total"]
+
+    def counted(fn):
+        before = logs.count_queries
+        value = fn()
+        return value, logs.count_queries - before
+
+    service.save_forensic_logs([log_entry(i, "alice" if i % 3 else "bob", "live" if i % 5 == 0 else "upload")
+                                for i in range(entries)])
+    expected = {
+        "all": entries,
+        "alice": sum(1 for i in range(entries) if i % 3),
+        "alice_live": sum(1 for i in range(entries) if i % 3 and i % 5 == 0),
+    }
+
+    value, queries = counted(lambda: total())
+    check("total, no filter", value == expected["all"] and queries == 1, total=value, expected=expected["all"])
+    value, queries = counted(lambda: total(alice))
+    check("total, user filter", value == expected["alice"] and queries == 1, total=value, expected=expected["alice"])
+    value, _ = counted(lambda: total(alice, source_type="live"))
+    check("total, user and source filter", value == expected["alice_live"], total=value, expected=expected["alice_live"])
+    day = (START + timedelta(minutes=entries // 2)).isoformat()
+    value, _ = counted(lambda: total(start_date=day))
+    in_range = sum(1 for i in range(entries) if log_entry(i, None)["timestamp"] >= day)
+    check("total, date filter", value == in_range, total=value, expected=in_range)
+
+    value, queries = counted(lambda: total(alice))
+    check("repeat within TTL is cached", value == expected["alice"] and queries == 0, count_queries=queries)
+
+    service.save_forensic_log(log_entry(entries, "bob"), user=bob)
+    _, alice_queries = counted(lambda: total(alice))
+    value, all_queries = counted(lambda: total())
+    check("write by bob keeps alice's total cached", alice_queries == 0, count_queries=alice_queries)
+    check("write by bob drops the unfiltered total", value == entries + 1 and all_queries == 1, total=value)
+
+    service.delete_forensic_log("log-00001", user=alice)
+    value, queries = counted(lambda: total(alice))
+    check("delete drops the user's total", value == expected["alice"] - 1 and queries == 1, total=value)
+    check("delete of another user's log is refused", not service.delete_forensic_log("log-00000", user=alice))
+
+    cleared = service.clear_forensic_logs(user=alice)
+    value, queries = counted(lambda: total(alice))
+    check("clear drops the user's total", cleared == expected["alice"] - 1 and value == 0 and queries == 1,
+          cleared=cleared, total=value)
+    value = total()
+    check("clear drops the unfiltered total", value == entries + 1 - expected["alice"], total=value)
+
+    # Another worker writes straight to Firestore: stale until the TTL runs out.
+    before = total(bob)
+    FakeDocument(logs, "external").set(log_entry(entries + 1, "bob"))
+    stale, queries = counted(lambda: total(bob))
+    check("outside write is not seen within TTL", stale == before and queries == 0, total=stale)
+    time.sleep(ttl_s + 0.05)
+    fresh, queries = counted(lambda: total(bob))
+    check("outside write is seen after TTL", fresh == before + 1 and queries == 1, total=fresh)
+
+    _, queries = counted(lambda: service.get_forensic_logs(page_size=10, include_total=False))
+    check("include_total=False does not count", queries == 0, count_queries=queries)
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        page = service.get_forensic_logs(page_size=7, cursor=cursor, include_total=False)
+        seen.extend(item["id"] for item in page["items"])
+        pages += 1
+        if not page["next_cursor"]:
+            break
+        cursor = decode_cursor(page["next_cursor"])
+    check("cursor paging returns every document once", len(seen) == len(set(seen)) == len(logs.docs),
+          pages=pages, seen=len(seen), stored=len(logs.docs))
+
+    stats = service.total_cache_stats()
+    return {
+        "entries": entries,
+        "ttl_s": ttl_s,
+        "cache": stats,
+        "checks": checks,
+        "ok": all(item["ok"] for item in checks),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1200, help="Logs stored before the checks")
+    parser.add_argument("--ttl", type=float, default=0.5, help="total_cache_ttl_s of the service under test")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = run(args.entries, args.ttl)
+    for item in report["checks"]:
+        print(f"{'ok  ' if item['ok'] else 'FAIL'} {item['check']}", file=sys.stderr)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if not report["ok"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""HTTP load test of /api/upload, /api/logs and /api/live-events.
+
+Replays the images in ``DATA/Real`` and ``DATA/Fake``, plus optional
+synthetic large images (``--large-images``) and videos (``--videos``), as a
+weighted mix of requests (``--mix upload=6,logs=3,live=1``) for
+``--duration`` seconds.
+
+* Closed loop (default): ``--concurrency`` clients, each sending its next
+  request as soon as the previous one returns.
+* Open loop (``--rate``): requests start on a fixed schedule of ``--rate``
+  per second, whether or not the server keeps up. Latency is measured from
+  the scheduled start, so queueing shows in the tail instead of silently
+  lowering the load.
+
+The JSON report has throughput, p50/p95/p99/max latency and error rate per
+endpoint and overall, plus the git commit; ``--compare`` adds the change
+against an earlier report. Runs against ``--url``, or with ``--in-process``
+against the app started in this process with Firebase and Neon disabled and
+every data file in a scratch directory.
+
+    python benchmarks/loadtest.py --in-process --duration 30 --concurrency 8 --output before.json
+    python benchmarks/loadtest.py --url http://localhost:3001 --rate 20 --duration 60 --compare before.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from loadtest_live_events import make_event  # noqa: E402
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DEFAULT_DATA_DIR = os.path.join(BACKEND_DIR, "..", "DATA")
+ENDPOINTS = ("upload", "logs", "live")
+
+
+# ----------------------------------------------------------------- payloads
+
+def load_dataset(data_dir, limit):
+    """(filename, bytes, mimetype) for up to ``limit`` images from DATA/Real and DATA/Fake."""
+    payloads = []
+    for label in ("Real", "Fake"):
+        folder = os.path.join(data_dir, label)
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith((".jpg", ".jpeg", ".png")):
+                with open(os.path.join(folder, name), "rb") as f:
+                    payloads.append((name, f.read(), "image/png" if name.lower().endswith(".png") else "image/jpeg"))
+    random.Random(0).shuffle(payloads)
+    return payloads[:limit] if limit else payloads
+
+
+def synthetic_image(width, height, seed):
+    """A smooth random JPEG: upscaled noise compresses like a photo, not like static."""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    small = Image.frombytes("RGB", (32, 24), bytes(rng.randrange(256) for _ in range(32 * 24 * 3)))
+    buffer = io.BytesIO()
+    small.resize((width, height), Image.BICUBIC).save(buffer, format="JPEG", quality=90)
+    return f"synthetic_{width}x{height}_{seed}.jpg", buffer.getvalue(), "image/jpeg"
+
+
+def synthetic_video(size_mb, seed):
+    """Random bytes behind an MP4 ``ftyp`` box; the backend does not decode videos."""
+    header = b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom"
+    body = random.Random(seed).randbytes(int(size_mb * 1024 * 1024))
+    return f"synthetic_{seed}.mp4", header + body, "video/mp4"
+
+
+def multipart(field, filename, content, mimetype):
+    boundary = uuid.uuid4().hex
+    head = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: {mimetype}\r\n\r\n"
+    ).encode("utf-8")
+    return head + content + f"\r\n--{boundary}--\r\n".encode("utf-8"), f"multipart/form-data; boundary={boundary}"
+
+
+# ----------------------------------------------------------------- requests
+
+class Workload:
+    """Builds the next request of the mix; safe to call from many threads."""
+
+    def __init__(self, base_url, uploads, mix, token=None, seed=0):
+        self.base_url = base_url
+        self.uploads = uploads
+        self.endpoints = [name for name in ENDPOINTS if mix.get(name)]
+        self.weights = [mix[name] for name in self.endpoints]
+        self.headers = {"Authorization": f"Bearer {token}"} if token else {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._count = 0
+
+    def next(self):
+        with self._lock:
+            endpoint = self._rng.choices(self.endpoints, self.weights)[0]
+            self._count += 1
+            count = self._count
+            pick = self._rng.randrange(len(self.uploads)) if self.uploads else 0
+            page = self._rng.randint(1, 5)
+        headers = dict(self.headers)
+        if endpoint == "upload":
+            filename, content, mimetype = self.uploads[pick]
+            body, headers["Content-Type"] = multipart("image", filename, content, mimetype)
+            return endpoint, urllib.request.Request(f"{self.base_url}/api/upload", data=body, headers=headers, method="POST")
+        if endpoint == "logs":
+            return endpoint, urllib.request.Request(f"{self.base_url}/api/logs?page={page}&page_size=50", headers=headers)
+        headers["Content-Type"] = "application/json"
+        body = json.dumps(make_event(count)).encode("utf-8")
+        return endpoint, urllib.request.Request(f"{self.base_url}/api/live-events", data=body, headers=headers, method="POST")
+
+
+def send(request, timeout):
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as exc:
+        exc.read()
+        return exc.code
+    except (urllib.error.URLError, OSError) as exc:
+        return type(exc).__name__
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {name: [] for name in ENDPOINTS}
+        self.statuses = {name: {} for name in ENDPOINTS}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, latency_s, status):
+        with self._lock:
+            self.samples[endpoint].append(latency_s)
+            counts = self.statuses[endpoint]
+            counts[str(status)] = counts.get(str(status), 0) + 1
+
+
+def run_closed(workload, recorder, duration_s, concurrency, timeout):
+    deadline = time.perf_counter() + duration_s
+
+    def client():
+        while time.perf_counter() < deadline:
+            endpoint, request = workload.next()
+            started = time.perf_counter()
+            status = send(request, timeout)
+            recorder.record(endpoint, time.perf_counter() - started, status)
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def run_open(workload, recorder, duration_s, rate, max_in_flight, timeout):
+    """Start ``rate`` requests per second; a request that cannot start on time still counts from its slot."""
+    interval = 1.0 / rate
+    total = int(duration_s * rate)
+    in_flight = threading.BoundedSemaphore(max_in_flight)
+    dropped = 0
+
+    def fire(scheduled, endpoint, request):
+        try:
+            status = send(request, timeout)
+            recorder.record(endpoint, time.perf_counter() - scheduled, status)
+        finally:
+            in_flight.release()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        for index in range(total):
+            scheduled = started + index * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if not in_flight.acquire(timeout=timeout):
+                dropped += 1
+                continue
+            endpoint, request = workload.next()
+            pool.submit(fire, scheduled, endpoint, request)
+    return time.perf_counter() - started, dropped
+
+
+# ----------------------------------------------------------------- report
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def summarize(samples, statuses, wall_s):
+    ordered = sorted(samples)
+    requests = len(ordered)
+    errors = sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 400)
+    summary = {
+        "requests": requests,
+        "throughput_rps": round(requests / wall_s, 2) if wall_s else 0.0,
+        "error_rate": round(errors / requests, 4) if requests else 0.0,
+        "statuses": statuses,
+    }
+    if ordered:
+        summary.update({
+            "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+        })
+    return summary
+
+
+def compare(report, baseline):
+    """Percent change of throughput and tail latency against an earlier report."""
+    def change(new, old):
+        return round(100.0 * (new - old) / old, 1) if old else None
+
+    delta = {}
+    for name, current in [("overall", report["overall"])] + list(report["endpoints"].items()):
+        previous = baseline["overall"] if name == "overall" else baseline.get("endpoints", {}).get(name)
+        if not previous or not current.get("requests") or not previous.get("requests"):
+            continue
+        delta[name] = {
+            key: change(current[key], previous[key])
+            for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+            if key in current and key in previous
+        }
+        delta[name]["error_rate"] = round(current["error_rate"] - previous["error_rate"], 4)
+    return {"baseline_commit": baseline.get("commit"), "percent_change": delta}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=10,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def use_scratch_environment(prefix="verifixia-loadtest-"):
+    """Point every data file of the app at a new scratch directory and switch Firebase and Neon off.
+
+    Must run before ``app`` is imported; returns the directory.
+    """
+    scratch = tempfile.mkdtemp(prefix=prefix)
+    # Empty values win over .env, since load_dotenv does not override.
+    for name in ("FIREBASE_CREDENTIALS_PATH", "FIREBASE_CREDENTIALS_JSON", "DATABASE_URL", "NETLIFY_DATABASE_URL"):
+        os.environ[name] = ""
+    for name, relative in (
+        ("LOCAL_LOG_DIR", "detection_logs"),
+        ("LOCAL_LOG_FILE", "detection_logs.jsonl"),
+        ("LOCAL_LOG_SQLITE_PATH", "detection_logs.sqlite3"),
+        ("WRITE_BEHIND_SPOOL_DIR", "spool"),
+        ("SIMILARITY_INDEX_DIR", "similarity_index"),
+        ("JOBS_DIR", "jobs"),
+        ("STATS_FILE", "detection_stats.json"),
+        ("UPLOAD_FOLDER", "uploads"),
+    ):
+        os.environ.setdefault(name, os.path.join(scratch, relative))
+    return scratch
+
+
+def start_in_process():
+    """Serve the app from this process with external services off and data in a scratch directory."""
+    scratch = use_scratch_environment()
+
+    from werkzeug.serving import make_server
+
+    # Startup messages go to stderr so stdout stays a clean JSON report.
+    with contextlib.redirect_stdout(sys.stderr):
+        import app as backend
+
+    server = make_server("127.0.0.1", 0, backend.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}", scratch
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint {name!r}; use {', '.join(ENDPOINTS)}")
+        mix[name.strip()] = float(weight or 1)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("the mix needs at least one endpoint with a positive weight")
+    return mix
+
+
+def parse_size(text):
+    width, _, height = text.lower().partition("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:3001")
+    parser.add_argument("--in-process", action="store_true", help="Start the app in this process instead of using --url")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load")
+    parser.add_argument("--concurrency", type=int, default=8, help="Closed-loop clients")
+    parser.add_argument("--rate", type=float, help="Open-loop arrival rate in requests/s (overrides --concurrency)")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="Open loop: concurrent request cap")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("upload=6,logs=3,live=1"))
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Directory with Real/ and Fake/ images")
+    parser.add_argument("--images", type=int, default=0, help="Use at most this many dataset images (0 = all)")
+    parser.add_argument("--large-images", type=int, default=0, help="Synthetic large JPEGs added to the upload pool")
+    parser.add_argument("--large-size", type=parse_size, default=(4000, 3000), help="WIDTHxHEIGHT of synthetic images")
+    parser.add_argument("--videos", type=int, default=0, help="Synthetic videos added to the upload pool")
+    parser.add_argument("--video-mb", type=float, default=8.0)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--token", default=os.getenv("LOADTEST_TOKEN"), help="Firebase ID token sent as Bearer")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--compare", help="Earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    uploads = load_dataset(args.data_dir, args.images)
+    uploads += [synthetic_image(*args.large_size, seed=i) for i in range(args.large_images)]
+    uploads += [synthetic_video(args.video_mb, seed=i) for i in range(args.videos)]
+    if args.mix.get("upload") and not uploads:
+        parser.error(f"no images found under {args.data_dir}; add --large-images or drop upload from --mix")
+
+    server = scratch = None
+    base_url = args.url.rstrip("/")
+    if args.in_process:
+        server, base_url, scratch = start_in_process()
+
+    workload = Workload(base_url, uploads, args.mix, token=args.token, seed=args.seed)
+    recorder = Recorder()
+    dropped = 0
+    try:
+        if args.rate:
+            wall_s, dropped = run_open(workload, recorder, args.duration, args.rate, args.max_in_flight, args.timeout)
+        else:
+            wall_s = run_closed(workload, recorder, args.duration, args.concurrency, args.timeout)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    all_samples = [latency for samples in recorder.samples.values() for latency in samples]
+    all_statuses = {}
+    for statuses in recorder.statuses.values():
+        for status, count in statuses.items():
+            all_statuses[status] = all_statuses.get(status, 0) + count
+    report = {
+        "commit": git_commit(),
+        "url": base_url,
+        "in_process": args.in_process,
+        "mode": "open" if args.rate else "closed",
+        "rate_rps": args.rate,
+        "concurrency": None if args.rate else args.concurrency,
+        "duration_s": args.duration,
+        "wall_s": round(wall_s, 3),
+        "mix": args.mix,
+        "upload_pool": {
+            "dataset_images": len(uploads) - args.large_images - args.videos,
+            "large_images": args.large_images,
+            "videos": args.videos,
+        },
+        "dropped": dropped,
+        "overall": summarize(all_samples, all_statuses, wall_s),
+        "endpoints": {
+            name: summarize(recorder.samples[name], recorder.statuses[name], wall_s)
+            for name in ENDPOINTS
+            if args.mix.get(name)
+        },
+    }
+    if scratch:
+        report["scratch_dir"] = scratch
+    if args.compare:
+        with open(args.compare) as f:
+            report["comparison"] = compare(report, json.load(f))
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""Events/s through POST /api/live-events: one event per request vs bulk arrays.
+
+Sends ``--events`` synthetic live events from ``--concurrency`` threads,
+first one per request and then in arrays of ``--batch-size``, and reports
+events/s and request latency for each mode. Runs against ``--url``, or with
+``--in-process`` against the app started in this process on a free port
+(point LOCAL_LOG_DIR and friends at a scratch directory).
+
+    python benchmarks/loadtest_live_events.py --url http://localhost:3001 --events 5000 --batch-size 100
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def make_event(i):
+    return {
+        "session_id": f"loadtest-{i // 100}",
+        "source": "Load Test",
+        "event_name": "Frame Analysis",
+        "prediction": "Fake" if i % 3 == 0 else "Real",
+        "confidence": (i % 100) * 1.0,
+        "threat_level": ("low", "medium", "high")[i % 3],
+        "latency_ms": 20 + i % 50,
+    }
+
+
+def post(url, body, headers):
+    request = urllib.request.Request(url, data=json.dumps(body).encode("utf-8"), headers=headers, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as exc:
+        return exc.code
+
+
+def run(url, headers, bodies, concurrency):
+    """POST every body from ``concurrency`` threads; returns wall time, latencies and status counts."""
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    position = [0]
+
+    def worker():
+        while True:
+            with lock:
+                if position[0] >= len(bodies):
+                    return
+                body = bodies[position[0]]
+                position[0] += 1
+            started = time.perf_counter()
+            status = post(url, body, headers)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, latencies, statuses
+
+
+def summarize(mode, events, requests, wall_s, latencies, statuses):
+    ordered = sorted(latencies)
+    return {
+        "mode": mode,
+        "events": events,
+        "requests": requests,
+        "wall_s": round(wall_s, 3),
+        "events_per_s": round(events / wall_s, 1),
+        "request_p50_ms": round(statistics.median(ordered) * 1000, 2),
+        "request_p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000, 2),
+        "statuses": statuses,
+    }
+
+
+def start_in_process():
+    from werkzeug.serving import make_server
+
+    import app as backend
+
+    server = make_server("127.0.0.1", 0, backend.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:3001")
+    parser.add_argument("--in-process", action="store_true", help="Start the app in this process instead of using --url")
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--token", default=os.getenv("LOADTEST_TOKEN"), help="Firebase ID token sent as Bearer")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url.rstrip("/")
+    if args.in_process:
+        server, base_url = start_in_process()
+    url = f"{base_url}/api/live-events"
+    headers = {"Content-Type": "application/json"}
+    if args.token:
+        headers["Authorization"] = f"Bearer {args.token}"
+
+    events = [make_event(i) for i in range(args.events)]
+    batches = [events[i:i + args.batch_size] for i in range(0, len(events), args.batch_size)]
+    try:
+        single = summarize("single", len(events), len(events), *run(url, headers, events, args.concurrency))
+        bulk = summarize("bulk", len(events), len(batches), *run(url, headers, batches, args.concurrency))
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    report = {
+        "url": url,
+        "concurrency": args.concurrency,
+        "batch_size": args.batch_size,
+        "results": [single, bulk],
+        "bulk_speedup": round(bulk["events_per_s"] / single["events_per_s"], 1),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
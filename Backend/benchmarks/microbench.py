@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""Microbenchmarks of the upload hot path with baseline regression checks.
+
+Cases, each at several input sizes:
+
+* ``preprocess[WxH]``: ``ModelUtils.preprocess_image`` on a JPEG of that size
+* ``predict_image``, ``predict_batch[N]``: model forward passes on 299x299 input
+* ``heuristic[WxH]``: the heuristic fallback used when the model is unavailable
+* ``query_local_logs[N]``: first page of ``query`` on the store
+  ``create_local_log_store`` builds for ``LOCAL_LOG_BACKEND`` (segmented by
+  default), holding N entries
+* ``filter_local_logs[N]``: the same with a user, source and date filter
+* ``json_upload_response``, ``json_logs_page[N]``: ``jsonify`` of API responses
+
+Every case reports the median wall time and two peaks measured in one extra
+run: Python allocations through tracemalloc, and resident memory above the
+starting point (which includes torch and PIL buffers, Linux only). The model
+is a randomly initialised ``DeepfakeDetector`` on CPU, so no checkpoint,
+GPU or external service is needed; the app is imported with Firebase and
+Neon switched off and its data files in a scratch directory.
+
+``--filter`` is applied before any input is built, so a filtered run only
+pays for the cases it measures. ``--save-baseline`` stores the results. ``--baseline`` compares against a
+stored run and exits with status 1 when a case's median time regresses by
+more than ``--time-threshold`` percent, or a memory peak by more than
+``--memory-threshold`` percent. Baselines only make sense on the machine
+that recorded them.
+
+    python benchmarks/microbench.py --save-baseline baseline.json
+    python benchmarks/microbench.py --baseline baseline.json --time-threshold 15
+"""
+
+import argparse
+import contextlib
+import functools
+import gc
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_log_store import synthetic_entries  # noqa: E402
+from loadtest import git_commit, synthetic_image, use_scratch_environment  # noqa: E402
+
+
+def parse_sizes(text):
+    return [tuple(int(part) for part in size.lower().split("x")) for size in text.split(",") if size]
+
+
+def parse_ints(text):
+    return [int(part) for part in text.split(",") if part]
+
+
+# ----------------------------------------------------------------- measuring
+
+def _status_kb(field):
+    try:
+        with open("/proc/self/status") as f:
+            match = re.search(rf"^{field}:\s+(\d+) kB", f.read(), re.MULTILINE)
+        return int(match.group(1)) if match else None
+    except OSError:
+        return None
+
+
+def _reset_rss_peak():
+    """Reset VmHWM to the current RSS (Linux); False where that is not possible."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def measure(fn, repeat, budget_s, min_repeat=3):
+    """Median wall time of ``fn`` plus its Python and resident memory peaks."""
+    started = time.perf_counter()
+    fn()  # warm-up; also sizes the number of timed runs
+    first = time.perf_counter() - started
+    runs = max(min_repeat, min(repeat, int(budget_s / max(first, 1e-6))))
+    times = []
+    # Like timeit: a collection landing in one run is noise, not a regression.
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(runs):
+            started = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - started)
+    finally:
+        gc.enable()
+
+    rss_peak_kb = None
+    if _reset_rss_peak():
+        before = _status_kb("VmRSS")
+        fn()
+        peak = _status_kb("VmHWM")
+        if before is not None and peak is not None:
+            rss_peak_kb = max(0, peak - before)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, py_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "median_ms": round(statistics.median(times) * 1000, 4),
+        "min_ms": round(min(times) * 1000, 4),
+        "runs": runs,
+        "py_peak_kb": round(py_peak / 1024.0, 1),
+        "rss_peak_kb": rss_peak_kb,
+    }
+
+
+# ----------------------------------------------------------------- cases
+
+@contextlib.contextmanager
+def _environ(**values):
+    saved = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def build_log_store(directory, count):
+    """The configured local log store, in ``directory``, holding ``count`` synthetic entries."""
+    from log_store import create_local_log_store
+
+    os.makedirs(directory)
+    # Background compaction would land in the timed runs.
+    with _environ(
+        LOCAL_LOG_DIR=os.path.join(directory, "segments"),
+        LOCAL_LOG_FILE=os.path.join(directory, "detection_logs.jsonl"),
+        LOCAL_LOG_SQLITE_PATH=os.path.join(directory, "detection_logs.sqlite3"),
+        LOCAL_LOG_COMPACT_INTERVAL_S=str(10 ** 9),
+    ):
+        store = create_local_log_store(directory)
+    entries = list(synthetic_entries(count))
+    for start in range(0, count, 10000):
+        store.append_many(entries[start:start + 10000])
+    return store
+
+
+def build_cases(args, workdir):
+    """(name, callable) pairs; inputs are prepared here so only the call is timed.
+
+    Inputs are only built for cases that pass ``--filter``.
+    """
+    def wanted(name):
+        return not args.filter or args.filter in name
+
+    cases = []
+    images = {}
+    for width, height in sorted(set(args.image_sizes) | set(args.heuristic_sizes)):
+        if wanted(f"preprocess[{width}x{height}]") or wanted(f"heuristic[{width}x{height}]"):
+            name, content, _ = synthetic_image(width, height, seed=width * height)
+            path = os.path.join(workdir, name)
+            with open(path, "wb") as f:
+                f.write(content)
+            images[(width, height)] = path
+
+    predict_names = ["predict_image"] + [f"predict_batch[{batch_size}]" for batch_size in args.batch_sizes]
+    if any(wanted(f"preprocess[{w}x{h}]") for w, h in args.image_sizes) or any(map(wanted, predict_names)):
+        import torch
+
+        from utils.model_utils import DeepfakeDetector, ModelUtils
+
+        for size in args.image_sizes:
+            if wanted(f"preprocess[{size[0]}x{size[1]}]"):
+                cases.append((f"preprocess[{size[0]}x{size[1]}]", lambda path=images[size]: ModelUtils.preprocess_image(path)))
+
+        if any(map(wanted, predict_names)):
+            torch.manual_seed(0)
+            model = DeepfakeDetector().eval()
+            if wanted("predict_image"):
+                sample = torch.randn(1, 3, 299, 299)
+                cases.append(("predict_image", lambda: ModelUtils.predict_image(model, sample, "cpu")))
+            for batch_size in args.batch_sizes:
+                if wanted(f"predict_batch[{batch_size}]"):
+                    tensors = [torch.randn(1, 3, 299, 299) for _ in range(batch_size)]
+                    cases.append((f"predict_batch[{batch_size}]", lambda tensors=tensors: ModelUtils.predict_batch(model, tensors, "cpu")))
+
+    json_names = ["json_upload_response"] + [f"json_logs_page[{page_size}]" for page_size in args.page_sizes]
+    heuristic_names = [f"heuristic[{w}x{h}]" for w, h in args.heuristic_sizes]
+    backend = None
+    if any(map(wanted, json_names + heuristic_names)):
+        # Startup messages go to stderr so stdout stays a clean JSON report.
+        with contextlib.redirect_stdout(sys.stderr):
+            import app as backend
+
+    for size in args.heuristic_sizes:
+        if wanted(f"heuristic[{size[0]}x{size[1]}]"):
+            cases.append((f"heuristic[{size[0]}x{size[1]}]", lambda path=images[size]: backend._heuristic_prediction(path)))
+
+    for count in args.log_sizes:
+        if not (wanted(f"query_local_logs[{count}]") or wanted(f"filter_local_logs[{count}]")):
+            continue
+        store = build_log_store(os.path.join(workdir, f"logs_{count}"), count)
+        if wanted(f"query_local_logs[{count}]"):
+            cases.append((f"query_local_logs[{count}]", functools.partial(store.query, limit=51)))
+        if wanted(f"filter_local_logs[{count}]"):
+            cases.append((f"filter_local_logs[{count}]", functools.partial(
+                store.query, user_id="user-7", source_type="upload", start_date="2025-03-01", end_date="2025-09-30", limit=51,
+            )))
+
+    if backend is None:
+        return cases
+    from flask import jsonify
+
+    upload_response = {
+        "prediction": "Fake",
+        "confidence": 87.12,
+        "filename": "0b7c4d3e-5a8f-4c59-9d0e-2f1a3b4c5d6e_sample.jpg",
+        "file_url": "http://localhost:3001/uploads/0b7c4d3e-5a8f-4c59-9d0e-2f1a3b4c5d6e_sample.jpg",
+        "isVideo": False,
+        "threat_level": "high",
+        "model_used": "Verifixia AI Xception v2.4.1",
+        "processing_time": {"preprocessing_ms": 6.2, "inference_ms": 41.7, "total_ms": 47.9, "batch_size": 1},
+        "analysis": {"level": "High", "description": "Strong manipulation indicators", "recommendation": "Review"},
+        "model_info": {"architecture": "Xception-based CNN", "input_size": "299x299", "framework": "PyTorch", "device": "cpu"},
+        "user_id": "user-7",
+        "session_id": "6f1d2c3b-4a59-4e8f-9b7a-0c1d2e3f4a5b",
+        "log_id": "9a8b7c6d-5e4f-4a3b-8c2d-1e0f9a8b7c6d",
+    }
+
+    def jsonify_body(payload):
+        with backend.app.test_request_context():
+            return jsonify(payload).get_data()
+
+    if wanted("json_upload_response"):
+        cases.append(("json_upload_response", lambda: jsonify_body(upload_response)))
+    for page_size in args.page_sizes:
+        if not wanted(f"json_logs_page[{page_size}]"):
+            continue
+        page = {
+            "items": list(synthetic_entries(page_size, seed=page_size)),
+            "total": 100000,
+            "page": 1,
+            "page_size": page_size,
+            "next_cursor": "eyJ0cyI6ICIyMDI1LTA2LTAxVDAwOjAwOjAwIn0",
+        }
+        cases.append((f"json_logs_page[{page_size}]", lambda page=page: jsonify_body(page)))
+    return cases
+
+
+# ----------------------------------------------------------------- baselines
+
+def regressions(results, baseline, time_threshold, memory_threshold):
+    """Cases that got slower or hungrier than ``baseline`` by more than the thresholds."""
+    found = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous:
+            continue
+        for key, threshold in (("median_ms", time_threshold), ("py_peak_kb", memory_threshold), ("rss_peak_kb", memory_threshold)):
+            old, new = previous.get(key), current.get(key)
+            # Peaks of a few kB are noise, not a regression.
+            if not old or new is None or (key != "median_ms" and max(old, new) < 64):
+                continue
+            change = 100.0 * (new - old) / old
+            current.setdefault("change_pct", {})[key] = round(change, 1)
+            if change > threshold:
+                found.append({"case": name, "metric": key, "baseline": old, "current": new, "change_pct": round(change, 1)})
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--image-sizes", type=parse_sizes, default=parse_sizes("320x240,1280x720,1920x1080,4000x3000"))
+    parser.add_argument("--heuristic-sizes", type=parse_sizes, default=parse_sizes("320x240,1920x1080,4000x3000"))
+    parser.add_argument("--batch-sizes", type=parse_ints, default=parse_ints("1,4,8,16"))
+    parser.add_argument("--log-sizes", type=parse_ints, default=parse_ints("1000,10000,100000"))
+    parser.add_argument("--page-sizes", type=parse_ints, default=parse_ints("50,100"))
+    parser.add_argument("--repeat", type=int, default=30, help="Timed runs per case at most")
+    parser.add_argument("--budget", type=float, default=2.0, help="Seconds of timed runs per case, at least 3 runs")
+    parser.add_argument("--torch-threads", type=int, default=1, help="torch intra-op threads (fixed for stable baselines)")
+    parser.add_argument("--filter", help="Only run cases whose name contains this text")
+    parser.add_argument("--baseline", help="Compare against this saved run; exit 1 on regression")
+    parser.add_argument("--save-baseline", help="Save this run as a baseline")
+    parser.add_argument("--time-threshold", type=float, default=10.0, help="Allowed median time regression, percent")
+    parser.add_argument("--memory-threshold", type=float, default=10.0, help="Allowed peak memory regression, percent")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SIMILARITY_INDEX_ENABLED", "false")
+    os.environ.setdefault("UPLOAD_PIPELINE_ENABLED", "false")
+    scratch = use_scratch_environment(prefix="verifixia-microbench-")
+
+    import torch
+
+    torch.set_num_threads(args.torch_threads)
+    results = {}
+    with tempfile.TemporaryDirectory(dir=scratch) as workdir:
+        for name, fn in build_cases(args, workdir):
+            results[name] = measure(fn, args.repeat, args.budget)
+            print(f"{name:32s} {results[name]['median_ms']:>12.3f} ms  py {results[name]['py_peak_kb']:>10.1f} kB"
+                  f"  rss {results[name]['rss_peak_kb']} kB", file=sys.stderr)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "torch_threads": args.torch_threads,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    failed = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failed = regressions(results, baseline, args.time_threshold, args.memory_threshold)
+        report["baseline_commit"] = baseline.get("commit")
+        report["regressions"] = failed
+
+    print(json.dumps(report, indent=2))
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+    if failed:
+        for item in failed:
+            print(f"REGRESSION {item['case']} {item['metric']}: {item['baseline']} -> {item['current']} "
+                  f"(+{item['change_pct']}%)", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
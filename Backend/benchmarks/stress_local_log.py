@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""Concurrent multi-process writes to the local forensic log store.
+
+For each worker count N, starts N processes that append entries to one
+shared store (as N gunicorn workers would) while deleting some of their own
+entries. With ``--maintain`` one extra process keeps running compaction,
+compression and manifest flushes at the same time. A fresh store then reads
+the log back and the run fails if any entry is missing, duplicated or was
+not deleted. Throughput is reported per worker count.
+
+    python benchmarks/stress_local_log.py --workers 1,2,4,8 --entries 2000
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from log_store import JsonlLogStore, SegmentedLogStore, SqliteLogStore  # noqa: E402
+
+
+def open_store(backend, path):
+    if backend == "jsonl":
+        return JsonlLogStore(os.path.join(path, "detection_logs.jsonl"), compact_min_records=50)
+    if backend == "sqlite":
+        return SqliteLogStore(os.path.join(path, "detection_logs.sqlite3"))
+    # Entries span a few days, so maintenance compresses some segments and
+    # writers have to thaw them again.
+    return SegmentedLogStore(path, compress_after_days=2, compact_min_records=50)
+
+
+def writer(backend, path, worker, entries, delete_every, start_event, result_queue):
+    store = open_store(backend, path)
+    rng = random.Random(worker)
+    now = datetime.utcnow()
+    kept, deleted = [], []
+    start_event.wait()
+    started = time.perf_counter()
+    for i in range(entries):
+        entry = {
+            "id": f"w{worker}-{i}-{uuid.uuid4().hex[:8]}",
+            "timestamp": (now - timedelta(days=rng.randint(0, 3), seconds=rng.randint(0, 3600))).isoformat(),
+            "filename": f"stress_{worker}_{i}.jpg",
+            "prediction": rng.choice(["Real", "Fake"]),
+            "confidence": round(rng.uniform(50, 100), 2),
+            "source_type": rng.choice(["upload", "live"]),
+            "user_id": f"user-{worker}",
+        }
+        store.append(entry)
+        if delete_every and i % delete_every == delete_every - 1:
+            if not store.delete(entry["id"]):
+                raise RuntimeError(f"worker {worker} could not delete {entry['id']}")
+            deleted.append(entry["id"])
+        else:
+            kept.append(entry["id"])
+    elapsed = time.perf_counter() - started
+    store.stop()
+    result_queue.put({"worker": worker, "kept": kept, "deleted": deleted, "elapsed_s": elapsed})
+
+
+def maintainer(backend, path, stop_event, start_event):
+    store = open_store(backend, path)
+    start_event.wait()
+    while not stop_event.is_set():
+        if backend == "segmented":
+            store.maintain()
+        elif backend == "jsonl":
+            store.compact()
+        time.sleep(0.05)
+    store.stop()
+
+
+def run(backend, workers, entries, delete_every, maintain):
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as path:
+        start_event = ctx.Event()
+        stop_event = ctx.Event()
+        results = ctx.Queue()
+        procs = [
+            ctx.Process(target=writer, args=(backend, path, w, entries, delete_every, start_event, results))
+            for w in range(workers)
+        ]
+        helper = ctx.Process(target=maintainer, args=(backend, path, stop_event, start_event)) if maintain else None
+        for proc in procs + ([helper] if helper else []):
+            proc.start()
+        time.sleep(1.0)  # let every process import and open the store
+        started = time.perf_counter()
+        start_event.set()
+        reports = []
+        while len(reports) < len(procs):
+            try:
+                reports.append(results.get(timeout=1.0))
+            except queue.Empty:
+                if any(proc.exitcode not in (None, 0) for proc in procs):
+                    for proc in procs + ([helper] if helper else []):
+                        proc.terminate()
+                    raise SystemExit(f"A writer process crashed ({backend}, {workers} workers)")
+        wall_s = time.perf_counter() - started
+        for proc in procs:
+            proc.join()
+        if helper:
+            stop_event.set()
+            helper.join()
+
+        expected = [log_id for r in reports for log_id in r["kept"]]
+        deleted = {log_id for r in reports for log_id in r["deleted"]}
+        store = open_store(backend, path)
+        found = [entry["id"] for entry in store.read_all()]
+        _, total = store.query(limit=1)
+        store.stop()
+
+        found_set = set(found)
+        missing = set(expected) - found_set
+        resurrected = deleted & found_set
+        duplicates = len(found) - len(found_set)
+        written = workers * entries
+        return {
+            "backend": backend,
+            "workers": workers,
+            "entries_written": written,
+            "deletes": len(deleted),
+            "wall_s": round(wall_s, 3),
+            "appends_per_s": round(written / wall_s, 1),
+            "live_expected": len(expected),
+            "live_found": len(found_set),
+            "query_total": total,
+            "missing": len(missing),
+            "resurrected": len(resurrected),
+            "duplicates": duplicates,
+            "ok": not missing and not resurrected and not duplicates and total == len(expected),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["segmented", "jsonl", "sqlite"], default="segmented")
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--entries", type=int, default=2000, help="Entries appended per worker")
+    parser.add_argument("--delete-every", type=int, default=10, help="Delete every Nth entry (0 disables)")
+    parser.add_argument("--no-maintain", action="store_true", help="Skip the concurrent maintenance process")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = {"generated_at": datetime.utcnow().isoformat(), "results": []}
+    for count in [int(w) for w in args.workers.split(",") if w]:
+        row = run(args.backend, count, args.entries, args.delete_every, not args.no_maintain)
+        report["results"].append(row)
+        print(json.dumps(row), flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if not all(row["ok"] for row in report["results"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Many concurrent callers against the NeonDB connection pool.
+
+Starts ``--callers`` threads (default 150) that share one ``ConnectionPool``
+against a real Postgres (``DATABASE_URL``). Each thread runs short queries,
+and a helper keeps terminating pooled backends with
+``pg_terminate_backend`` so the pool has to detect and replace broken
+connections. At the end the run checks that every connection came back,
+that no more than ``--max`` were ever open, and that the only failures were
+the expected ones: queries on terminated backends and, with a small pool,
+acquire timeouts. A final query longer than the statement timeout must be
+cancelled by the server.
+
+    DATABASE_URL=postgresql://localhost/postgres python benchmarks/stress_neon_pool.py --callers 150
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from neon_db import ConnectionPool, PoolTimeout  # noqa: E402
+
+
+def caller(pool, queries, sleep_s, counters, lock):
+    for _ in range(queries):
+        outcome = "ok"
+        try:
+            with pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_backend_pid(), pg_sleep(%s)", (sleep_s,))
+                    cursor.fetchall()
+                conn.commit()
+        except PoolTimeout:
+            outcome = "acquire_timeout"
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            outcome = "broken_connection"
+        except Exception as exc:
+            outcome = "unexpected"
+            with lock:
+                counters.setdefault("unexpected_errors", []).append(f"{type(exc).__name__}: {exc}")
+        with lock:
+            counters[outcome] = counters.get(outcome, 0) + 1
+
+
+def killer(dsn, stop, interval_s, counters, lock):
+    """Terminate other backends of this application now and then."""
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    try:
+        while not stop.wait(interval_s):
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                    "WHERE datname = current_database() AND pid <> pg_backend_pid() "
+                    "AND application_name = 'stress_neon_pool' LIMIT 2"
+                )
+                killed = sum(1 for row in cursor.fetchall() if row[0])
+            with lock:
+                counters["terminated_backends"] = counters.get("terminated_backends", 0) + killed
+    finally:
+        conn.close()
+
+
+def connect(dsn, **kwargs):
+    return psycopg2.connect(dsn, application_name="stress_neon_pool", **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--callers", type=int, default=150)
+    parser.add_argument("--queries", type=int, default=20, help="Queries per caller")
+    parser.add_argument("--sleep-ms", type=float, default=5.0, help="Server-side time per query")
+    parser.add_argument("--min", type=int, default=2)
+    parser.add_argument("--max", type=int, default=10)
+    parser.add_argument("--acquire-timeout", type=float, default=10.0)
+    parser.add_argument("--kill-interval", type=float, default=0.5, help="Seconds between backend kills (0 disables)")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("Set DATABASE_URL or pass --dsn")
+
+    pool = ConnectionPool(
+        args.dsn,
+        minconn=args.min,
+        maxconn=args.max,
+        acquire_timeout_s=args.acquire_timeout,
+        validate_after_s=0.0,
+        statement_timeout_ms=1000,
+        connect=connect,
+    )
+    counters, lock, stop = {}, threading.Lock(), threading.Event()
+    helper = None
+    if args.kill_interval > 0:
+        helper = threading.Thread(target=killer, args=(args.dsn, stop, args.kill_interval, counters, lock))
+        helper.start()
+
+    threads = [
+        threading.Thread(target=caller, args=(pool, args.queries, args.sleep_ms / 1000.0, counters, lock))
+        for _ in range(args.callers)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_s = time.perf_counter() - started
+    stop.set()
+    if helper:
+        helper.join()
+
+    statement_timeout_enforced = False
+    try:
+        with pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_sleep(3)")
+    except psycopg2.errors.QueryCanceled:
+        statement_timeout_enforced = True
+
+    stats = pool.stats()
+    pool.closeall()
+    total = args.callers * args.queries
+    report = {
+        "callers": args.callers,
+        "queries": total,
+        "wall_s": round(wall_s, 3),
+        "queries_per_s": round(total / wall_s, 1),
+        "outcomes": {k: v for k, v in counters.items() if k != "unexpected_errors"},
+        "unexpected_errors": counters.get("unexpected_errors", [])[:10],
+        "statement_timeout_enforced": statement_timeout_enforced,
+        "pool": stats,
+    }
+    report["ok"] = (
+        not counters.get("unexpected")
+        and stats["in_use"] == 0
+        and stats["peak_in_use"] <= args.max
+        and statement_timeout_enforced
+    )
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if not report["ok"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
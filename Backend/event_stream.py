@@ -0,0 +1,195 @@
+import json
+import threading
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+
+class StreamFull(Exception):
+    """Raised when no more log streams can be opened."""
+
+
+class Subscription:
+    """One connected stream: its filters and a bounded buffer of pending events."""
+
+    def __init__(self, user_id: Optional[str], source_type: Optional[str]) -> None:
+        self.user_id = user_id
+        self.source_type = source_type
+        self.buffer: Deque[Tuple[int, str]] = deque()
+        self.lagged = False
+        self.closed = False
+        self.wakeup = threading.Event()
+
+    def matches(self, entry: Dict[str, Any]) -> bool:
+        return not self.source_type or entry.get("source_type") == self.source_type
+
+
+class LogBroadcaster:
+    """In-process fan-out of new log entries to server-sent event streams.
+
+    ``publish`` serializes an entry once, keeps it in a ring buffer of the
+    last ``history_size`` events and hands it to the matching subscribers.
+    Subscribers are indexed by user, so a publish only looks at streams of
+    that user and the unfiltered ones. Each stream buffers at most
+    ``buffer_size`` events; a stream that falls further behind is emptied
+    and sent a ``reset`` event telling the client to refetch. Idle streams
+    block on their own ``threading.Event`` and only wake up for events or a
+    heartbeat every ``heartbeat_s``.
+
+    Event ids are ``<epoch>-<sequence>``. The epoch changes with every
+    process, so a ``Last-Event-ID`` from another worker or from before a
+    restart, or one older than the ring buffer, also gets a ``reset``.
+    """
+
+    def __init__(
+        self,
+        history_size: int = 1000,
+        buffer_size: int = 100,
+        heartbeat_s: float = 15.0,
+        max_subscribers: int = 500,
+        retry_ms: int = 3000,
+    ) -> None:
+        self.buffer_size = max(1, buffer_size)
+        self.heartbeat_s = heartbeat_s
+        self.max_subscribers = max_subscribers
+        self.retry_ms = retry_ms
+        self.epoch = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._history: Deque[Tuple[int, Optional[str], Dict[str, Any], str]] = deque(maxlen=max(1, history_size))
+        self._subscribers: Dict[Optional[str], Set[Subscription]] = {}
+        self._count = 0
+        self._closed = False
+        self._published = 0
+        self._delivered = 0
+        self._lagged = 0
+        self._resumed = 0
+        self._resets = 0
+
+    # ----------------------------------------------------------------- publishing
+
+    def publish(self, entry: Dict[str, Any]) -> None:
+        payload = json.dumps(entry, default=str)
+        user_id = str(entry["user_id"]) if entry.get("user_id") else None
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            self._history.append((seq, user_id, entry, payload))
+            self._published += 1
+            targets: List[Subscription] = list(self._subscribers.get(None, ()))
+            if user_id is not None:
+                targets.extend(self._subscribers.get(user_id, ()))
+            for sub in targets:
+                if not sub.matches(entry):
+                    continue
+                if len(sub.buffer) >= self.buffer_size:
+                    sub.buffer.clear()
+                    if not sub.lagged:
+                        self._lagged += 1
+                    sub.lagged = True
+                else:
+                    sub.buffer.append((seq, payload))
+                    self._delivered += 1
+                sub.wakeup.set()
+
+    # ----------------------------------------------------------------- subscribing
+
+    def _parse_event_id(self, event_id: str) -> Optional[int]:
+        epoch, _, seq = event_id.partition("-")
+        if epoch != self.epoch:
+            return None
+        try:
+            return int(seq)
+        except ValueError:
+            return None
+
+    def subscribe(
+        self,
+        user_id: Optional[str] = None,
+        source_type: Optional[str] = None,
+        last_event_id: Optional[str] = None,
+    ) -> Subscription:
+        """Register a stream; with ``last_event_id``, replay what it missed."""
+        sub = Subscription(user_id, source_type)
+        with self._lock:
+            if self._closed:
+                raise StreamFull("Log streams are shutting down")
+            if self._count >= self.max_subscribers:
+                raise StreamFull(f"{self._count} log streams already open")
+            if last_event_id:
+                last_seq = self._parse_event_id(last_event_id)
+                oldest = self._history[0][0] if self._history else self._seq + 1
+                if last_seq is None or last_seq > self._seq or last_seq < oldest - 1:
+                    sub.lagged = True
+                    self._resets += 1
+                else:
+                    for seq, entry_user, entry, payload in self._history:
+                        if seq > last_seq and (user_id is None or entry_user == user_id) and sub.matches(entry):
+                            sub.buffer.append((seq, payload))
+                    self._resumed += 1
+                if len(sub.buffer) > self.buffer_size:
+                    sub.buffer.clear()
+                    sub.lagged = True
+                if sub.buffer or sub.lagged:
+                    sub.wakeup.set()
+            self._subscribers.setdefault(user_id, set()).add(sub)
+            self._count += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            group = self._subscribers.get(sub.user_id)
+            if group is not None and sub in group:
+                group.discard(sub)
+                self._count -= 1
+                if not group:
+                    del self._subscribers[sub.user_id]
+
+    def stream(self, sub: Subscription) -> Iterator[str]:
+        """SSE text for ``sub`` until the client goes away or ``close`` is called."""
+        try:
+            yield f"retry: {self.retry_ms}\n\n"
+            while not sub.closed:
+                sub.wakeup.wait(self.heartbeat_s)
+                with self._lock:
+                    sub.wakeup.clear()
+                    events = list(sub.buffer)
+                    sub.buffer.clear()
+                    lagged, sub.lagged = sub.lagged, False
+                    latest = self._seq
+                if sub.closed:
+                    break
+                parts = []
+                if lagged:
+                    # The client refetches the log, which covers anything buffered.
+                    parts.append(f"id: {self.epoch}-{latest}\nevent: reset\ndata: {{}}\n\n")
+                    events = []
+                for seq, payload in events:
+                    parts.append(f"id: {self.epoch}-{seq}\nevent: log\ndata: {payload}\n\n")
+                # A comment line keeps proxies from timing out and detects gone clients.
+                yield "".join(parts) or ": keepalive\n\n"
+        finally:
+            self.unsubscribe(sub)
+
+    def close(self) -> None:
+        """End every open stream (at shutdown)."""
+        with self._lock:
+            self._closed = True
+            subscribers = [sub for group in self._subscribers.values() for sub in group]
+        for sub in subscribers:
+            sub.closed = True
+            sub.wakeup.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "subscribers": self._count,
+                "max_subscribers": self.max_subscribers,
+                "published": self._published,
+                "delivered": self._delivered,
+                "lagged_resets": self._lagged,
+                "resumed": self._resumed,
+                "resume_resets": self._resets,
+                "history": len(self._history),
+                "last_event_id": f"{self.epoch}-{self._seq}",
+            }
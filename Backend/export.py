@@ -0,0 +1,95 @@
+import csv
+import io
+import json
+import zlib
+from typing import Any, Dict, Iterable, Iterator, Sequence
+
+EXPORT_FORMATS = ("ndjson", "csv")
+
+CSV_FIELDS = (
+    "id",
+    "timestamp",
+    "filename",
+    "prediction",
+    "confidence",
+    "threat_level",
+    "source_type",
+    "model_used",
+    "processing_time_ms",
+    "session_id",
+    "user_id",
+    "user_email",
+)
+
+# Bytes collected before a chunk is compressed and sent.
+CHUNK_BYTES = 64 * 1024
+
+
+def _json_default(value: Any) -> Any:
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _cell(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_json_default)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@"):
+        # Keep spreadsheets from evaluating user-supplied text as a formula.
+        return "'" + value
+    return value
+
+
+def _ndjson_lines(entries: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    for entry in entries:
+        yield json.dumps(entry, default=_json_default) + "\n"
+
+
+def _csv_lines(entries: Iterable[Dict[str, Any]], fields: Sequence[str]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    yield buffer.getvalue()
+    for entry in entries:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow([_cell(entry.get(field)) for field in fields])
+        yield buffer.getvalue()
+
+
+def export_stream(
+    entries: Iterable[Dict[str, Any]],
+    fmt: str = "ndjson",
+    compress: bool = False,
+    fields: Sequence[str] = CSV_FIELDS,
+    chunk_bytes: int = CHUNK_BYTES,
+) -> Iterator[bytes]:
+    """Encode ``entries`` as NDJSON or CSV in chunks of about ``chunk_bytes``.
+
+    With ``compress`` the output is one gzip stream, compressed as it goes.
+    Only the current chunk is held in memory, so the cost does not depend on
+    how many entries there are, provided ``entries`` is itself lazy.
+    """
+    lines = _csv_lines(entries, fields) if fmt == "csv" else _ndjson_lines(entries)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # wbits 31 = gzip
+    pending = []
+    size = 0
+    for line in lines:
+        data = line.encode("utf-8")
+        pending.append(data)
+        size += len(data)
+        if size >= chunk_bytes:
+            chunk = b"".join(pending)
+            pending, size = [], 0
+            out = compressor.compress(chunk) if compressor else chunk
+            if out:
+                yield out
+    chunk = b"".join(pending)
+    if compressor:
+        yield compressor.compress(chunk) + compressor.flush()
+    elif chunk:
+        yield chunk
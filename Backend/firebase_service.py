@@ -1,25 +1,157 @@
+import hashlib
 import json
 import logging
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from metrics import STAGE_SECONDS
+from tracing import span
+from pagination import cursor_for
 
 logger = logging.getLogger(__name__)
 
+# Same value as google.cloud.firestore.Query.DESCENDING; spelled out so an
+# injected client (emulator or fake) works without firebase-admin.
+DESCENDING = "DESCENDING"
+# google.cloud.firestore.FieldPath.document_id(); log documents are keyed by log id.
+DOCUMENT_ID = "__name__"
+
+# Firestore rejects batched writes with more than 500 operations.
+FIRESTORE_BATCH_LIMIT = 500
+
+
+class _TokenCache:
+    """Bounded LRU of verified ID tokens, keyed by the token's SHA-256.
+
+    An entry is served until the token's own ``exp``; the raw token is never
+    stored.
+    """
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self.max_entries = max(0, max_entries)
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.revocation_checks = 0
+        self.verifications = 0
+        self.verify_ms_total = 0.0
+
+    def get(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry["exp"] <= now:
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, user: Dict[str, Any], exp: float, checked_at: float) -> None:
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = {"user": user, "exp": exp, "checked_at": checked_at}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def record_revocation_check(self) -> None:
+        with self._lock:
+            self.revocation_checks += 1
+
+    def record_verification(self, elapsed_ms: float) -> None:
+        with self._lock:
+            self.verifications += 1
+            self.verify_ms_total += elapsed_ms
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            avg_verify_ms = self.verify_ms_total / self.verifications if self.verifications else 0.0
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "revocation_checks": self.revocation_checks,
+                "avg_verify_ms": round(avg_verify_ms, 2),
+                # Every hit skipped one verification.
+                "time_saved_ms": round(self.hits * avg_verify_ms, 1),
+            }
+
 
 class FirebaseService:
     """Optional Firebase integration layer.
 
     If firebase-admin or credentials are not available, methods gracefully
     return and callers can fall back to local storage.
+
+    ``firestore_client`` (and optionally ``auth_client``) can be passed in
+    to run against the Firestore emulator or an in-process fake instead of
+    initializing firebase-admin from credentials.
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        firestore_client: Any = None,
+        auth_client: Any = None,
+        total_cache_ttl_s: Optional[float] = None,
+        write_parallelism: Optional[int] = None,
+    ) -> None:
         self.enabled = False
         self._auth = None
         self._firestore = None
         self._server_timestamp = None
-        self._initialize()
+        if total_cache_ttl_s is None:
+            total_cache_ttl_s = float(os.getenv("FIRESTORE_TOTAL_CACHE_TTL_S", "30"))
+        self.total_cache_ttl_s = total_cache_ttl_s
+        if write_parallelism is None:
+            write_parallelism = int(os.getenv("FIRESTORE_WRITE_PARALLELISM", "4"))
+        self.write_parallelism = max(1, write_parallelism)
+        self._token_cache = _TokenCache(int(os.getenv("FIREBASE_TOKEN_CACHE_SIZE", "1024")))
+        self.check_revoked = os.getenv("FIREBASE_CHECK_REVOKED", "false").lower() in ("1", "true", "yes")
+        self.revocation_check_interval_s = float(os.getenv("FIREBASE_REVOCATION_CHECK_INTERVAL_S", "300"))
+        self._totals: Dict[Tuple[Any, ...], Tuple[float, int]] = {}
+        self._totals_lock = threading.Lock()
+        self.total_cache_hits = 0
+        self.total_cache_misses = 0
+        if firestore_client is not None:
+            self.enabled = True
+            self._firestore = firestore_client
+            self._auth = auth_client
+            self._server_timestamp = self._default_server_timestamp()
+        else:
+            self._initialize()
+
+    @staticmethod
+    def _default_server_timestamp() -> Any:
+        try:
+            from google.cloud.firestore import SERVER_TIMESTAMP
+        except Exception:
+            return None
+        return SERVER_TIMESTAMP
 
     def _initialize(self) -> None:
         try:
@@ -74,27 +206,48 @@ class FirebaseService:
         if not token:
             return None
 
+        # A token seen before is served from the cache until it expires.
+        # With FIREBASE_CHECK_REVOKED, a cached token is re-verified against
+        # the revocation list every FIREBASE_REVOCATION_CHECK_INTERVAL_S.
+        key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        now = time.time()
+        cached = self._token_cache.get(key, now)
+        if cached is not None:
+            if not self.check_revoked or now - cached["checked_at"] < self.revocation_check_interval_s:
+                return dict(cached["user"])
+            self._token_cache.record_revocation_check()
+
+        started = time.perf_counter()
         try:
-            decoded = self._auth.verify_id_token(token)
-            return {
-                "uid": decoded.get("uid"),
-                "email": decoded.get("email"),
-                "name": decoded.get("name"),
-                "picture": decoded.get("picture"),
-            }
+            with span("firebase.verify_id_token", check_revoked=self.check_revoked):
+                if self.check_revoked:
+                    decoded = self._auth.verify_id_token(token, check_revoked=True)
+                else:
+                    decoded = self._auth.verify_id_token(token)
         except Exception as exc:
+            self._token_cache.discard(key)
             logger.warning("Token verification failed: %s", exc)
             return None
+        self._token_cache.record_verification((time.perf_counter() - started) * 1000)
 
-    def upsert_user_profile(self, user: Dict[str, Any], extra: Optional[Dict[str, Any]] = None) -> None:
-        if not self.enabled:
-            return
-        uid = user.get("uid")
-        if not uid:
-            return
+        user = {
+            "uid": decoded.get("uid"),
+            "email": decoded.get("email"),
+            "name": decoded.get("name"),
+            "picture": decoded.get("picture"),
+        }
+        if decoded.get("exp"):
+            self._token_cache.put(key, user, float(decoded["exp"]), now)
+        return dict(user)
+
+    def token_cache_stats(self) -> Dict[str, Any]:
+        stats = self._token_cache.stats()
+        stats["check_revoked"] = self.check_revoked
+        return stats
 
+    def _profile_payload(self, user: Dict[str, Any], extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         payload = {
-            "uid": uid,
+            "uid": user.get("uid"),
             "email": user.get("email"),
             "display_name": user.get("name"),
             "photo_url": user.get("picture"),
@@ -102,8 +255,24 @@ class FirebaseService:
         }
         if extra:
             payload.update(extra)
+        return payload
+
+    def upsert_user_profile(self, user: Dict[str, Any], extra: Optional[Dict[str, Any]] = None) -> None:
+        if not self.enabled:
+            return
+        uid = user.get("uid")
+        if not uid:
+            return
+
+        self._firestore.collection("users").document(uid).set(self._profile_payload(user, extra), merge=True)
 
-        self._firestore.collection("users").document(uid).set(payload, merge=True)
+    def upsert_user_profiles(self, users: List[Dict[str, Any]]) -> int:
+        """Merge several users' auth fields into their profiles in batched writes."""
+        if not self.enabled:
+            return 0
+        collection = self._firestore.collection("users")
+        ops = [(collection.document(user["uid"]), self._profile_payload(user)) for user in users if user.get("uid")]
+        return self.commit_batches(ops, merge=True)
 
     def save_detection_log(self, log_entry: Dict[str, Any], user: Optional[Dict[str, Any]]) -> bool:
         return bool(self.save_forensic_log(log_entry, user))
@@ -125,11 +294,110 @@ class FirebaseService:
             payload["user_email"] = user.get("email")
 
         payload["created_at"] = self._server_timestamp
-        doc_ref = self._firestore.collection("forensic_logs").document()
+        collection = self._firestore.collection("forensic_logs")
+        doc_ref = collection.document(payload["id"]) if payload.get("id") else collection.document()
         payload["id"] = doc_ref.id
-        doc_ref.set(payload)
+        with STAGE_SECONDS.labels(stage="firebase_write").time(), span("firestore.set"):
+            doc_ref.set(payload)
+        self._invalidate_totals(payload.get("user_id"))
         return payload
 
+    def _commit_chunk(self, ops: List[Tuple[Any, Optional[Dict[str, Any]]]], merge: bool = False) -> int:
+        batch = self._firestore.batch()
+        for doc_ref, payload in ops:
+            if payload is None:
+                batch.delete(doc_ref)
+            elif merge:
+                batch.set(doc_ref, payload, merge=True)
+            else:
+                batch.set(doc_ref, payload)
+        batch.commit()
+        return len(ops)
+
+    def commit_batches(
+        self,
+        ops: Iterable[Tuple[Any, Optional[Dict[str, Any]]]],
+        on_commit: Optional[Callable[[int], None]] = None,
+        merge: bool = False,
+    ) -> int:
+        """Apply ``(doc_ref, payload)`` operations as batched writes.
+
+        A payload of None deletes the document; with ``merge`` the others are
+        merged into existing documents instead of replacing them. Operations are grouped into
+        batches of ``FIRESTORE_BATCH_LIMIT`` and up to ``write_parallelism``
+        batches are in flight at once. ``on_commit`` is called with the size
+        of each committed batch. The first failed batch is re-raised once
+        the in-flight ones have finished.
+        """
+        committed = 0
+        error: Optional[Exception] = None
+        ops = iter(ops)
+        with ThreadPoolExecutor(max_workers=self.write_parallelism, thread_name_prefix="firestore-batch") as pool:
+            pending = set()
+            try:
+                while True:
+                    chunk = list(islice(ops, FIRESTORE_BATCH_LIMIT))
+                    if not chunk:
+                        break
+                    if len(pending) >= self.write_parallelism:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        committed += self._collect(done, on_commit)
+                    pending.add(pool.submit(self._commit_chunk, chunk, merge))
+            except Exception as exc:
+                error = exc
+            done, _ = wait(pending)
+            try:
+                committed += self._collect(done, on_commit)
+            except Exception as exc:
+                error = error or exc
+        if error is not None:
+            raise error
+        return committed
+
+    @staticmethod
+    def _collect(done: Iterable[Any], on_commit: Optional[Callable[[int], None]]) -> int:
+        committed = 0
+        error = None
+        for future in done:
+            try:
+                count = future.result()
+            except Exception as exc:
+                error = error or exc
+                continue
+            committed += count
+            if on_commit:
+                on_commit(count)
+        if error is not None:
+            raise error
+        return committed
+
+    def save_forensic_logs(self, log_entries: List[Dict[str, Any]]) -> int:
+        """Write already-prepared log entries with parallel batched writes.
+
+        Entries keep their own ``id`` as the document id, so replaying a batch
+        after a failure overwrites instead of duplicating.
+        """
+        if not self.enabled or not log_entries:
+            return 0
+
+        collection = self._firestore.collection("forensic_logs")
+
+        def ops() -> Iterable[Tuple[Any, Dict[str, Any]]]:
+            for entry in log_entries:
+                payload = dict(entry)
+                payload.setdefault("timestamp", datetime.utcnow().isoformat())
+                payload.setdefault("source_type", "upload")
+                payload["created_at"] = self._server_timestamp
+                doc_ref = collection.document(payload["id"]) if payload.get("id") else collection.document()
+                payload["id"] = doc_ref.id
+                yield doc_ref, payload
+
+        with STAGE_SECONDS.labels(stage="firebase_write").time(), span("firestore.batch_write", docs=len(log_entries)):
+            written = self.commit_batches(ops())
+        for user_id in {entry.get("user_id") for entry in log_entries}:
+            self._invalidate_totals(user_id)
+        return written
+
     def _normalize_log_doc(self, doc: Any) -> Dict[str, Any]:
         item = doc.to_dict() or {}
         item["id"] = item.get("id") or doc.id
@@ -145,6 +413,59 @@ class FirebaseService:
             item["timestamp"] = datetime.utcnow().isoformat()
         return item
 
+    # ----------------------------------------------------------------- totals
+
+    def _count(self, query: Any) -> int:
+        """Server-side count aggregation; one billed read per 1000 matches."""
+        try:
+            aggregate = query.count(alias="total")
+        except AttributeError:
+            # Client predates aggregation queries: stream keys only.
+            return sum(1 for _ in query.select([]).stream())
+        result = aggregate.get()
+        return int(result[0][0].value)
+
+    def _cached_total(self, key: Tuple[Any, ...], query: Any) -> int:
+        now = time.monotonic()
+        with self._totals_lock:
+            cached = self._totals.get(key)
+            if cached and cached[0] > now:
+                self.total_cache_hits += 1
+                return cached[1]
+            self.total_cache_misses += 1
+        total = self._count(query)
+        if self.total_cache_ttl_s > 0:
+            with self._totals_lock:
+                self._totals[key] = (now + self.total_cache_ttl_s, total)
+                if len(self._totals) > 1024:
+                    # Drop expired entries; if none expired, start over.
+                    self._totals = {k: v for k, v in self._totals.items() if v[0] > now}
+                    if len(self._totals) > 1024:
+                        self._totals.clear()
+        return total
+
+    def _invalidate_totals(self, user_id: Optional[str] = None) -> None:
+        """Forget cached totals that a write by ``user_id`` may have changed.
+
+        Totals cached without a user filter cover everyone, so they go too;
+        ``user_id=None`` drops the whole cache.
+        """
+        with self._totals_lock:
+            if user_id is None:
+                self._totals.clear()
+                return
+            for key in [k for k in self._totals if k[0] in (user_id, None)]:
+                del self._totals[key]
+
+    def total_cache_stats(self) -> Dict[str, Any]:
+        with self._totals_lock:
+            return {
+                "entries": len(self._totals),
+                "hits": self.total_cache_hits,
+                "misses": self.total_cache_misses,
+                "ttl_s": self.total_cache_ttl_s,
+            }
+
     def get_forensic_logs(
         self,
         page: int = 1,
@@ -153,14 +474,24 @@ class FirebaseService:
         end_date: Optional[str] = None,
         source_type: Optional[str] = None,
         user: Optional[Dict[str, Any]] = None,
+        cursor: Optional[Tuple[Any, Any]] = None,
+        include_total: bool = True,
     ) -> Dict[str, Any]:
+        """One page of logs, newest first (timestamp, then id).
+
+        With ``cursor`` (a decoded ``(timestamp, id)`` pair) the page is read
+        with ``start_after`` instead of ``offset``, so Firestore does not
+        read and bill the skipped documents. Ties are broken on the document
+        id, which Firestore already appends to every index and to the
+        ``timestamp`` ordering of offset pages, so both paths use the same
+        indexes and the same order.
+
+        ``total`` comes from a count aggregation cached for
+        ``total_cache_ttl_s`` seconds; with ``include_total=False`` it is
+        skipped and returned as None.
+        """
         if not self.enabled:
-            return {"items": [], "total": 0, "page": page, "page_size": page_size}
-
-        try:
-            from firebase_admin import firestore
-        except Exception:
-            return {"items": [], "total": 0, "page": page, "page_size": page_size}
+            return {"items": [], "total": 0, "page": page, "page_size": page_size, "next_cursor": None}
 
         base_query = self._firestore.collection("forensic_logs")
 
@@ -173,18 +504,53 @@ class FirebaseService:
         if end_date:
             base_query = base_query.where("timestamp", "<=", end_date)
 
-        total = sum(1 for _ in base_query.stream())
-        offset = max(0, (page - 1) * page_size)
-
-        page_query = (
-            base_query
-            .order_by("timestamp", direction=firestore.Query.DESCENDING)
-            .offset(offset)
-            .limit(page_size)
-        )
-
-        items = [self._normalize_log_doc(doc) for doc in page_query.stream()]
-        return {"items": items, "total": total, "page": page, "page_size": page_size}
+        total = None
+        if include_total:
+            key = ((user or {}).get("uid"), source_type, start_date, end_date)
+            total = self._cached_total(key, base_query)
+
+        ordered = base_query.order_by("timestamp", direction=DESCENDING)
+        if cursor is not None:
+            ordered = (
+                ordered
+                .order_by(DOCUMENT_ID, direction=DESCENDING)
+                .start_after({"timestamp": cursor[0], DOCUMENT_ID: cursor[1]})
+            )
+        else:
+            ordered = ordered.offset(max(0, (page - 1) * page_size))
+
+        # One extra document tells us whether there is a next page.
+        with span("firestore.query", page_size=page_size, cursor=cursor is not None):
+            docs = list(ordered.limit(page_size + 1).stream())
+        items = [self._normalize_log_doc(doc) for doc in docs[:page_size]]
+        next_cursor = cursor_for(items[-1], "firestore") if len(docs) > page_size else None
+        return {"items": items, "total": total, "page": page, "page_size": page_size, "next_cursor": next_cursor}
+
+    def iter_forensic_logs(
+        self,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        source_type: Optional[str] = None,
+        user: Optional[Dict[str, Any]] = None,
+        page_size: int = 500,
+    ) -> Iterator[Dict[str, Any]]:
+        """Every matching log, newest first, read page by page with ``start_after``."""
+        cursor = None
+        while True:
+            payload = self.get_forensic_logs(
+                page_size=page_size,
+                start_date=start_date,
+                end_date=end_date,
+                source_type=source_type,
+                user=user,
+                cursor=cursor,
+                include_total=False,
+            )
+            items = payload["items"]
+            yield from items
+            if not payload.get("next_cursor"):
+                return
+            cursor = (items[-1].get("timestamp"), items[-1].get("id"))
 
     def get_detection_logs(self, limit: int = 50, user: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         response = self.get_forensic_logs(
@@ -192,6 +558,7 @@ class FirebaseService:
             page_size=limit,
             source_type="upload",
             user=user,
+            include_total=False,
         )
         return response.get("items", [])
 
@@ -209,13 +576,21 @@ class FirebaseService:
             return False
 
         doc_ref.delete()
+        self._invalidate_totals(payload.get("user_id"))
         return True
 
     def clear_forensic_logs(
         self,
         user: Optional[Dict[str, Any]] = None,
         source_type: Optional[str] = None,
+        on_progress: Optional[Callable[[int], None]] = None,
     ) -> int:
+        """Delete every matching log with parallel batched deletes.
+
+        Matching document keys are read a page at a time and deleted before
+        the next page is read, so the clear can be interrupted and simply
+        run again. ``on_progress`` is called with each committed batch size.
+        """
         if not self.enabled:
             return 0
 
@@ -226,11 +601,19 @@ class FirebaseService:
         if source_type:
             query = query.where("source_type", "==", source_type)
 
-        docs = query.stream()
+        page_size = FIRESTORE_BATCH_LIMIT * self.write_parallelism
+        keys_only = query.select([])
         deleted = 0
-        for doc in docs:
-            doc.reference.delete()
-            deleted += 1
+        try:
+            while True:
+                refs = [doc.reference for doc in keys_only.limit(page_size).stream()]
+                if not refs:
+                    break
+                deleted += self.commit_batches(((ref, None) for ref in refs), on_commit=on_progress)
+                if len(refs) < page_size:
+                    break
+        finally:
+            self._invalidate_totals((user or {}).get("uid"))
         return deleted
 
     def get_user_profile(self, uid: str) -> Optional[Dict[str, Any]]:
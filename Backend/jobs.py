@@ -0,0 +1,200 @@
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from log_store import atomic_write_lines
+
+try:
+    import fcntl
+except ImportError:  # Windows: a job may then be resumed by two workers
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# handler(params, progress, report) -> result; ``progress`` is what earlier
+# runs of the same job reported, ``report(dict)`` records new progress.
+JobHandler = Callable[[Dict[str, Any], Dict[str, Any], Callable[[Dict[str, Any]], None]], Any]
+
+_JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+TERMINAL = ("succeeded", "failed")
+
+
+class JobManager:
+    """Runs long operations, such as clearing a large log history, in the background.
+
+    Each job's state lives in ``<state_dir>/<id>.json`` and is rewritten
+    atomically on every progress report, so any worker process can answer
+    status requests and the state survives restarts. ``resume`` picks up
+    jobs a crashed process left queued or running; a per-job ``flock``
+    keeps two workers from running the same job. Handlers must be safe to
+    run again from the start, using the reported progress to carry counts
+    over.
+    """
+
+    def __init__(self, state_dir: str, workers: int = 1, retention_days: int = 7) -> None:
+        self.state_dir = state_dir
+        self.retention_days = retention_days
+        self._handlers: Dict[str, JobHandler] = {}
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._state_lock = threading.Lock()
+        self._active = 0
+        os.makedirs(state_dir, exist_ok=True)
+        for index in range(max(1, workers)):
+            threading.Thread(target=self._run, name=f"job-runner-{index}", daemon=True).start()
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    # ----------------------------------------------------------------- state
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def _write(self, job: Dict[str, Any]) -> None:
+        job["updated_at"] = datetime.utcnow().isoformat()
+        atomic_write_lines(self._path(job["id"]), [json.dumps(job, default=str)])
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not _JOB_ID.match(job_id or ""):
+            return None
+        try:
+            with open(self._path(job_id), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _list(self) -> List[Dict[str, Any]]:
+        jobs = []
+        for name in os.listdir(self.state_dir):
+            if name.endswith(".json"):
+                job = self.get(name[:-5])
+                if job:
+                    jobs.append(job)
+        return jobs
+
+    # ----------------------------------------------------------------- running
+
+    def submit(self, kind: str, params: Dict[str, Any], owner: Optional[str] = None) -> Dict[str, Any]:
+        if kind not in self._handlers:
+            raise KeyError(f"No handler registered for job kind {kind!r}")
+        now = datetime.utcnow().isoformat()
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "params": params,
+            "owner": owner,
+            "status": "queued",
+            "progress": {},
+            "result": None,
+            "error": None,
+            "attempts": 0,
+            "created_at": now,
+        }
+        self._write(job)
+        self._queue.put(job["id"])
+        return job
+
+    def resume(self) -> int:
+        """Queue every job that was left unfinished; returns how many.
+
+        Finished jobs older than ``retention_days`` are deleted on the way.
+        """
+        resumed = 0
+        cutoff = (datetime.utcnow() - timedelta(days=self.retention_days)).isoformat()
+        for job in self._list():
+            if job.get("status") in TERMINAL:
+                if self.retention_days > 0 and (job.get("finished_at") or "") < cutoff:
+                    try:
+                        os.remove(self._path(job["id"]))
+                    except OSError:
+                        pass
+                continue
+            if job.get("kind") in self._handlers:
+                self._queue.put(job["id"])
+                resumed += 1
+        if resumed:
+            logger.info("Resuming %d unfinished background job(s)", resumed)
+        return resumed
+
+    def retry(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Queue a failed job again; it continues from its reported progress."""
+        job = self.get(job_id)
+        if job is None or job.get("status") != "failed":
+            return job
+        job["status"] = "queued"
+        job["error"] = None
+        self._write(job)
+        self._queue.put(job_id)
+        return job
+
+    def _claim(self, job_id: str) -> Optional[int]:
+        """Take the job's lock without waiting; None if another worker has it."""
+        fd = os.open(os.path.join(self.state_dir, f"{job_id}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is None:
+            return fd
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return None
+        return fd
+
+    def _run(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            fd = self._claim(job_id)
+            if fd is None:
+                continue
+            try:
+                # Re-read under the lock: another worker may have finished it.
+                job = self.get(job_id)
+                if job is None or job.get("status") in TERMINAL:
+                    continue
+                with self._state_lock:
+                    self._active += 1
+                try:
+                    self._execute(job)
+                finally:
+                    with self._state_lock:
+                        self._active -= 1
+                # Safe to drop while held: a late claimant re-reads the
+                # finished state and skips the job.
+                try:
+                    os.remove(os.path.join(self.state_dir, f"{job_id}.lock"))
+                except OSError:
+                    pass
+            finally:
+                os.close(fd)
+
+    def _execute(self, job: Dict[str, Any]) -> None:
+        handler = self._handlers[job["kind"]]
+        job["status"] = "running"
+        job["attempts"] = job.get("attempts", 0) + 1
+        job["started_at"] = datetime.utcnow().isoformat()
+        self._write(job)
+        previous = dict(job.get("progress") or {})
+
+        def report(progress: Dict[str, Any]) -> None:
+            job["progress"].update(progress)
+            self._write(job)
+
+        try:
+            job["result"] = handler(job["params"], previous, report)
+            job["status"] = "succeeded"
+        except Exception as exc:
+            logger.error("Background job %s (%s) failed: %s", job["id"], job["kind"], exc)
+            job["status"] = "failed"
+            job["error"] = f"{type(exc).__name__}: {exc}"
+        job["finished_at"] = datetime.utcnow().isoformat()
+        self._write(job)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._state_lock:
+            active = self._active
+        return {"active": active, "queued": self._queue.qsize()}
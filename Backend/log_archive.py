@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""Columnar archive for closed periods of the forensic log.
+
+An archive is a directory (``<name>.logarc``) with one ``.npy`` file per
+column and a ``meta.json``:
+
+* ``timestamp`` as ``datetime64[us]`` (NaT when missing), ``confidence``,
+  ``processing_time_ms`` and ``latency_ms`` as ``float32`` (NaN when missing);
+* low-cardinality strings (prediction, threat level, source type, model,
+  model version, user) as dictionary codes (``uint8``/``uint16``/``uint32``, code 0
+  is "missing") with the dictionary kept in ``meta.json``;
+* ``id``, ``filename`` and ``session_id`` as a UTF-8 heap:
+  ``<col>.offsets.npy`` plus ``<col>.data.npy``;
+* everything else as JSON in the ``extra`` heap, so rows can be restored
+  (numeric columns at float32 precision).
+
+Columns are memory-mapped on first use, so a scan only touches the files of
+the columns it filters or returns.
+
+    python log_archive.py monthly --source detection_logs --out-dir archives/
+    python log_archive.py scan archives/2026-01.logarc --prediction Fake --group-by threat_level
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from log_store import JsonlLogStore, SegmentedLogStore, SqliteLogStore, atomic_write_lines, parse_utc
+
+FORMAT_VERSION = 1
+DICTIONARY_COLUMNS = (
+    "prediction",
+    "threat_level",
+    "source_type",
+    "model_used",
+    "model_version",
+    "user_id",
+    "user_email",
+)
+FLOAT_COLUMNS = ("confidence", "processing_time_ms", "latency_ms")
+HEAP_COLUMNS = ("id", "filename", "session_id")
+CORE_COLUMNS = ("timestamp",) + FLOAT_COLUMNS + DICTIONARY_COLUMNS + HEAP_COLUMNS
+
+
+def _code_dtype(size: int) -> Any:
+    if size < 2 ** 8:
+        return np.uint8
+    if size < 2 ** 16:
+        return np.uint16
+    return np.uint32
+
+
+def _float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _save_heap(path: str, name: str, values: Sequence[Optional[str]]) -> None:
+    encoded = [v.encode("utf-8") if v is not None else b"" for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(v) for v in encoded], out=offsets[1:])
+    if offsets[-1] < 2 ** 32:
+        offsets = offsets.astype(np.uint32)
+    np.save(os.path.join(path, f"{name}.offsets.npy"), offsets)
+    np.save(os.path.join(path, f"{name}.data.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+
+def write_archive(path: str, entries: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Write ``entries`` to a new archive at ``path``; returns its metadata.
+
+    The archive is built next to ``path`` and renamed into place, so a
+    reader never sees a half-written one.
+    """
+    timestamps: List[Any] = []
+    floats: Dict[str, List[float]] = {name: [] for name in FLOAT_COLUMNS}
+    dictionaries: Dict[str, Dict[str, int]] = {name: {} for name in DICTIONARY_COLUMNS}
+    codes: Dict[str, List[int]] = {name: [] for name in DICTIONARY_COLUMNS}
+    heaps: Dict[str, List[Optional[str]]] = {name: [] for name in HEAP_COLUMNS + ("extra",)}
+
+    for entry in entries:
+        ts = parse_utc(entry.get("timestamp"))
+        timestamps.append(np.datetime64(ts, "us") if ts else np.datetime64("NaT", "us"))
+        for name in FLOAT_COLUMNS:
+            floats[name].append(_float(entry.get(name)))
+        for name in DICTIONARY_COLUMNS:
+            value = entry.get(name)
+            if value is None:
+                codes[name].append(0)
+            else:
+                value = str(value)
+                codes[name].append(dictionaries[name].setdefault(value, len(dictionaries[name]) + 1))
+        for name in HEAP_COLUMNS:
+            value = entry.get(name)
+            heaps[name].append(None if value is None else str(value))
+        extra = {k: v for k, v in entry.items() if k not in CORE_COLUMNS}
+        # Keep the original timestamp text when it does not round-trip.
+        if entry.get("timestamp") is not None and (not ts or ts.isoformat() != entry.get("timestamp")):
+            extra["timestamp"] = entry.get("timestamp")
+        heaps["extra"].append(json.dumps(extra, default=str) if extra else None)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    try:
+        np.save(os.path.join(tmp_path, "timestamp.npy"), np.array(timestamps, dtype="datetime64[us]"))
+        for name in FLOAT_COLUMNS:
+            np.save(os.path.join(tmp_path, f"{name}.npy"), np.array(floats[name], dtype=np.float32))
+        for name in DICTIONARY_COLUMNS:
+            dtype = _code_dtype(len(dictionaries[name]) + 1)
+            np.save(os.path.join(tmp_path, f"{name}.npy"), np.array(codes[name], dtype=dtype))
+        for name, values in heaps.items():
+            _save_heap(tmp_path, name, values)
+
+        valid = np.array(timestamps, dtype="datetime64[us]")
+        valid = valid[~np.isnat(valid)]
+        meta = {
+            "version": FORMAT_VERSION,
+            "rows": len(timestamps),
+            "created_at": datetime.utcnow().isoformat(),
+            "min_timestamp": str(valid.min()) if valid.size else None,
+            "max_timestamp": str(valid.max()) if valid.size else None,
+            # Dictionary code i is stored at index i - 1 (code 0 = missing).
+            "dictionaries": {name: list(values) for name, values in dictionaries.items()},
+        }
+        atomic_write_lines(os.path.join(tmp_path, "meta.json"), [json.dumps(meta)])
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    return meta
+
+
+class LogArchive:
+    """Read side of an archive; columns are memory-mapped on first access."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported log archive version {self.meta.get('version')} in {path}")
+        self.dictionaries: Dict[str, List[str]] = self.meta["dictionaries"]
+        self._columns: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self.meta["rows"]
+
+    def _load(self, name: str) -> np.ndarray:
+        array = self._columns.get(name)
+        if array is None:
+            array = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+            self._columns[name] = array
+        return array
+
+    def column(self, name: str) -> np.ndarray:
+        """Raw column: timestamps, floats, or dictionary codes."""
+        if name in HEAP_COLUMNS or name == "extra":
+            raise ValueError(f"{name} is a string heap; use values({name!r})")
+        return self._load(name)
+
+    def code(self, name: str, value: str) -> Optional[int]:
+        """Dictionary code of ``value`` in column ``name`` (None if absent)."""
+        try:
+            return self.dictionaries[name].index(value) + 1
+        except ValueError:
+            return None
+
+    def values(self, name: str, rows: Optional[np.ndarray] = None) -> List[Optional[str]]:
+        """Decoded values of a dictionary or heap column for ``rows`` (all rows if None)."""
+        indices = np.arange(len(self)) if rows is None else np.asarray(rows)
+        if name in DICTIONARY_COLUMNS:
+            lookup = [None] + self.dictionaries[name]
+            return [lookup[c] for c in self._load(name)[indices]]
+        offsets = self._load(f"{name}.offsets")
+        data = self._load(f"{name}.data")
+        out: List[Optional[str]] = []
+        for i in indices:
+            start, end = offsets[i], offsets[i + 1]
+            out.append(bytes(data[start:end]).decode("utf-8") if end > start else None)
+        return out
+
+    def mask(
+        self,
+        start: Any = None,
+        end: Any = None,
+        min_confidence: Optional[float] = None,
+        **equals: Any,
+    ) -> np.ndarray:
+        """Boolean row mask for the filters; only the filtered columns are read.
+
+        ``equals`` maps dictionary columns to a value or a list of values,
+        e.g. ``prediction="Fake", source_type=["upload", "live"]``.
+        """
+        selected = np.ones(len(self), dtype=bool)
+        if start is not None or end is not None:
+            ts = self._load("timestamp")
+            if start is not None:
+                selected &= ts >= np.datetime64(parse_utc(start), "us")
+            if end is not None:
+                selected &= ts <= np.datetime64(parse_utc(end), "us")
+        if min_confidence is not None:
+            selected &= self._load("confidence") >= min_confidence
+        for name, wanted in equals.items():
+            if wanted is None:
+                continue
+            if name not in DICTIONARY_COLUMNS:
+                raise ValueError(f"Cannot filter on {name}; filterable: {', '.join(DICTIONARY_COLUMNS)}")
+            wanted_values = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+            wanted_codes = [c for c in (self.code(name, str(v)) for v in wanted_values) if c is not None]
+            selected &= np.isin(self._load(name), wanted_codes)
+        return selected
+
+    def count(self, **filters: Any) -> int:
+        return int(np.count_nonzero(self.mask(**filters)))
+
+    def group_count(self, name: str, **filters: Any) -> Dict[Optional[str], int]:
+        """Rows per value of dictionary column ``name`` among the filtered rows."""
+        codes = self._load(name)[self.mask(**filters)]
+        counts = np.bincount(codes, minlength=len(self.dictionaries[name]) + 1)
+        lookup = [None] + self.dictionaries[name]
+        return {lookup[c]: int(n) for c, n in enumerate(counts) if n}
+
+    def quantiles(self, name: str, qs: Sequence[float] = (0.5, 0.95, 0.99), **filters: Any) -> Dict[str, Optional[float]]:
+        values = np.asarray(self._load(name)[self.mask(**filters)], dtype=np.float64)
+        values = values[~np.isnan(values)]
+        return {
+            f"p{int(round(q * 100))}": (round(float(np.quantile(values, q)), 2) if values.size else None)
+            for q in qs
+        }
+
+    def rows(self, selected: Optional[np.ndarray] = None) -> Iterator[Dict[str, Any]]:
+        """Rebuild the original log entries for a mask (all rows if None)."""
+        indices = np.arange(len(self)) if selected is None else np.flatnonzero(selected)
+        for start in range(0, len(indices), 10000):
+            chunk = indices[start:start + 10000]
+            decoded = {name: self.values(name, chunk) for name in DICTIONARY_COLUMNS + HEAP_COLUMNS + ("extra",)}
+            timestamps = self._load("timestamp")[chunk]
+            floats = {name: self._load(name)[chunk] for name in FLOAT_COLUMNS}
+            for i in range(len(chunk)):
+                entry: Dict[str, Any] = {}
+                for name in HEAP_COLUMNS:
+                    if decoded[name][i] is not None:
+                        entry[name] = decoded[name][i]
+                if not np.isnat(timestamps[i]):
+                    entry["timestamp"] = timestamps[i].astype(datetime).isoformat()
+                for name in FLOAT_COLUMNS:
+                    if not np.isnan(floats[name][i]):
+                        entry[name] = float(floats[name][i])
+                for name in DICTIONARY_COLUMNS:
+                    if decoded[name][i] is not None:
+                        entry[name] = decoded[name][i]
+                if decoded["extra"][i]:
+                    entry.update(json.loads(decoded["extra"][i]))
+                yield entry
+
+
+# --------------------------------------------------------------------- CLI
+
+
+def open_source(path: str) -> Any:
+    """Open a log store from a segment directory, SQLite file or JSONL file."""
+    if os.path.isdir(path):
+        return SegmentedLogStore(path)
+    if path.endswith((".sqlite3", ".db")):
+        return SqliteLogStore(path)
+    store = JsonlLogStore(path)
+    store.create_missing = False
+    return store
+
+
+def _month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(value: datetime) -> datetime:
+    return (value.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def archive_closed_months(source: Any, out_dir: str, now: Optional[datetime] = None) -> List[str]:
+    """Archive every month before the current one that has no archive yet."""
+    now = now or datetime.utcnow()
+    current = _month_start(now)
+    oldest = None
+    for entry in source.iter_query(end_date=(current - timedelta(microseconds=1)).isoformat()):
+        ts = parse_utc(entry.get("timestamp"))
+        if ts and (oldest is None or ts < oldest):
+            oldest = ts
+    if oldest is None:
+        return []
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    month = _month_start(oldest)
+    while month < current:
+        following = _next_month(month)
+        path = os.path.join(out_dir, f"{month:%Y-%m}.logarc")
+        if not os.path.exists(path):
+            entries = source.iter_query(
+                start_date=month.isoformat(),
+                end_date=(following - timedelta(microseconds=1)).isoformat(),
+            )
+            meta = write_archive(path, entries)
+            if meta["rows"]:
+                written.append(path)
+            else:
+                shutil.rmtree(path)
+        month = following
+    return written
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Columnar archives of the forensic log")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Archive one date range")
+    build.add_argument("--source", required=True, help="Segment directory, SQLite file or JSONL file")
+    build.add_argument("--out", required=True, help="Archive path, e.g. archives/2026-01.logarc")
+    build.add_argument("--start")
+    build.add_argument("--end")
+
+    monthly = commands.add_parser("monthly", help="Archive every closed month not archived yet")
+    monthly.add_argument("--source", required=True)
+    monthly.add_argument("--out-dir", required=True)
+
+    scan = commands.add_parser("scan", help="Count or group archived rows")
+    scan.add_argument("archives", nargs="+")
+    scan.add_argument("--start")
+    scan.add_argument("--end")
+    scan.add_argument("--min-confidence", type=float)
+    for name in DICTIONARY_COLUMNS:
+        scan.add_argument(f"--{name.replace('_', '-')}", dest=name, action="append")
+    scan.add_argument("--group-by", choices=DICTIONARY_COLUMNS)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        source = open_source(args.source)
+        meta = write_archive(args.out, source.iter_query(start_date=args.start, end_date=args.end))
+        print(json.dumps({"archive": args.out, "rows": meta["rows"]}))
+    elif args.command == "monthly":
+        written = archive_closed_months(open_source(args.source), args.out_dir)
+        print(json.dumps({"written": written}))
+    else:
+        filters = {name: getattr(args, name) for name in DICTIONARY_COLUMNS}
+        filters.update(start=args.start, end=args.end, min_confidence=args.min_confidence)
+        total = 0
+        groups: Dict[Optional[str], int] = {}
+        for path in args.archives:
+            archive = LogArchive(path)
+            total += archive.count(**filters)
+            if args.group_by:
+                for key, count in archive.group_count(args.group_by, **filters).items():
+                    groups[key] = groups.get(key, 0) + count
+        result: Dict[str, Any] = {"rows": total}
+        if args.group_by:
+            result["groups"] = groups
+        print(json.dumps(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
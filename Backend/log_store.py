@@ -0,0 +1,1316 @@
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, fall back to in-process locking
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def parse_iso_date(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def parse_utc(value: Any) -> Optional[datetime]:
+    """Parse an ISO timestamp into a naive UTC datetime.
+
+    Log timestamps are written with ``datetime.utcnow().isoformat()``; query
+    bounds may carry a ``Z`` or offset. Converting both sides to naive UTC
+    keeps them comparable.
+    """
+    parsed = parse_iso_date(value)
+    if parsed is not None and parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def normalize_timestamp(value: Any) -> Optional[str]:
+    """Return ``value`` as a naive-UTC ISO string that sorts lexicographically."""
+    parsed = parse_utc(value)
+    return parsed.isoformat() if parsed else None
+
+
+def log_sort_key(entry: Dict[str, Any]) -> Tuple[str, str]:
+    """Listing order of local logs (used descending): timestamp, then id."""
+    return str(entry.get("timestamp") or ""), str(entry.get("id") or "")
+
+
+def cursor_key(cursor: Tuple[Any, Any]) -> Tuple[str, str]:
+    return str(cursor[0] or ""), str(cursor[1] or "")
+
+
+def filter_logs(
+    logs: List[Dict[str, Any]],
+    user_id: Optional[str] = None,
+    source_type: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Filter and sort (newest first) an in-memory list of log entries."""
+    output = logs
+    if user_id:
+        output = [entry for entry in output if entry.get("user_id") == user_id]
+    if source_type:
+        output = [entry for entry in output if entry.get("source_type") == source_type]
+
+    start_dt = parse_utc(start_date)
+    end_dt = parse_utc(end_date)
+    if start_dt or end_dt:
+        filtered = []
+        for entry in output:
+            ts = parse_utc(entry.get("timestamp"))
+            if not ts:
+                continue
+            if start_dt and ts < start_dt:
+                continue
+            if end_dt and ts > end_dt:
+                continue
+            filtered.append(entry)
+        output = filtered
+
+    output.sort(key=log_sort_key, reverse=True)
+    return output
+
+
+def _matches(entry: Dict[str, Any], user_id: Optional[str], source_type: Optional[str]) -> bool:
+    if user_id and entry.get("user_id") != user_id:
+        return False
+    if source_type and entry.get("source_type") != source_type:
+        return False
+    return True
+
+
+def compression_of(path: str) -> Optional[str]:
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith(".zst"):
+        return "zstd"
+    return None
+
+
+def open_log_file(path: str, mode: str = "r", compression: Optional[str] = None) -> Any:
+    """Open a log file in text mode, transparently (de)compressing gzip/zstd."""
+    compression = compression or compression_of(path)
+    if compression == "gzip":
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    if compression == "zstd":
+        import zstandard
+
+        return zstandard.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode)
+
+
+def _fsync_path(path: str) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_lines(path: str, lines: Iterable[str]) -> None:
+    """Replace ``path`` with ``lines`` via a synced temp file and rename.
+
+    The file is compressed if ``path`` ends in ``.gz`` or ``.zst``. A crash
+    at any point leaves either the old file or the complete new one.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open_log_file(tmp_path, "w", compression=compression_of(path)) as f:
+            for line in lines:
+                f.write(line)
+        _fsync_path(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _fsync_path(os.path.dirname(os.path.abspath(path)))
+
+
+class FileLock:
+    """Advisory inter-process lock (``flock``) on a sidecar file.
+
+    Appends take the lock shared, so several worker processes can append at
+    once; anything that rewrites or renames log files takes it exclusive.
+    The lock is re-entrant per thread: a thread that holds it exclusively
+    may take it again in either mode. On platforms without ``fcntl`` only
+    threads of the current process are serialized.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        self._fallback = threading.RLock()
+
+    @contextmanager
+    def shared(self) -> Iterator[None]:
+        with self._hold(False):
+            yield
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        with self._hold(True):
+            yield
+
+    @contextmanager
+    def _hold(self, exclusive: bool) -> Iterator[None]:
+        held = getattr(self._local, "mode", None)
+        if held == "ex" or (held == "sh" and not exclusive):
+            yield
+            return
+        if held == "sh":
+            raise RuntimeError(f"Cannot upgrade shared lock on {self.path} to exclusive")
+
+        if fcntl is None:
+            with self._fallback:
+                self._local.mode = "ex"
+                try:
+                    yield
+                finally:
+                    self._local.mode = None
+            return
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            self._local.mode = "ex" if exclusive else "sh"
+            try:
+                yield
+            finally:
+                self._local.mode = None
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+class JsonlLogStore:
+    """Forensic log kept as one JSON object per line in a single file.
+
+    The file is append-only during normal operation. Deleting an entry
+    appends a ``{"_tombstone": id}`` record and clearing appends a
+    ``{"_clear": {filters}}`` record; both are applied in file order when the
+    log is read. Entries written without an id get a deterministic one
+    derived from their position, so they can be deleted without rewriting
+    the file. ``compact`` drops dead records with an atomic rewrite, and
+    ``start_compactor`` runs it in the background whenever the share of dead
+    records crosses ``compact_ratio``.
+
+    Several processes may share the file. Each record is written with a
+    single ``O_APPEND`` write under a shared ``FileLock``, so concurrent
+    appends never interleave; rewrites hold the lock exclusively. Readers
+    skip a line that is still being written.
+    """
+
+    backend = "jsonl"
+
+    def __init__(
+        self,
+        path: str,
+        compact_ratio: float = 0.3,
+        compact_min_records: int = 100,
+        file_lock: Optional[FileLock] = None,
+    ) -> None:
+        self.path = path
+        self.file_lock = file_lock or FileLock(path + ".lock")
+        self.appended_bytes = 0
+        self.create_missing = True
+        self._tail_checked = False
+        self.compact_ratio = compact_ratio
+        self.compact_min_records = compact_min_records
+        self._lock = threading.RLock()
+        self._records = 0
+        self._live = 0
+        self._compactions = 0
+        self._last_compaction: Optional[str] = None
+        self._compactor: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _scan(self) -> Dict[str, Dict[str, Any]]:
+        live: Dict[str, Dict[str, Any]] = {}
+        records = 0
+        if os.path.exists(self.path):
+            with open_log_file(self.path, "r") as f:
+                offset = 0
+                for line in f:
+                    line_offset = offset
+                    offset += len(line)
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Without a newline this is an append still in flight.
+                        if line.endswith("\n"):
+                            logger.warning("Skipping unreadable line at offset %d of %s", line_offset, self.path)
+                        continue
+                    records += 1
+                    if "_tombstone" in record:
+                        live.pop(record["_tombstone"], None)
+                    elif "_clear" in record:
+                        criteria = record["_clear"] or {}
+                        for log_id in [k for k, v in live.items() if _matches(v, criteria.get("user_id"), criteria.get("source_type"))]:
+                            del live[log_id]
+                    else:
+                        if not record.get("id"):
+                            record["id"] = str(uuid.uuid5(uuid.NAMESPACE_OID, f"{line_offset}:{line}"))
+                        live[record["id"]] = record
+        self._records = records
+        self._live = len(live)
+        return live
+
+    def read_all(self) -> List[Dict[str, Any]]:
+        return list(self._scan().values())
+
+    def _terminate_tail(self) -> int:
+        """Newline-terminate a record torn by a crash so the next append starts clean."""
+        with self.file_lock.exclusive():
+            try:
+                fd = os.open(self.path, os.O_RDWR | os.O_APPEND)
+            except FileNotFoundError:
+                return 0
+            try:
+                size = os.fstat(fd).st_size
+                if size and os.pread(fd, 1, size - 1) != b"\n":
+                    _write_all(fd, b"\n")
+                    return 1
+                return 0
+            finally:
+                os.close(fd)
+
+    def _append_record(self, record: Dict[str, Any]) -> None:
+        self._append_records([record])
+
+    def _append_records(self, records: List[Dict[str, Any]]) -> None:
+        data = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+        written = 0
+        if compression_of(self.path):
+            with self.file_lock.exclusive(), open_log_file(self.path, "a") as f:
+                f.write(data.decode("utf-8"))
+        else:
+            if not self._tail_checked:
+                written += self._terminate_tail()
+                self._tail_checked = True
+            with self.file_lock.shared():
+                flags = os.O_WRONLY | os.O_APPEND | (os.O_CREAT if self.create_missing else 0)
+                fd = os.open(self.path, flags, 0o644)
+                try:
+                    _write_all(fd, data)
+                finally:
+                    os.close(fd)
+        with self._lock:
+            self._records += len(records)
+            self.appended_bytes += written + len(data)
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        self.append_many([entry])
+
+    def append_many(self, entries: List[Dict[str, Any]]) -> None:
+        """Append ``entries`` with a single write."""
+        if not entries:
+            return
+        self._append_records(entries)
+        with self._lock:
+            self._live += len(entries)
+
+    def query(
+        self,
+        user_id: Optional[str] = None,
+        source_type: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        offset: int = 0,
+        limit: int = 50,
+        cursor: Optional[Tuple[Any, Any]] = None,
+        include_total: bool = True,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Return one page and the total match count.
+
+        With ``cursor`` (a decoded ``(timestamp, id)`` pair) the page starts
+        right after that entry and ``offset`` is ignored. The total is None
+        when ``include_total`` is False.
+        """
+        filtered = filter_logs(
+            self.read_all(),
+            user_id=user_id,
+            source_type=source_type,
+            start_date=start_date,
+            end_date=end_date,
+        )
+        total = len(filtered) if include_total else None
+        if cursor is not None:
+            key = cursor_key(cursor)
+            return [entry for entry in filtered if log_sort_key(entry) < key][:limit], total
+        return filtered[offset:offset + limit], total
+
+    def iter_query(
+        self,
+        user_id: Optional[str] = None,
+        source_type: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Every matching entry, newest first (this store keeps the log in memory anyway)."""
+        yield from filter_logs(
+            self.read_all(),
+            user_id=user_id,
+            source_type=source_type,
+            start_date=start_date,
+            end_date=end_date,
+        )
+
+    def delete(self, log_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Remove one entry; returns it, or None if there was nothing to delete."""
+        with self._lock:
+            entry = self._scan().get(log_id)
+            if entry is None or (user_id and entry.get("user_id") != user_id):
+                return None
+            self._append_record({"_tombstone": log_id, "at": datetime.utcnow().isoformat()})
+            self._live -= 1
+        return entry
+
+    def clear(self, user_id: Optional[str] = None, source_type: Optional[str] = None) -> int:
+        with self._lock:
+            matched = sum(1 for entry in self._scan().values() if _matches(entry, user_id, source_type))
+            if matched:
+                self._append_record({
+                    "_clear": {"user_id": user_id, "source_type": source_type},
+                    "at": datetime.utcnow().isoformat(),
+                })
+                self._live -= matched
+        return matched
+
+    def dead_ratio(self) -> float:
+        return 1 - (self._live / self._records) if self._records else 0.0
+
+    def compact(self, min_dead_ratio: float = 0.0) -> bool:
+        """Rewrite the file without tombstones or the entries they removed.
+
+        Nothing is rewritten when the rescanned file has fewer dead records
+        than ``min_dead_ratio``.
+        """
+        with self._lock, self.file_lock.exclusive():
+            live = self._scan()
+            if self._records == len(live) or self.dead_ratio() < min_dead_ratio:
+                return False
+            atomic_write_lines(self.path, (json.dumps(entry) + "\n" for entry in live.values()))
+            self._records = self._live = len(live)
+            self._compactions += 1
+            self._last_compaction = datetime.utcnow().isoformat()
+        logger.info("Compacted %s to %d live entries", self.path, len(live))
+        return True
+
+    def compact_if_needed(self) -> bool:
+        # The counters follow this process's writes, so the periodic check is
+        # free; the file is only scanned once they cross the threshold, and
+        # compact() re-checks against the scan before rewriting.
+        with self._lock:
+            if self._records < self.compact_min_records or self.dead_ratio() < self.compact_ratio:
+                return False
+            return self.compact(min_dead_ratio=self.compact_ratio)
+
+    def start_compactor(self, interval_s: float = 60.0) -> None:
+        if self._compactor is not None:
+            return
+
+        def run() -> None:
+            while not self._stop.wait(interval_s):
+                try:
+                    self.compact_if_needed()
+                except Exception as exc:
+                    logger.warning("Background log compaction failed: %s", exc)
+
+        self._compactor = threading.Thread(target=run, name="jsonl-log-compactor", daemon=True)
+        self._compactor.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "records": self._records,
+            "live_entries": self._live,
+            "dead_ratio": round(self.dead_ratio(), 3),
+            "compactions": self._compactions,
+            "last_compaction": self._last_compaction,
+        }
+
+
+UNDATED_SEGMENT = "undated"
+
+
+def _count_key(entry: Dict[str, Any]) -> str:
+    return f"{entry.get('user_id') or ''}|{entry.get('source_type') or ''}"
+
+
+class SegmentedLogStore:
+    """Forensic log split into daily JSONL segments with a manifest.
+
+    Entries go to ``<dir>/YYYY-MM-DD.jsonl`` by the UTC day of their
+    timestamp (entries without a usable timestamp go to ``undated.jsonl``).
+    Each segment is a ``JsonlLogStore``, so deletes are tombstones there too.
+    ``manifest.json`` records, per segment, its min/max timestamp and live
+    entry counts per (user_id, source_type); a query uses it to open only
+    the segments that overlap its date range, take totals for segments that
+    lie fully inside the range from the counts, and skip whole segments to
+    reach an offset.
+
+    A maintenance thread flushes the manifest, compacts segments with many
+    tombstones, compresses segments older than ``compress_after_days`` and
+    drops segments older than ``retention_days``. Compressed segments are
+    read-only; writing to one decompresses it first.
+
+    All segments share one ``FileLock`` on ``<dir>/.lock``, so several
+    worker processes can write to the same directory: appends hold it
+    shared, while thawing, compaction, compression, retention and the
+    legacy import hold it exclusively. When an append shows that another
+    process also wrote to a segment, the segment is marked stale and the
+    next ``refresh`` rescans it.
+    """
+
+    backend = "segmented"
+
+    MANIFEST = "manifest.json"
+
+    def __init__(
+        self,
+        directory: str,
+        retention_days: int = 0,
+        compress_after_days: int = 0,
+        compression: str = "gzip",
+        compact_ratio: float = 0.3,
+        compact_min_records: int = 100,
+        legacy_path: Optional[str] = None,
+    ) -> None:
+        self.directory = directory
+        self.retention_days = retention_days
+        self.compress_after_days = compress_after_days
+        self.compression = compression if compression in ("gzip", "zstd") else "gzip"
+        self.compact_ratio = compact_ratio
+        self.compact_min_records = compact_min_records
+        self._lock = threading.RLock()
+        self.file_lock = FileLock(os.path.join(directory, ".lock"))
+        self._segments: Dict[str, JsonlLogStore] = {}
+        self._manifest: Dict[str, Dict[str, Any]] = {}
+        self._manifest_extra: Dict[str, Any] = {}
+        self._dirty = False
+        self._cache: Dict[str, Tuple[Tuple[int, int], List[Dict[str, Any]]]] = {}
+        self._segments_read = 0
+        self._maintenance: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_manifest()
+        if legacy_path:
+            self.import_jsonl(legacy_path)
+        self.refresh()
+
+    # ----------------------------------------------------------------- manifest
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, self.MANIFEST)
+
+    def _load_manifest(self) -> None:
+        path = self._manifest_path()
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as exc:
+            logger.warning("Ignoring unreadable log manifest %s: %s", path, exc)
+            return
+        self._manifest = data.pop("segments", {})
+        self._manifest_extra = data
+
+    def flush_manifest(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = dict(self._manifest_extra)
+            payload["segments"] = self._manifest
+            atomic_write_lines(self._manifest_path(), [json.dumps(payload, sort_keys=True)])
+            self._dirty = False
+
+    @staticmethod
+    def _signature(path: str) -> Tuple[int, int]:
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+
+    def _segment_files(self) -> Dict[str, str]:
+        files = {}
+        for name in os.listdir(self.directory):
+            if ".tmp" in name:
+                continue
+            for suffix in (".jsonl", ".jsonl.gz", ".jsonl.zst"):
+                if name.endswith(suffix):
+                    files[name[: -len(suffix)]] = os.path.join(self.directory, name)
+                    break
+        return files
+
+    def _summarize(self, day: str, segment: JsonlLogStore) -> Dict[str, Any]:
+        # Stat before scanning: if another worker appends meanwhile, the
+        # recorded signature is already stale and the next refresh rescans.
+        size, mtime = self._signature(segment.path)
+        live = segment._scan()
+        counts: Dict[str, int] = {}
+        min_ts = max_ts = None
+        for entry in live.values():
+            key = _count_key(entry)
+            counts[key] = counts.get(key, 0) + 1
+            ts = normalize_timestamp(entry.get("timestamp"))
+            if ts:
+                min_ts = ts if min_ts is None or ts < min_ts else min_ts
+                max_ts = ts if max_ts is None or ts > max_ts else max_ts
+        return {
+            "file": os.path.basename(segment.path),
+            "min_ts": min_ts,
+            "max_ts": max_ts,
+            "records": segment._records,
+            "live": len(live),
+            "counts": counts,
+            "size": size,
+            "mtime_ns": mtime,
+        }
+
+    def refresh(self) -> None:
+        """Bring the manifest in line with the segment files on disk.
+
+        Segments whose size or mtime differ from the manifest (written by
+        another process, or left behind by a crash) are rescanned.
+        """
+        with self._lock:
+            files = self._segment_files()
+            for day in list(self._manifest):
+                if day not in files:
+                    del self._manifest[day]
+                    self._segments.pop(day, None)
+                    self._dirty = True
+            for day, path in files.items():
+                segment = self._segments.get(day)
+                if segment is None or segment.path != path:
+                    segment = self._open_segment(path)
+                    self._segments[day] = segment
+                meta = self._manifest.get(day)
+                if (
+                    meta is None
+                    or meta.get("file") != os.path.basename(path)
+                    or (meta.get("size"), meta.get("mtime_ns")) != self._signature(path)
+                ):
+                    self._manifest[day] = self._summarize(day, segment)
+                    self._dirty = True
+                else:
+                    segment._records = meta.get("records", 0)
+                    segment._live = meta.get("live", 0)
+
+    # ----------------------------------------------------------------- writes
+
+    @staticmethod
+    def day_of(entry: Dict[str, Any]) -> str:
+        ts = normalize_timestamp(entry.get("timestamp"))
+        return ts[:10] if ts else UNDATED_SEGMENT
+
+    def _open_segment(self, path: str) -> JsonlLogStore:
+        segment = JsonlLogStore(path, self.compact_ratio, self.compact_min_records, file_lock=self.file_lock)
+        # Never resurrect a segment file another worker compressed or dropped.
+        segment.create_missing = not os.path.exists(path)
+        return segment
+
+    def _writable_segment(self, day: str) -> JsonlLogStore:
+        segment = self._segments.get(day)
+        if segment is not None and compression_of(segment.path):
+            # Thaw a cold segment back into a plain file before writing to it.
+            plain_path = os.path.join(self.directory, f"{day}.jsonl")
+            with self.file_lock.exclusive():
+                # Another worker may have thawed it while we waited for the lock.
+                if os.path.exists(segment.path):
+                    with open_log_file(segment.path, "r") as src:
+                        atomic_write_lines(plain_path, src)
+                    os.remove(segment.path)
+            segment = None
+            self._manifest.pop(day, None)
+            self._cache.pop(day, None)
+        if segment is None:
+            segment = self._open_segment(os.path.join(self.directory, f"{day}.jsonl"))
+            self._segments[day] = segment
+        if day not in self._manifest:
+            if os.path.exists(segment.path):
+                self._manifest[day] = self._summarize(day, segment)
+            else:
+                self._manifest[day] = {
+                    "file": os.path.basename(segment.path),
+                    "min_ts": None,
+                    "max_ts": None,
+                    "records": 0,
+                    "live": 0,
+                    "counts": {},
+                    "size": 0,
+                    "mtime_ns": 0,
+                }
+        return segment
+
+    def _write_segment(
+        self, day: str, op: Callable[[JsonlLogStore], Any], exclusive: bool = False
+    ) -> Tuple[JsonlLogStore, Any, int]:
+        """Run ``op`` on the writable segment for ``day``.
+
+        Returns the segment, the result of ``op`` and the bytes it appended.
+        Plain appends run under the shared lock; ``exclusive`` is for
+        read-then-write operations (delete, clear) that must see the segment
+        as it is on disk.
+        """
+        segment = self._segments.get(day)
+        if not exclusive and segment is not None and not compression_of(segment.path):
+            segment = self._writable_segment(day)
+            before = segment.appended_bytes
+            try:
+                result = op(segment)
+                segment.create_missing = False
+                return segment, result, segment.appended_bytes - before
+            except FileNotFoundError:
+                pass
+        # The segment is new to us, cold, or another worker just compressed
+        # or dropped it. Hold the lock exclusively so it cannot change again
+        # before the write lands.
+        with self.file_lock.exclusive():
+            self.refresh()
+            segment = self._writable_segment(day)
+            segment.create_missing = True
+            before = segment.appended_bytes
+            try:
+                result = op(segment)
+            finally:
+                segment.create_missing = not os.path.exists(segment.path)
+            return segment, result, segment.appended_bytes - before
+
+    def _touch(self, day: str, segment: JsonlLogStore, written: int) -> None:
+        """Update a segment's manifest entry after we wrote ``written`` bytes to it."""
+        meta = self._manifest[day]
+        size, mtime = self._signature(segment.path)
+        if meta.get("size") is None or size != meta["size"] + written:
+            # Another process wrote to this segment too, so our counts are
+            # incomplete; the next refresh() rescans it.
+            meta["size"] = meta["mtime_ns"] = None
+        else:
+            meta["size"], meta["mtime_ns"] = size, mtime
+        meta["records"] = segment._records
+        meta["live"] = segment._live
+        self._dirty = True
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        self.append_many([entry])
+
+    def append_many(self, entries: List[Dict[str, Any]]) -> None:
+        """Append ``entries`` with one write per day segment."""
+        by_day: Dict[str, List[Dict[str, Any]]] = {}
+        for entry in entries:
+            by_day.setdefault(self.day_of(entry), []).append(entry)
+        with self._lock:
+            for day, group in by_day.items():
+                segment, _, written = self._write_segment(day, lambda seg: seg.append_many(group))
+                meta = self._manifest[day]
+                for entry in group:
+                    key = _count_key(entry)
+                    meta["counts"][key] = meta["counts"].get(key, 0) + 1
+                    ts = normalize_timestamp(entry.get("timestamp"))
+                    if ts:
+                        if meta["min_ts"] is None or ts < meta["min_ts"]:
+                            meta["min_ts"] = ts
+                        if meta["max_ts"] is None or ts > meta["max_ts"]:
+                            meta["max_ts"] = ts
+                self._touch(day, segment, written)
+
+    def import_jsonl(self, jsonl_path: str) -> int:
+        """Split a legacy single-file log into segments, once."""
+        if self._manifest_extra.get("legacy_import") or not os.path.exists(jsonl_path):
+            return 0
+        with self._lock, self.file_lock.exclusive():
+            # Workers start together; only the first one to get here imports.
+            self._load_manifest()
+            if self._manifest_extra.get("legacy_import"):
+                return 0
+            by_day: Dict[str, List[Dict[str, Any]]] = {}
+            for entry in JsonlLogStore(jsonl_path).read_all():
+                by_day.setdefault(self.day_of(entry), []).append(entry)
+            for day, entries in by_day.items():
+                path = os.path.join(self.directory, f"{day}.jsonl")
+                existing = JsonlLogStore(path).read_all() if os.path.exists(path) else []
+                known = {entry["id"] for entry in existing}
+                merged = existing + [entry for entry in entries if entry["id"] not in known]
+                atomic_write_lines(path, (json.dumps(entry) + "\n" for entry in merged))
+            imported = sum(len(entries) for entries in by_day.values())
+            self._manifest_extra["legacy_import"] = {
+                "path": os.path.abspath(jsonl_path),
+                "entries": imported,
+                "at": datetime.utcnow().isoformat(),
+            }
+            self._dirty = True
+            self.refresh()
+            self.flush_manifest()
+        logger.info("Imported %d forensic log entries from %s into daily segments", imported, jsonl_path)
+        return imported
+
+    def delete(self, log_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        with self._lock, self.file_lock.exclusive():
+            self.refresh()
+            # Newest first: recent entries are the ones usually deleted.
+            for day in sorted(self._manifest, reverse=True):
+                if not self._manifest[day].get("live"):
+                    continue
+                entry = next((e for e in self._entries(day) if e.get("id") == log_id), None)
+                if entry is None:
+                    continue
+                if user_id and entry.get("user_id") != user_id:
+                    return None
+                segment, deleted, written = self._write_segment(
+                    day, lambda seg: seg.delete(log_id, user_id=user_id), exclusive=True
+                )
+                if not deleted:
+                    return None
+                counts = self._manifest[day]["counts"]
+                key = _count_key(entry)
+                counts[key] = max(0, counts.get(key, 0) - 1)
+                self._touch(day, segment, written)
+                return deleted
+        return None
+
+    def clear(self, user_id: Optional[str] = None, source_type: Optional[str] = None) -> int:
+        cleared = 0
+        with self._lock, self.file_lock.exclusive():
+            self.refresh()
+            for day in sorted(self._manifest):
+                meta = self._manifest[day]
+                matching = [k for k, n in meta["counts"].items() if n and self._key_matches(k, user_id, source_type)]
+                if not matching:
+                    continue
+                segment, removed, written = self._write_segment(
+                    day, lambda seg: seg.clear(user_id=user_id, source_type=source_type), exclusive=True
+                )
+                cleared += removed
+                meta = self._manifest[day]
+                for key in matching:
+                    meta["counts"][key] = 0
+                self._touch(day, segment, written)
+        return cleared
+
+    # ----------------------------------------------------------------- reads
+
+    @staticmethod
+    def _key_matches(key: str, user_id: Optional[str], source_type: Optional[str]) -> bool:
+        key_user, _, key_source = key.rpartition("|")
+        if user_id and key_user != user_id:
+            return False
+        if source_type and key_source != source_type:
+            return False
+        return True
+
+    def _entries(self, day: str) -> List[Dict[str, Any]]:
+        """Live entries of one segment, cached until the file changes."""
+        segment = self._segments[day]
+        signature = self._signature(segment.path)
+        cached = self._cache.get(day)
+        if cached and cached[0] == signature:
+            return cached[1]
+        entries = segment.read_all()
+        self._segments_read += 1
+        self._cache[day] = (signature, entries)
+        # Keep only a handful of segments in memory (the recent ones are hot).
+        while len(self._cache) > 8:
+            self._cache.pop(min(self._cache))
+        return entries
+
+    def read_all(self) -> List[Dict[str, Any]]:
+        with self._lock, self.file_lock.shared():
+            self.refresh()
+            logs: List[Dict[str, Any]] = []
+            for day in sorted(self._manifest, reverse=True):
+                logs.extend(self._entries(day))
+        return filter_logs(logs)
+
+    def _candidate_days(self, start: Optional[str], end: Optional[str]) -> List[str]:
+        days = []
+        for day in sorted(self._manifest, reverse=True):
+            meta = self._manifest[day]
+            if not meta.get("live"):
+                continue
+            if start or end:
+                if day == UNDATED_SEGMENT or meta.get("min_ts") is None:
+                    continue
+                if start and meta["max_ts"] < start:
+                    continue
+                if end and meta["min_ts"] > end:
+                    continue
+            days.append(day)
+        # "undated" sorts after the dated segments, matching filter_logs' order.
+        days.sort(key=lambda d: "" if d == UNDATED_SEGMENT else d, reverse=True)
+        return days
+
+    def query(
+        self,
+        user_id: Optional[str] = None,
+        source_type: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        offset: int = 0,
+        limit: int = 50,
+        cursor: Optional[Tuple[Any, Any]] = None,
+        include_total: bool = True,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Return one page and the total match count.
+
+        With ``cursor`` the page starts right after that entry: segments
+        newer than the cursor are skipped via the manifest, so a deep page
+        reads as little as the first one.
+        """
+        start = normalize_timestamp(start_date)
+        end = normalize_timestamp(end_date)
+        key = cursor_key(cursor) if cursor is not None else None
+        cursor_ts = normalize_timestamp(cursor[0]) if cursor is not None else None
+        items: List[Dict[str, Any]] = []
+        total = 0
+        skip = offset
+        with self._lock, self.file_lock.shared():
+            self.refresh()
+            for day in self._candidate_days(start, end):
+                meta = self._manifest[day]
+                inside = (not start or meta["min_ts"] >= start) and (not end or meta["max_ts"] <= end)
+                wanted = len(items) < limit
+                # Undated entries list after every dated one, so a dated
+                # cursor takes the undated segment whole.
+                keyed = key is not None and (day != UNDATED_SEGMENT or cursor_ts is None)
+                if key is not None and day != UNDATED_SEGMENT and (cursor_ts is None or meta["min_ts"] > cursor_ts):
+                    wanted = False
+                if inside:
+                    count = sum(n for k, n in meta["counts"].items() if self._key_matches(k, user_id, source_type))
+                    total += count
+                    if count == 0 or not wanted:
+                        continue
+                    if key is None and skip >= count:
+                        skip -= count
+                        continue
+                entries = filter_logs(
+                    list(self._entries(day)),
+                    user_id=user_id,
+                    source_type=source_type,
+                    start_date=start,
+                    end_date=end,
+                )
+                if not inside:
+                    total += len(entries)
+                if not wanted:
+                    continue
+                if key is not None:
+                    if keyed:
+                        entries = [entry for entry in entries if log_sort_key(entry) < key]
+                    items.extend(entries[:limit - len(items)])
+                else:
+                    items.extend(entries[skip:skip + limit - len(items)])
+                    skip = max(0, skip - len(entries))
+        return items, total if include_total else None
+
+    def iter_query(
+        self,
+        user_id: Optional[str] = None,
+        source_type: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Every matching entry, newest first, read one segment at a time.
+
+        Locks are held only while a segment is read, so a slow consumer does
+        not hold up writers.
+        """
+        start = normalize_timestamp(start_date)
+        end = normalize_timestamp(end_date)
+        with self._lock, self.file_lock.shared():
+            self.refresh()
+            days = self._candidate_days(start, end)
+        for day in days:
+            with self._lock, self.file_lock.shared():
+                self.refresh()
+                if day not in self._manifest:
+                    continue
+                entries = filter_logs(
+                    list(self._entries(day)),
+                    user_id=user_id,
+                    source_type=source_type,
+                    start_date=start,
+                    end_date=end,
+                )
+            yield from entries
+
+    # ----------------------------------------------------------------- maintenance
+
+    def _cutoff(self, days: int) -> str:
+        return (datetime.utcnow() - timedelta(days=days)).date().isoformat()
+
+    def maintain(self) -> None:
+        """Apply retention, compress cold segments, compact and flush the manifest."""
+        with self._lock, self.file_lock.exclusive():
+            self.refresh()
+            if self.retention_days > 0:
+                cutoff = self._cutoff(self.retention_days)
+                for day in [d for d in self._manifest if d != UNDATED_SEGMENT and d < cutoff]:
+                    if os.path.exists(self._segments[day].path):
+                        os.remove(self._segments[day].path)
+                    self._segments.pop(day, None)
+                    self._manifest.pop(day, None)
+                    self._cache.pop(day, None)
+                    self._dirty = True
+                    logger.info("Dropped log segment %s (retention %d days)", day, self.retention_days)
+
+            for day, segment in list(self._segments.items()):
+                if segment.compact_if_needed():
+                    self._manifest[day] = self._summarize(day, segment)
+                    self._dirty = True
+
+            if self.compress_after_days > 0:
+                cutoff = self._cutoff(self.compress_after_days)
+                suffix = ".jsonl.zst" if self.compression == "zstd" else ".jsonl.gz"
+                for day, segment in list(self._segments.items()):
+                    if day == UNDATED_SEGMENT or day >= cutoff or compression_of(segment.path):
+                        continue
+                    cold_path = os.path.join(self.directory, day + suffix)
+                    atomic_write_lines(cold_path, (json.dumps(e) + "\n" for e in segment.read_all()))
+                    os.remove(segment.path)
+                    self._segments[day] = self._open_segment(cold_path)
+                    self._manifest[day] = self._summarize(day, self._segments[day])
+                    self._cache.pop(day, None)
+                    self._dirty = True
+
+            self.flush_manifest()
+
+    def start_maintenance(self, interval_s: float = 60.0) -> None:
+        if self._maintenance is not None:
+            return
+
+        def run() -> None:
+            while not self._stop.wait(interval_s):
+                try:
+                    self.maintain()
+                except Exception as exc:
+                    logger.warning("Log segment maintenance failed: %s", exc)
+
+        self._maintenance = threading.Thread(target=run, name="log-segment-maintenance", daemon=True)
+        self._maintenance.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.flush_manifest()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "segments": len(self._manifest),
+                "compressed_segments": sum(1 for s in self._segments.values() if compression_of(s.path)),
+                "live_entries": sum(m.get("live", 0) for m in self._manifest.values()),
+                "records": sum(m.get("records", 0) for m in self._manifest.values()),
+                "segments_read": self._segments_read,
+                "retention_days": self.retention_days,
+                "compress_after_days": self.compress_after_days,
+            }
+
+
+class SqliteLogStore:
+    """Forensic log in a local SQLite database (WAL mode).
+
+    Filters, ordering and pagination run in SQL against indexes on
+    timestamp, user_id and source_type, so a page costs the same no matter
+    how long the history is. Each thread gets its own connection; WAL lets
+    readers proceed while a write is in progress.
+    """
+
+    backend = "sqlite"
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS forensic_logs (
+            id TEXT PRIMARY KEY,
+            ts TEXT,
+            user_id TEXT,
+            source_type TEXT,
+            entry TEXT NOT NULL
+        )
+        """,
+        # Indexes end in (ts, id) so keyset pages are a plain index seek.
+        "DROP INDEX IF EXISTS idx_forensic_logs_ts",
+        "DROP INDEX IF EXISTS idx_forensic_logs_user_ts",
+        "DROP INDEX IF EXISTS idx_forensic_logs_source_ts",
+        "DROP INDEX IF EXISTS idx_forensic_logs_user_source_ts",
+        "CREATE INDEX IF NOT EXISTS idx_forensic_logs_ts_id ON forensic_logs(ts, id)",
+        "CREATE INDEX IF NOT EXISTS idx_forensic_logs_user_ts_id ON forensic_logs(user_id, ts, id)",
+        "CREATE INDEX IF NOT EXISTS idx_forensic_logs_source_ts_id ON forensic_logs(source_type, ts, id)",
+        "CREATE INDEX IF NOT EXISTS idx_forensic_logs_user_source_ts_id ON forensic_logs(user_id, source_type, ts, id)",
+        "CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT)",
+    )
+
+    def __init__(self, path: str, import_from: Optional[str] = None) -> None:
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        with conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+        if import_from:
+            self.import_jsonl(import_from)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row(entry: Dict[str, Any]) -> Tuple[str, Optional[str], Any, Any, str]:
+        return (
+            entry["id"],
+            normalize_timestamp(entry.get("timestamp")),
+            entry.get("user_id"),
+            entry.get("source_type"),
+            json.dumps(entry),
+        )
+
+    def insert_many(self, entries: Iterable[Dict[str, Any]]) -> int:
+        conn = self._conn()
+        rows = []
+        for entry in entries:
+            if not entry.get("id"):
+                entry["id"] = str(uuid.uuid4())
+            rows.append(self._row(entry))
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO forensic_logs VALUES (?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def import_jsonl(self, jsonl_path: str, batch_size: int = 5000) -> int:
+        """Copy an existing ``detection_logs.jsonl`` into the database once."""
+        conn = self._conn()
+        marker = conn.execute("SELECT value FROM store_meta WHERE key = 'jsonl_imported'").fetchone()
+        if marker or not os.path.exists(jsonl_path):
+            return 0
+
+        imported = 0
+        batch: List[Dict[str, Any]] = []
+        with open(jsonl_path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    batch.append(json.loads(line))
+                except ValueError:
+                    logger.warning("Skipping unreadable line while importing %s", jsonl_path)
+                    continue
+                if len(batch) >= batch_size:
+                    imported += self.insert_many(batch)
+                    batch = []
+        if batch:
+            imported += self.insert_many(batch)
+
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO store_meta VALUES ('jsonl_imported', ?)",
+                (json.dumps({"path": jsonl_path, "entries": imported, "at": datetime.utcnow().isoformat()}),),
+            )
+        logger.info("Imported %d forensic log entries from %s", imported, jsonl_path)
+        return imported
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        self.insert_many([entry])
+
+    def append_many(self, entries: List[Dict[str, Any]]) -> None:
+        self.insert_many(entries)
+
+    @staticmethod
+    def _where(
+        user_id: Optional[str],
+        source_type: Optional[str],
+        start_date: Optional[str],
+        end_date: Optional[str],
+    ) -> Tuple[str, List[Any]]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        if user_id:
+            clauses.append("user_id = ?")
+            params.append(user_id)
+        if source_type:
+            clauses.append("source_type = ?")
+            params.append(source_type)
+        start = normalize_timestamp(start_date)
+        end = normalize_timestamp(end_date)
+        if start:
+            clauses.append("ts >= ?")
+            params.append(start)
+        if end:
+            clauses.append("ts <= ?")
+            params.append(end)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def read_all(self) -> List[Dict[str, Any]]:
+        rows = self._conn().execute("SELECT entry FROM forensic_logs ORDER BY ts DESC, id DESC")
+        return [json.loads(row[0]) for row in rows]
+
+    def query(
+        self,
+        user_id: Optional[str] = None,
+        source_type: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        offset: int = 0,
+        limit: int = 50,
+        cursor: Optional[Tuple[Any, Any]] = None,
+        include_total: bool = True,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Return one page and the total match count.
+
+        With ``cursor`` the page is a keyset seek on ``(ts, id)`` instead of
+        an OFFSET scan, so every page costs the same.
+        """
+        where, params = self._where(user_id, source_type, start_date, end_date)
+        conn = self._conn()
+        if cursor is not None:
+            cursor_ts = normalize_timestamp(cursor[0])
+            cursor_id = str(cursor[1] or "")
+            prefix = f"{where} AND" if where else " WHERE"
+
+            def seek(condition: str, extra: List[Any], count: int) -> List[Any]:
+                return conn.execute(
+                    f"SELECT entry FROM forensic_logs{prefix} {condition} ORDER BY ts DESC, id DESC LIMIT ?",
+                    params + extra + [count],
+                ).fetchall()
+
+            if cursor_ts:
+                rows = seek("(ts, id) < (?, ?)", [cursor_ts, cursor_id], limit)
+                if len(rows) < limit:
+                    # Entries without a timestamp list after all dated ones.
+                    rows += seek("ts IS NULL", [], limit - len(rows))
+            else:
+                rows = seek("ts IS NULL AND id < ?", [cursor_id], limit)
+        else:
+            rows = conn.execute(
+                f"SELECT entry FROM forensic_logs{where} ORDER BY ts DESC, id DESC LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            ).fetchall()
+        total = None
+        if include_total:
+            total = conn.execute(f"SELECT COUNT(*) FROM forensic_logs{where}", params).fetchone()[0]
+        return [json.loads(row[0]) for row in rows], total
+
+    def iter_query(
+        self,
+        user_id: Optional[str] = None,
+        source_type: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        page_size: int = 500,
+    ) -> Iterator[Dict[str, Any]]:
+        """Every matching entry, newest first, fetched in keyset pages."""
+        cursor = None
+        while True:
+            items, _ = self.query(
+                user_id=user_id,
+                source_type=source_type,
+                start_date=start_date,
+                end_date=end_date,
+                limit=page_size,
+                cursor=cursor,
+                include_total=False,
+            )
+            yield from items
+            if len(items) < page_size:
+                return
+            cursor = (items[-1].get("timestamp"), items[-1].get("id"))
+
+    def delete(self, log_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        where = "id = ?"
+        params: List[Any] = [log_id]
+        if user_id:
+            where += " AND user_id = ?"
+            params.append(user_id)
+        conn = self._conn()
+        with conn:
+            row = conn.execute(f"SELECT entry FROM forensic_logs WHERE {where}", params).fetchone()
+            # Another writer may have deleted it since the SELECT.
+            if row is None or conn.execute(f"DELETE FROM forensic_logs WHERE {where}", params).rowcount == 0:
+                return None
+        return json.loads(row[0])
+
+    def clear(self, user_id: Optional[str] = None, source_type: Optional[str] = None) -> int:
+        where, params = self._where(user_id, source_type, None, None)
+        conn = self._conn()
+        with conn:
+            return conn.execute(f"DELETE FROM forensic_logs{where}", params).rowcount
+
+    def stop(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path}
+
+
+def create_local_log_store(base_dir: str) -> Any:
+    """Build the local log store selected by ``LOCAL_LOG_BACKEND``.
+
+    ``segmented`` (default) keeps daily segments under ``LOCAL_LOG_DIR``,
+    ``jsonl`` a single file and ``sqlite`` a SQLite database. The segmented
+    and sqlite stores import an existing ``detection_logs.jsonl`` once.
+    """
+    jsonl_path = os.getenv("LOCAL_LOG_FILE", os.path.join(base_dir, "detection_logs.jsonl"))
+    backend = os.getenv("LOCAL_LOG_BACKEND", "segmented").lower()
+    compact_ratio = float(os.getenv("LOCAL_LOG_COMPACT_RATIO", "0.3"))
+    compact_min_records = int(os.getenv("LOCAL_LOG_COMPACT_MIN_RECORDS", "100"))
+    maintenance_interval = float(os.getenv("LOCAL_LOG_COMPACT_INTERVAL_S", "60"))
+
+    if backend == "sqlite":
+        sqlite_path = os.getenv("LOCAL_LOG_SQLITE_PATH", os.path.join(base_dir, "detection_logs.sqlite3"))
+        return SqliteLogStore(sqlite_path, import_from=jsonl_path)
+    if backend == "jsonl":
+        store = JsonlLogStore(jsonl_path, compact_ratio=compact_ratio, compact_min_records=compact_min_records)
+        store.start_compactor(maintenance_interval)
+        return store
+    if backend != "segmented":
+        logger.warning("Unknown LOCAL_LOG_BACKEND %r, using segmented", backend)
+
+    store = SegmentedLogStore(
+        os.getenv("LOCAL_LOG_DIR", os.path.join(base_dir, "detection_logs")),
+        retention_days=int(os.getenv("LOCAL_LOG_RETENTION_DAYS", "0")),
+        compress_after_days=int(os.getenv("LOCAL_LOG_COMPRESS_AFTER_DAYS", "0")),
+        compression=os.getenv("LOCAL_LOG_COMPRESSION", "gzip").lower(),
+        compact_ratio=compact_ratio,
+        compact_min_records=compact_min_records,
+        legacy_path=jsonl_path,
+    )
+    store.start_maintenance(maintenance_interval)
+    return store
@@ -0,0 +1,431 @@
+import bisect
+import glob
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from log_store import FileLock, atomic_write_lines
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers a cached token check (~µs) up to a slow video upload.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[str, ...]
+
+
+class _Child:
+    """A metric with its label values bound, as returned by ``labels()``."""
+
+    def __init__(self, metric: "_Metric", key: LabelKey) -> None:
+        self._metric = metric
+        self._key = key
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._metric._inc(self._key, amount)
+
+    def set(self, value: float) -> None:
+        self._metric._set(self._key, value)
+
+    def observe(self, value: float) -> None:
+        self._metric._observe(self._key, value)
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observe the seconds spent in the ``with`` block, even if it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._metric._observe(self._key, time.perf_counter() - started)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "Registry", name: str, documentation: str, labelnames: Sequence[str]) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = registry._lock
+        self._values: Dict[LabelKey, Any] = {}
+        self._children: Dict[LabelKey, _Child] = {}
+
+    def labels(self, *values: Any, **kwargs: Any) -> _Child:
+        if kwargs:
+            values = tuple(kwargs.get(name, "") for name in self.labelnames)
+        key = tuple("" if v is None else str(v) for v in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        child = self._children.get(key)
+        if child is None:
+            child = self._children.setdefault(key, _Child(self, key))
+        return child
+
+    # Unlabeled metrics are used directly.
+    def inc(self, amount: float = 1.0) -> None:
+        self._inc((), amount)
+
+    def set(self, value: float) -> None:
+        self._set((), value)
+
+    def observe(self, value: float) -> None:
+        self._observe((), value)
+
+    def time(self) -> Any:
+        return self.labels().time()
+
+    def _inc(self, key: LabelKey, amount: float) -> None:
+        raise TypeError(f"{self.kind} {self.name} cannot be incremented")
+
+    def _set(self, key: LabelKey, value: float) -> None:
+        raise TypeError(f"{self.kind} {self.name} cannot be set")
+
+    def _observe(self, key: LabelKey, value: float) -> None:
+        raise TypeError(f"{self.kind} {self.name} cannot observe values")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            values = [
+                [list(key), {"b": list(value["b"]), "s": value["s"]} if isinstance(value, dict) else value]
+                for key, value in self._values.items()
+            ]
+        return {"type": self.kind, "help": self.documentation, "labelnames": list(self.labelnames), "values": values}
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _inc(self, key: LabelKey, amount: float) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only go up")
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, registry: "Registry", name: str, documentation: str, labelnames: Sequence[str], multiprocess_mode: str = "sum") -> None:
+        super().__init__(registry, name, documentation, labelnames)
+        if multiprocess_mode not in ("sum", "max"):
+            raise ValueError("multiprocess_mode must be 'sum' or 'max'")
+        self.multiprocess_mode = multiprocess_mode
+
+    def _set(self, key: LabelKey, value: float) -> None:
+        with self._lock:
+            self._values[key] = float(value)
+
+    def _inc(self, key: LabelKey, amount: float) -> None:
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        data = super().snapshot()
+        data["multiprocess_mode"] = self.multiprocess_mode
+        return data
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram; values are ``{"b": per-bucket counts, "s": sum}``."""
+
+    kind = "histogram"
+
+    def __init__(self, registry: "Registry", name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _observe(self, key: LabelKey, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)  # len(buckets) is +Inf
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"b": [0] * (len(self.buckets) + 1), "s": 0.0}
+            state["b"][index] += 1
+            state["s"] += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        data = super().snapshot()
+        data["buckets"] = list(self.buckets)
+        return data
+
+
+def _merge(into: Dict[str, Any], snapshot: Dict[str, Any], include_gauges: bool = True) -> None:
+    """Add one process's snapshot to ``into`` (counters and histograms sum)."""
+    for name, family in snapshot.items():
+        if family["type"] == "gauge" and not include_gauges:
+            continue
+        target = into.setdefault(name, {k: v for k, v in family.items() if k != "values"})
+        merged = target.setdefault("_merged", {})
+        for labels, value in family["values"]:
+            key = tuple(labels)
+            current = merged.get(key)
+            if family["type"] == "histogram":
+                if current is None or len(current["b"]) != len(value["b"]):
+                    merged[key] = {"b": list(value["b"]), "s": value["s"]}
+                else:
+                    current["b"] = [a + b for a, b in zip(current["b"], value["b"])]
+                    current["s"] += value["s"]
+            elif current is None:
+                merged[key] = value
+            elif family.get("multiprocess_mode") == "max":
+                merged[key] = max(current, value)
+            else:
+                merged[key] = current + value
+
+
+def _finish(merged: Dict[str, Any]) -> Dict[str, Any]:
+    for family in merged.values():
+        family["values"] = [[list(key), value] for key, value in family.pop("_merged", {}).items()]
+    return merged
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Registry:
+    """Metric families plus the Prometheus text exposition.
+
+    Collectors registered with ``add_collector`` run before each snapshot and
+    are the place to set gauges that mirror other components (queue depths).
+
+    With ``enable_multiprocess(directory)`` every process writes its values
+    to ``<directory>/metrics_<pid>.json`` every ``flush_interval_s`` and a
+    scrape merges all files, so any pre-fork worker can answer ``/metrics``.
+    Counters and histograms are summed over all processes, dead ones included
+    (their files are folded into ``dead.json`` by the next process to start).
+    Gauges only count live processes and are summed or maxed per gauge.
+    Other workers' values are at most ``flush_interval_s`` old.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self.directory: Optional[str] = None
+        self.flush_interval_s = 1.0
+        self._file_lock: Optional[FileLock] = None
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), multiprocess_mode: str = "sum") -> Gauge:
+        return self._register(Gauge(self, name, documentation, labelnames, multiprocess_mode))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        self._collectors.append(collector)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """This process's values (after running the collectors)."""
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as exc:
+                logger.warning("Metrics collector failed: %s", exc)
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    # ----------------------------------------------------------------- multi-process
+
+    def enable_multiprocess(self, directory: str, flush_interval_s: float = 1.0) -> None:
+        self.directory = directory
+        self.flush_interval_s = flush_interval_s
+        os.makedirs(directory, exist_ok=True)
+        self._file_lock = FileLock(os.path.join(directory, ".lock"))
+        self._compact_dead(startup=True)
+        if self._flusher is None:
+            self._start_flusher()
+            # Pre-fork servers that import the app before forking (gunicorn
+            # --preload): the child starts from zero, so the parent's values
+            # are not counted twice, and needs its own flusher thread.
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start_flusher(self) -> None:
+        def run() -> None:
+            while not self._stop.wait(self.flush_interval_s):
+                try:
+                    self.flush()
+                except Exception as exc:
+                    logger.warning("Metrics flush failed: %s", exc)
+
+        self._flusher = threading.Thread(target=run, name="metrics-flush", daemon=True)
+        self._flusher.start()
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+        for metric in self._metrics.values():
+            metric._lock = self._lock
+            metric._values = {}
+        self._stop = threading.Event()
+        self._start_flusher()
+
+    def _own_path(self) -> str:
+        return os.path.join(self.directory, f"metrics_{os.getpid()}.json")
+
+    def flush(self) -> None:
+        if self.directory is None:
+            return
+        atomic_write_lines(self._own_path(), [json.dumps(self.snapshot(), separators=(",", ":"))])
+
+    def stop(self) -> None:
+        self._stop.set()
+        try:
+            self.flush()
+        except Exception as exc:
+            logger.warning("Metrics flush failed: %s", exc)
+
+    @staticmethod
+    def _read(path: str) -> Dict[str, Any]:
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _compact_dead(self, startup: bool = False) -> None:
+        """Fold files of exited processes into ``dead.json``.
+
+        At ``startup`` a file with our own pid is left over from an exited
+        process whose pid was reused, so it is folded too.
+        """
+        dead_path = os.path.join(self.directory, "dead.json")
+        with self._file_lock.exclusive():
+            merged: Dict[str, Any] = {}
+            _merge(merged, self._read(dead_path), include_gauges=False)
+            folded = []
+            for path in glob.glob(os.path.join(self.directory, "metrics_*.json")):
+                try:
+                    pid = int(os.path.basename(path)[len("metrics_"):-len(".json")])
+                except ValueError:
+                    continue
+                own = pid == os.getpid()
+                if (own and startup) or (not own and not _pid_alive(pid)):
+                    _merge(merged, self._read(path), include_gauges=False)
+                    folded.append(path)
+            if not folded:
+                return
+            atomic_write_lines(dead_path, [json.dumps(_finish(merged), separators=(",", ":"))])
+            for path in folded:
+                os.remove(path)
+        logger.info("Folded metrics of %d exited processes into %s", len(folded), dead_path)
+
+    def collect(self) -> Dict[str, Any]:
+        """Values to expose: this process, or all processes in multi-process mode."""
+        if self.directory is None:
+            return self.snapshot()
+        self.flush()
+        merged: Dict[str, Any] = {}
+        with self._file_lock.shared():
+            _merge(merged, self._read(os.path.join(self.directory, "dead.json")), include_gauges=False)
+            for path in glob.glob(os.path.join(self.directory, "metrics_*.json")):
+                try:
+                    pid = int(os.path.basename(path)[len("metrics_"):-len(".json")])
+                except ValueError:
+                    continue
+                _merge(merged, self._read(path), include_gauges=_pid_alive(pid))
+        return _finish(merged)
+
+    # ----------------------------------------------------------------- exposition
+
+    def exposition(self) -> str:
+        """Prometheus text format (version 0.0.4)."""
+        lines: List[str] = []
+        for name, family in sorted(self.collect().items()):
+            lines.append(f"# HELP {name} {_escape_help(family['help'])}")
+            lines.append(f"# TYPE {name} {family['type']}")
+            labelnames = family["labelnames"]
+            for labels, value in sorted(family["values"], key=lambda item: item[0]):
+                pairs = list(zip(labelnames, labels))
+                if family["type"] == "histogram":
+                    cumulative = 0
+                    bounds = list(family["buckets"]) + [math.inf]
+                    for bound, count in zip(bounds, value["b"]):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(pairs + [('le', _number(bound))])} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(pairs)} {_number(value['s'])}")
+                    lines.append(f"{name}_count{_labels(pairs)} {cumulative}")
+                else:
+                    lines.append(f"{name}{_labels(pairs)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs: List[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(str(value))}"' for name, value in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "verifixia_stage_duration_seconds",
+    "Time spent in each stage of request handling",
+    ["stage"],
+)
+PREDICTIONS = REGISTRY.counter(
+    "verifixia_predictions_total",
+    "Upload verdicts by model, prediction and the path that produced them (model, heuristic, random, video)",
+    ["model_used", "prediction", "path"],
+)
+QUEUE_DEPTH = REGISTRY.gauge(
+    "verifixia_queue_depth",
+    "Items waiting in in-process queues (upload pipeline stages, write-behind sinks, batchers)",
+    ["queue"],
+    multiprocess_mode="sum",
+)
+MODEL_LOADED = REGISTRY.gauge(
+    "verifixia_model_loaded",
+    "1 when the PyTorch model is loaded, 0 when predictions use the fallbacks",
+    multiprocess_mode="max",
+)
+MODEL_INFO = REGISTRY.gauge(
+    "verifixia_model_info",
+    "Version of the loaded model, as labels",
+    ["version", "architecture", "device"],
+    multiprocess_mode="max",
+)
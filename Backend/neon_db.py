@@ -1,13 +1,262 @@
 import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime, timezone
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from psycopg2.pool import SimpleConnectionPool
+from psycopg2 import extensions
+from psycopg2.extras import RealDictCursor, execute_values
 from dotenv import load_dotenv
 import logging
 
+from metrics import STAGE_SECONDS
+from tracing import span
+
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Serializes schema changes between app workers (pg_advisory_lock key).
+SCHEMA_LOCK_KEY = 0x6465746c  # "detl"
+
+DETECTION_LOGS_PARTITIONED_DDL = """
+CREATE TABLE detection_logs (
+    id INTEGER NOT NULL DEFAULT nextval('detection_logs_id_seq'),
+    filename VARCHAR(255) NOT NULL,
+    prediction VARCHAR(10) NOT NULL,
+    confidence FLOAT NOT NULL,
+    timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    user_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+    client_id UUID,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+"""
+
+# Batched inserts carry a client-generated id so a replayed batch skips the
+# rows that already went in; unique indexes on partitioned tables must
+# include the partition key.
+DETECTION_LOGS_CLIENT_ID_INDEX = "(client_id, timestamp)"
+
+# Serves the newest-first keyset listing of /api/database/logs.
+DETECTION_LOGS_LISTING_INDEX = "(timestamp DESC, id DESC)"
+
+_BOUND = re.compile(r"FROM \((MINVALUE|'[^']*')\) TO \((MAXVALUE|'[^']*')\)")
+
+
+def _month_start(value):
+    return value.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(value, months):
+    month = value.month - 1 + months
+    return value.replace(year=value.year + month // 12, month=month % 12 + 1)
+
+
+def _parse_bound(text):
+    if text in ("MINVALUE", "MAXVALUE"):
+        return None
+    return datetime.fromisoformat(text.strip("'"))
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the pool's acquire timeout."""
+
+
+class ConnectionPool:
+    """Thread-safe psycopg2 connection pool with validation and metrics.
+
+    Keeps between ``minconn`` and ``maxconn`` connections. ``acquire`` waits
+    up to ``acquire_timeout_s`` for a free connection and raises
+    ``PoolTimeout`` after that. A connection idle for longer than
+    ``validate_after_s`` is pinged before it is handed out, and dead ones are
+    replaced. Connections returned broken or mid-transaction are closed or
+    rolled back instead of being reused as they are. Every session gets the
+    configured ``statement_timeout``.
+    """
+
+    def __init__(
+        self,
+        dsn,
+        minconn=1,
+        maxconn=10,
+        acquire_timeout_s=5.0,
+        validate_after_s=30.0,
+        statement_timeout_ms=15000,
+        connect_timeout_s=5,
+        connect=psycopg2.connect,
+    ):
+        self.dsn = dsn
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn, self.minconn)
+        self.acquire_timeout_s = acquire_timeout_s
+        self.validate_after_s = validate_after_s
+        self.statement_timeout_ms = statement_timeout_ms
+        self.connect_timeout_s = connect_timeout_s
+        self._connect = connect
+        self._idle = deque()  # (conn, returned_at), most recently used on the right
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self.acquired = 0
+        self.timeouts = 0
+        self.created = 0
+        self.discarded = 0
+        self.validation_failures = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self.peak_in_use = 0
+        for _ in range(self.minconn):
+            self._idle.append((self._new_connection(), time.monotonic()))
+            self._size += 1
+
+    def _new_connection(self):
+        options = f"-c statement_timeout={int(self.statement_timeout_ms)}" if self.statement_timeout_ms else None
+        conn = self._connect(self.dsn, connect_timeout=self.connect_timeout_s, options=options)
+        self.created += 1
+        return conn
+
+    def _validate(self, conn):
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        started = time.monotonic()
+        deadline = started + self.acquire_timeout_s
+        while True:
+            conn = None
+            returned_at = None
+            with self._cond:
+                if self._closed:
+                    raise Exception("Database connection pool is closed")
+                self._waiting += 1
+                try:
+                    while not self._idle and self._size >= self.maxconn:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.timeouts += 1
+                            raise PoolTimeout(
+                                f"No database connection free after {self.acquire_timeout_s}s "
+                                f"({self._in_use}/{self.maxconn} in use)"
+                            )
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                else:
+                    self._size += 1
+                self._in_use += 1
+
+            try:
+                if conn is None:
+                    conn = self._new_connection()
+                elif conn.closed or (
+                    time.monotonic() - returned_at > self.validate_after_s and not self._validate(conn)
+                ):
+                    self.validation_failures += 1
+                    self._discard(conn)
+                    continue
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+
+            waited_ms = (time.monotonic() - started) * 1000
+            with self._cond:
+                self.acquired += 1
+                self.wait_ms_total += waited_ms
+                self.wait_ms_max = max(self.wait_ms_max, waited_ms)
+                self.peak_in_use = max(self.peak_in_use, self._in_use)
+            return conn
+
+    def _discard(self, conn):
+        self._close(conn)
+        with self._cond:
+            self._size -= 1
+            self._in_use -= 1
+            self.discarded += 1
+            self._cond.notify()
+
+    def release(self, conn, broken=False):
+        """Return ``conn``; broken or unusable connections are closed instead."""
+        if not broken and not conn.closed:
+            status = conn.get_transaction_status()
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                broken = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    broken = True
+        if broken or conn.closed or self._closed:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; it is discarded if the server connection broke."""
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "min": self.minconn,
+                "max": self.maxconn,
+                "peak_in_use": self.peak_in_use,
+                "acquired": self.acquired,
+                "timeouts": self.timeouts,
+                "created": self.created,
+                "discarded": self.discarded,
+                "validation_failures": self.validation_failures,
+                "avg_wait_ms": round(self.wait_ms_total / self.acquired, 2) if self.acquired else 0.0,
+                "max_wait_ms": round(self.wait_ms_max, 2),
+            }
+
+
 class NeonDB:
     def __init__(self):
         self.database_url = os.getenv("NETLIFY_DATABASE_URL") or os.getenv("DATABASE_URL")
@@ -16,50 +265,96 @@ class NeonDB:
             self.pool = None
         else:
             try:
-                self.pool = SimpleConnectionPool(1, 5, self.database_url)
+                self.pool = ConnectionPool(
+                    self.database_url,
+                    minconn=int(os.getenv("NEON_POOL_MIN", "1")),
+                    maxconn=int(os.getenv("NEON_POOL_MAX", "10")),
+                    acquire_timeout_s=float(os.getenv("NEON_POOL_TIMEOUT_S", "5")),
+                    validate_after_s=float(os.getenv("NEON_POOL_VALIDATE_AFTER_S", "30")),
+                    statement_timeout_ms=int(os.getenv("NEON_STATEMENT_TIMEOUT_MS", "15000")),
+                    connect_timeout_s=int(os.getenv("NEON_CONNECT_TIMEOUT_S", "5")),
+                )
             except Exception as e:
                 logger.error(f"Failed to create connection pool: {e}")
                 self.pool = None
+        self.partitioned = os.getenv("NEON_PARTITIONED", "false").lower() in ("1", "true", "yes")
+        self.partition_premake_months = int(os.getenv("NEON_PARTITION_PREMAKE_MONTHS", "3"))
+        self.retention_months = int(os.getenv("NEON_RETENTION_MONTHS", "0"))
+        self.last_partition_maintenance = None
+        self._maintenance = None
+        self._stop = threading.Event()
 
     def get_connection(self):
         if not self.pool:
             raise Exception("Database connection pool not initialized")
-        return self.pool.getconn()
+        return self.pool.acquire()
 
-    def return_connection(self, conn):
+    def return_connection(self, conn, broken=False):
         if self.pool:
-            self.pool.putconn(conn)
+            self.pool.release(conn, broken=broken)
 
-    def execute_query(self, query, params=None):
+    @contextmanager
+    def connection(self):
+        if not self.pool:
+            raise Exception("Database connection pool not initialized")
+        with self.pool.connection() as conn:
+            yield conn
+
+    @contextmanager
+    def _schema_connection(self, wait=True):
+        """Autocommit connection holding the schema advisory lock, or None if busy."""
+        with self.connection() as conn:
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cursor:
+                    if wait:
+                        cursor.execute("SELECT pg_advisory_lock(%s)", (SCHEMA_LOCK_KEY,))
+                        locked = True
+                    else:
+                        cursor.execute("SELECT pg_try_advisory_lock(%s)", (SCHEMA_LOCK_KEY,))
+                        locked = cursor.fetchone()[0]
+                try:
+                    yield conn if locked else None
+                finally:
+                    if locked and not conn.closed:
+                        conn.autocommit = True
+                        with conn.cursor() as cursor:
+                            cursor.execute("SELECT pg_advisory_unlock(%s)", (SCHEMA_LOCK_KEY,))
+            finally:
+                if not conn.closed:
+                    conn.autocommit = False
+
+    def execute_query(self, query, params=None, commit=False):
         """Execute a single query and return results"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            cursor.execute(query, params or ())
-            return cursor.fetchall()
-        finally:
-            cursor.close()
-            self.return_connection(conn)
+        with span("neon.query"), self.connection() as conn:
+            try:
+                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                    cursor.execute(query, params or ())
+                    rows = cursor.fetchall()
+                if commit:
+                    conn.commit()
+                return rows
+            except Exception:
+                conn.rollback()
+                raise
 
     def execute_update(self, query, params=None):
         """Execute an INSERT, UPDATE, or DELETE query"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.cursor()
-            cursor.execute(query, params or ())
-            conn.commit()
-            return cursor.rowcount
-        except Exception as e:
-            conn.rollback()
-            logger.error(f"Database error: {e}")
-            raise
-        finally:
-            cursor.close()
-            self.return_connection(conn)
+        with span("neon.update"), self.connection() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(query, params or ())
+                    rowcount = cursor.rowcount
+                conn.commit()
+                return rowcount
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Database error: {e}")
+                raise
 
-    def execute_query_single(self, query, params=None):
+    def execute_query_single(self, query, params=None, commit=False):
         """Execute a query and return a single row"""
-        results = self.execute_query(query, params)
+        results = self.execute_query(query, params, commit=commit)
         return results[0] if results else None
 
     def create_tables(self):
@@ -82,6 +377,7 @@ class NeonDB:
             confidence FLOAT NOT NULL,
             timestamp TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
             user_id INTEGER REFERENCES users(id),
+            client_id UUID,
             FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE SET NULL
         );
         """
@@ -90,30 +386,286 @@ class NeonDB:
         CREATE INDEX IF NOT EXISTS idx_detection_logs_timestamp ON detection_logs(timestamp);
         """
 
+        if self.partitioned:
+            self._create_partitioned_tables(create_users_table)
+            return
+
+        with self.connection() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(create_users_table)
+                    cursor.execute(create_detection_logs_table)
+                    cursor.execute(create_index)
+                conn.commit()
+                logger.info("Database tables created successfully")
+            except Exception as e:
+                logger.error(f"Error creating tables: {e}")
+                conn.rollback()
+                return
+
+        with self._schema_connection() as conn:
+            with conn.cursor() as cursor:
+                self._create_index_concurrently(
+                    cursor, "idx_detection_logs_ts_id", "detection_logs", DETECTION_LOGS_LISTING_INDEX
+                )
+                self._ensure_client_id(cursor)
+
+    # ----------------------------------------------------------------- partitioning
+
+    def _create_index_concurrently(self, cursor, name, table, columns, unique=False):
+        """Build an index without blocking writes; rebuilds one left invalid by a failed build."""
+        cursor.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", (name,))
+        row = cursor.fetchone()
+        if row and row[0]:
+            return
+        if row:
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        kind = "UNIQUE INDEX" if unique else "INDEX"
+        logger.info(f"Building index {name} on {table}")
+        cursor.execute(f"CREATE {kind} CONCURRENTLY {name} ON {table} {columns}")
+
+    def _create_partitioned_tables(self, create_users_table):
+        """Create, or migrate to, a detection_logs table range-partitioned by month."""
+        with self._schema_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(create_users_table)
+                cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('detection_logs')")
+                row = cursor.fetchone()
+                relkind = row[0] if row else None
+                if relkind == "r":
+                    self._migrate_to_partitioned(conn)
+                elif relkind is None:
+                    cursor.execute("CREATE SEQUENCE IF NOT EXISTS detection_logs_id_seq AS INTEGER")
+                    cursor.execute(DETECTION_LOGS_PARTITIONED_DDL)
+                    cursor.execute("ALTER SEQUENCE detection_logs_id_seq OWNED BY detection_logs.id")
+                    cursor.execute(
+                        f"CREATE INDEX IF NOT EXISTS idx_detection_logs_ts_id "
+                        f"ON detection_logs {DETECTION_LOGS_LISTING_INDEX}"
+                    )
+                    logger.info("Created partitioned detection_logs table")
+            self._maintain_partitions(conn)
+            with conn.cursor() as cursor:
+                self._ensure_client_id(cursor, partitioned=True)
+
+    def _ensure_client_id(self, cursor, partitioned=False):
+        """Add ``client_id`` and its unique index to a table created before it existed.
+
+        Adding a nullable column only touches the catalog. On a partitioned
+        table the parent index is created ``ON ONLY`` and every partition's
+        index is built ``CONCURRENTLY`` and attached, so writes never block;
+        partitions created later get the index from the parent.
+        """
+        cursor.execute("ALTER TABLE detection_logs ADD COLUMN IF NOT EXISTS client_id UUID")
+        if not partitioned:
+            self._create_index_concurrently(
+                cursor, "idx_detection_logs_client_id", "detection_logs", DETECTION_LOGS_CLIENT_ID_INDEX, unique=True
+            )
+            return
+        cursor.execute(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS idx_detection_logs_client_id "
+            f"ON ONLY detection_logs {DETECTION_LOGS_CLIENT_ID_INDEX}"
+        )
+        for name, _, _ in self._partitions(cursor):
+            self._create_index_concurrently(
+                cursor, f"{name}_client_id", name, DETECTION_LOGS_CLIENT_ID_INDEX, unique=True
+            )
+            # A no-op when it is already attached.
+            cursor.execute(f"ALTER INDEX idx_detection_logs_client_id ATTACH PARTITION {name}_client_id")
+
+    def _migrate_to_partitioned(self, conn):
+        """Turn the plain detection_logs table into the first partition of a partitioned one.
+
+        The slow steps run without blocking writes: the bound is added as a
+        NOT VALID check and validated separately, and the indexes the
+        partitioned table needs are built CONCURRENTLY. The swap itself is a
+        short transaction of catalog-only changes: rename, SET NOT NULL
+        (proven by the check), create the parent and ATTACH without a scan.
+        The old table becomes ``detection_logs_legacy`` and covers everything
+        before the start of next month.
+        """
+        cutover = _add_months(_month_start(datetime.now(timezone.utc)), 1)
+        logger.info(f"Migrating detection_logs to monthly partitions (legacy rows before {cutover:%Y-%m-%d})")
+        with conn.cursor() as cursor:
+            # Range partitions cannot hold NULL keys.
+            cursor.execute("UPDATE detection_logs SET timestamp = to_timestamp(0) WHERE timestamp IS NULL")
+            # ATTACH needs the same columns as the new parent.
+            cursor.execute("ALTER TABLE detection_logs ADD COLUMN IF NOT EXISTS client_id UUID")
+            cursor.execute("ALTER TABLE detection_logs DROP CONSTRAINT IF EXISTS detection_logs_legacy_bound")
+            cursor.execute(
+                "ALTER TABLE detection_logs ADD CONSTRAINT detection_logs_legacy_bound "
+                "CHECK (timestamp IS NOT NULL AND timestamp < %s) NOT VALID",
+                (cutover.isoformat(),),
+            )
+            cursor.execute("ALTER TABLE detection_logs VALIDATE CONSTRAINT detection_logs_legacy_bound")
+            self._create_index_concurrently(cursor, "detection_logs_legacy_id_ts", "detection_logs", "(id, timestamp)", unique=True)
+            self._create_index_concurrently(cursor, "idx_detection_logs_ts_id", "detection_logs", DETECTION_LOGS_LISTING_INDEX)
+
+        conn.autocommit = False
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(create_users_table)
-            cursor.execute(create_detection_logs_table)
-            cursor.execute(create_index)
+            with conn.cursor() as cursor:
+                cursor.execute("SET LOCAL lock_timeout = '5s'")
+                cursor.execute("ALTER TABLE detection_logs RENAME TO detection_logs_legacy")
+                cursor.execute("ALTER INDEX idx_detection_logs_ts_id RENAME TO detection_logs_legacy_ts_id")
+                cursor.execute("ALTER TABLE detection_logs_legacy ALTER COLUMN timestamp SET NOT NULL")
+                # ATTACH only reuses an index for the parent's primary key if
+                # it backs a constraint, so promote the prebuilt one.
+                cursor.execute(
+                    "ALTER TABLE detection_logs_legacy DROP CONSTRAINT detection_logs_pkey, "
+                    "ADD CONSTRAINT detection_logs_legacy_pkey PRIMARY KEY USING INDEX detection_logs_legacy_id_ts"
+                )
+                cursor.execute(DETECTION_LOGS_PARTITIONED_DDL)
+                cursor.execute("ALTER SEQUENCE detection_logs_id_seq OWNED BY detection_logs.id")
+                cursor.execute(f"CREATE INDEX idx_detection_logs_ts_id ON detection_logs {DETECTION_LOGS_LISTING_INDEX}")
+                cursor.execute(
+                    "ALTER TABLE detection_logs ATTACH PARTITION detection_logs_legacy "
+                    "FOR VALUES FROM (MINVALUE) TO (%s)",
+                    (cutover.isoformat(),),
+                )
             conn.commit()
-            logger.info("Database tables created successfully")
-        except Exception as e:
-            logger.error(f"Error creating tables: {e}")
+        except Exception:
             conn.rollback()
+            raise
         finally:
-            cursor.close()
-            self.return_connection(conn)
+            conn.autocommit = True
+        logger.info("detection_logs is now partitioned; old rows live in detection_logs_legacy")
+
+    def _partitions(self, cursor):
+        cursor.execute(
+            """
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'detection_logs'::regclass
+            """
+        )
+        partitions = []
+        for name, bound in cursor.fetchall():
+            match = _BOUND.search(bound or "")
+            if match:
+                partitions.append((name, _parse_bound(match.group(1)), _parse_bound(match.group(2))))
+        return partitions
+
+    def _maintain_partitions(self, conn, now=None):
+        """Create the coming months' partitions and drop those past retention."""
+        now = now or datetime.now(timezone.utc)
+        created, dropped = [], []
+        with conn.cursor() as cursor:
+            # Partition bounds are printed in the session time zone.
+            cursor.execute("SET TIME ZONE 'UTC'")
+            try:
+                partitions = self._partitions(cursor)
+            finally:
+                cursor.execute("RESET TIME ZONE")
+            start = _month_start(now)
+            for month in range(self.partition_premake_months + 1):
+                low = _add_months(start, month)
+                high = _add_months(low, 1)
+                overlaps = any(
+                    (p_low is None or p_low < high) and (p_high is None or low < p_high)
+                    for _, p_low, p_high in partitions
+                )
+                if overlaps:
+                    continue
+                name = f"detection_logs_p{low:%Y%m}"
+                cursor.execute(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF detection_logs FOR VALUES FROM (%s) TO (%s)",
+                    (low.isoformat(), high.isoformat()),
+                )
+                partitions.append((name, low, high))
+                created.append(name)
+
+            if self.retention_months > 0:
+                cutoff = _add_months(start, -self.retention_months)
+                for name, _, high in partitions:
+                    if high is not None and high <= cutoff:
+                        cursor.execute("SET lock_timeout = '5s'")
+                        cursor.execute(f"ALTER TABLE detection_logs DETACH PARTITION {name}")
+                        cursor.execute(f"DROP TABLE IF EXISTS {name}")
+                        cursor.execute("RESET lock_timeout")
+                        dropped.append(name)
+        if created or dropped:
+            logger.info(f"detection_logs partitions created: {created or 'none'}, dropped: {dropped or 'none'}")
+        self.last_partition_maintenance = {
+            "at": now.isoformat(),
+            "created": created,
+            "dropped": dropped,
+            "partitions": len(partitions) - len(dropped),
+        }
+        return self.last_partition_maintenance
+
+    def maintain_partitions(self, now=None):
+        """Run partition upkeep unless another worker is already doing it."""
+        if not self.partitioned:
+            return None
+        with self._schema_connection(wait=False) as conn:
+            if conn is None:
+                return None
+            return self._maintain_partitions(conn, now)
+
+    def start_partition_maintenance(self, interval_s=6 * 3600):
+        if not self.partitioned or self._maintenance is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval_s):
+                try:
+                    self.maintain_partitions()
+                except Exception as e:
+                    logger.warning(f"detection_logs partition maintenance failed: {e}")
+
+        self._maintenance = threading.Thread(target=run, name="neon-partition-maintenance", daemon=True)
+        self._maintenance.start()
+
+    def get_detection_logs(self, limit=100, offset=0, cursor=None):
+        """Retrieve detection logs, newest first.
+
+        ``cursor`` is a decoded ``(timestamp, id)`` pair; when given, the page
+        is a keyset seek past that row and ``offset`` is ignored.
+        """
+        if cursor is not None:
+            # The plain timestamp bound lets the planner prune newer partitions.
+            query = """
+            SELECT * FROM detection_logs
+            WHERE timestamp <= %s AND (timestamp, id) < (%s, %s)
+            ORDER BY timestamp DESC, id DESC
+            LIMIT %s;
+            """
+            return self.execute_query(query, (cursor[0], cursor[0], cursor[1], limit))
 
-    def get_detection_logs(self, limit=100, offset=0):
-        """Retrieve detection logs"""
         query = """
         SELECT * FROM detection_logs 
-        ORDER BY timestamp DESC 
+        ORDER BY timestamp DESC, id DESC 
         LIMIT %s OFFSET %s;
         """
         return self.execute_query(query, (limit, offset))
 
+    def iter_detection_logs(self, start_date=None, end_date=None, page_size=1000):
+        """All detection logs in a date range, newest first, read in keyset pages.
+
+        Each page borrows a pooled connection only while it is fetched.
+        """
+        clauses, params = [], []
+        if start_date:
+            clauses.append("timestamp >= %s")
+            params.append(start_date)
+        if end_date:
+            clauses.append("timestamp <= %s")
+            params.append(end_date)
+        cursor = None
+        while True:
+            where, args = list(clauses), list(params)
+            if cursor is not None:
+                where.append("timestamp <= %s AND (timestamp, id) < (%s, %s)")
+                args += [cursor[0], cursor[0], cursor[1]]
+            query = "SELECT * FROM detection_logs"
+            if where:
+                query += " WHERE " + " AND ".join(where)
+            query += " ORDER BY timestamp DESC, id DESC LIMIT %s"
+            rows = self.execute_query(query, args + [page_size])
+            yield from rows
+            if len(rows) < page_size:
+                return
+            cursor = (rows[-1]["timestamp"], rows[-1]["id"])
+
     def save_detection_log(self, filename, prediction, confidence, user_id=None):
         """Save a detection log to the database"""
         query = """
@@ -121,13 +673,146 @@ class NeonDB:
         VALUES (%s, %s, %s, %s)
         RETURNING id, timestamp;
         """
-        result = self.execute_query_single(query, (filename, prediction, confidence, user_id))
+        with STAGE_SECONDS.labels(stage="neon_insert").time():
+            result = self.execute_query_single(query, (filename, prediction, confidence, user_id), commit=True)
         return result
 
+    def save_detection_logs(self, rows):
+        """Insert several detection logs with one multi-row INSERT.
+
+        ``rows`` are dicts with the ``save_detection_log`` arguments plus an
+        optional ``client_id`` (UUID) and ``timestamp``. A row whose
+        ``(client_id, timestamp)`` is already stored is skipped, so replaying
+        a batch never inserts it twice; pass both to make a retry
+        idempotent. Returns the ``id``/``timestamp`` rows in the same order
+        as ``rows``, with None for skipped rows. The batch is committed as
+        one transaction: all rows or none.
+        """
+        if not rows:
+            return []
+        query = """
+        INSERT INTO detection_logs (filename, prediction, confidence, user_id, client_id, timestamp)
+        VALUES %s
+        ON CONFLICT (client_id, timestamp) DO NOTHING
+        RETURNING id, timestamp, client_id;
+        """
+        now = datetime.now(timezone.utc)
+        values = [
+            (row["filename"], row["prediction"], float(row["confidence"]),
+             int(row["user_id"]) if row.get("user_id") is not None else None,
+             str(row.get("client_id") or uuid.uuid4()), row.get("timestamp") or now)
+            for row in rows
+        ]
+        with STAGE_SECONDS.labels(stage="neon_insert").time(), span("neon.insert_batch", rows=len(values)), self.connection() as conn:
+            try:
+                # A pooled connection left in autocommit would commit per statement.
+                conn.autocommit = False
+                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                    returned = execute_values(
+                        cursor, query, values, template="(%s, %s, %s, %s, %s::uuid, %s::timestamptz)",
+                        page_size=len(values), fetch=True,
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+        # RETURNING order is not guaranteed, so rows are matched back to
+        # their input by client_id.
+        by_client_id = {str(row["client_id"]): {"id": row["id"], "timestamp": row["timestamp"]} for row in returned}
+        return [by_client_id.get(value[4]) for value in values]
+
     def close(self):
         """Close all database connections"""
+        self._stop.set()
         if self.pool:
             self.pool.closeall()
 
+
+class DetectionLogBatcher:
+    """Coalesces detection-log inserts from concurrent callers.
+
+    ``submit`` buffers a row and returns a Future that resolves to its
+    ``id``/``timestamp`` row (None if its ``client_id`` was already stored). A background thread writes the buffer with
+    ``save_detection_logs`` once it holds ``batch_size`` rows or its oldest
+    row has waited ``max_delay_ms``. If a batch fails, all its futures get
+    the exception.
+    """
+
+    def __init__(self, database, batch_size=100, max_delay_ms=20):
+        self.database = database
+        self.batch_size = max(1, batch_size)
+        self.max_delay_s = max_delay_ms / 1000.0
+        self._buffer = []  # (row, future, submitted_at)
+        self._cond = threading.Condition()
+        self._stopping = False
+        self.submitted = 0
+        self.inserted = 0
+        self.batches = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._run, name="neon-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, row):
+        future = Future()
+        with self._cond:
+            if self._stopping:
+                raise Exception("Detection log batcher is stopped")
+            self._buffer.append((row, future, time.monotonic()))
+            self.submitted += 1
+            if len(self._buffer) == 1 or len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+        return future
+
+    def _take(self):
+        with self._cond:
+            while not self._buffer and not self._stopping:
+                self._cond.wait()
+            while self._buffer and len(self._buffer) < self.batch_size and not self._stopping:
+                remaining = self._buffer[0][2] + self.max_delay_s - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._buffer[:self.batch_size]
+            del self._buffer[:self.batch_size]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if not batch:
+                return
+            try:
+                results = self.database.save_detection_logs([row for row, _, _ in batch])
+            except Exception as e:
+                self.failed += len(batch)
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            self.inserted += len(batch)
+            self.batches += 1
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def stop(self, timeout=10.0):
+        """Write what is buffered, then stop the worker."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            pending = len(self._buffer)
+        return {
+            "submitted": self.submitted,
+            "inserted": self.inserted,
+            "batches": self.batches,
+            "failed": self.failed,
+            "pending": pending,
+            "avg_batch_size": round(self.inserted / self.batches, 2) if self.batches else 0.0,
+        }
+
+
 # Initialize database connection
 db = NeonDB()
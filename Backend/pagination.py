@@ -0,0 +1,53 @@
+import base64
+import json
+from typing import Any, Dict, Optional, Tuple
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor we did not issue."""
+
+
+def encode_cursor(timestamp: Any, item_id: Any, source: Optional[str] = None) -> str:
+    """Opaque keyset cursor pointing just past ``(timestamp, id)``.
+
+    Lists are ordered by timestamp, then id, both descending; the next page
+    holds the items that sort strictly after this pair. ``source`` names the
+    backend that issued the cursor, so the next page is read from the same one.
+    """
+    if hasattr(timestamp, "isoformat"):
+        timestamp = timestamp.isoformat()
+    data = {"ts": timestamp, "id": item_id}
+    if source:
+        data["src"] = source
+    raw = json.dumps(data, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _parse(token: str) -> Dict[str, Any]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        data = json.loads(raw)
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor("Malformed cursor") from exc
+    if not isinstance(data, dict) or "ts" not in data or "id" not in data:
+        raise InvalidCursor("Malformed cursor")
+    return data
+
+
+def decode_cursor(token: Optional[str]) -> Optional[Tuple[Any, Any]]:
+    """Return ``(timestamp, id)`` for ``token``, or None for an empty token."""
+    if not token:
+        return None
+    data = _parse(token)
+    return data["ts"], data["id"]
+
+
+def cursor_source(token: Optional[str]) -> Optional[str]:
+    """The backend that issued ``token``; None if empty or issued before tagging."""
+    if not token:
+        return None
+    return _parse(token).get("src")
+
+
+def cursor_for(item: Dict[str, Any], source: Optional[str] = None) -> str:
+    return encode_cursor(item.get("timestamp"), item.get("id"), source)
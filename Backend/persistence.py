@@ -0,0 +1,285 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from log_store import FileLock, atomic_write_lines
+
+logger = logging.getLogger(__name__)
+
+
+class _SinkState:
+    """Queue, spool and counters for one sink."""
+
+    def __init__(self, name: str, write_batch: Callable[[List[Dict[str, Any]]], Any], spool_path: str) -> None:
+        self.name = name
+        self.write_batch = write_batch
+        self.spool_path = spool_path
+        # Every worker process shares the spool: appends, reads and rewrites
+        # hold spool_lock, and only one process at a time replays.
+        self.spool_lock = FileLock(spool_path + ".lock")
+        self.replay_lock = FileLock(spool_path + ".replay.lock")
+        self.queue: Deque[Tuple[float, Dict[str, Any]]] = deque()
+        self.cond = threading.Condition()
+        self.thread: Optional[threading.Thread] = None
+        self.in_flight_since: Optional[float] = None
+        self.enqueued = 0
+        self.flushed = 0
+        self.batches = 0
+        self.retries = 0
+        self.spooled = 0
+        self.replayed = 0
+        self.dropped = 0
+        self.spool_pending = 0
+        self.last_flush_at: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.down_until = 0.0
+
+
+class WriteBehindWriter:
+    """Moves remote writes (Firestore, Neon) off the request path.
+
+    Each sink gets a bounded in-memory queue and a worker thread that flushes
+    it in batches of up to ``batch_size`` items, at least every
+    ``flush_interval_s``. A failed batch is retried with exponential backoff;
+    once ``max_retries`` is exhausted, or when the queue is full, items are
+    appended to a per-sink JSONL spool on disk and replayed after the next
+    successful flush. Items are dropped only if the spool itself cannot be
+    written. Several processes may share ``spool_dir``; the spool is guarded
+    by file locks, and replay can repeat a batch after a crash, so sinks
+    should make writes idempotent.
+    """
+
+    def __init__(
+        self,
+        spool_dir: str,
+        queue_size: int = 1000,
+        batch_size: int = 100,
+        flush_interval_s: float = 0.2,
+        max_retries: int = 5,
+        backoff_base_s: float = 0.5,
+        backoff_max_s: float = 30.0,
+    ) -> None:
+        self.spool_dir = spool_dir
+        self.queue_size = max(1, queue_size)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_s = flush_interval_s
+        self.max_retries = max(0, max_retries)
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self._sinks: Dict[str, _SinkState] = {}
+        self._stopping = threading.Event()
+        os.makedirs(spool_dir, exist_ok=True)
+
+    def register(self, name: str, write_batch: Callable[[List[Dict[str, Any]]], Any]) -> None:
+        """Add a sink; ``write_batch`` must raise if the batch was not stored."""
+        state = _SinkState(name, write_batch, os.path.join(self.spool_dir, f"{name}.jsonl"))
+        with state.spool_lock.shared():
+            state.spool_pending = len(self._read_spool(state))
+        self._sinks[name] = state
+        state.thread = threading.Thread(target=self._run, args=(state,), name=f"write-behind-{name}", daemon=True)
+        state.thread.start()
+
+    def has_sink(self, name: str) -> bool:
+        return name in self._sinks
+
+    def submit(self, name: str, item: Dict[str, Any]) -> bool:
+        """Queue ``item`` for sink ``name``; returns False if it had to be dropped."""
+        state = self._sinks[name]
+        with state.cond:
+            state.enqueued += 1
+            if len(state.queue) < self.queue_size and not self._stopping.is_set():
+                state.queue.append((time.time(), item))
+                if len(state.queue) >= self.batch_size:
+                    state.cond.notify()
+                return True
+        # Queue full (or shutting down): keep the item durable on disk instead.
+        return self._spool(state, [item])
+
+    # ----------------------------------------------------------------- worker
+
+    def _take_batch(self, state: _SinkState) -> List[Dict[str, Any]]:
+        with state.cond:
+            deadline = time.time() + self.flush_interval_s
+            while len(state.queue) < self.batch_size and not self._stopping.is_set():
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                state.cond.wait(remaining)
+            batch = []
+            while state.queue and len(batch) < self.batch_size:
+                enqueued_at, item = state.queue.popleft()
+                if state.in_flight_since is None or enqueued_at < state.in_flight_since:
+                    state.in_flight_since = enqueued_at
+                batch.append(item)
+            return batch
+
+    def _write_with_retries(self, state: _SinkState, batch: List[Dict[str, Any]]) -> bool:
+        attempt = 0
+        while True:
+            try:
+                state.write_batch(batch)
+                return True
+            except Exception as exc:
+                state.last_error = f"{type(exc).__name__}: {exc}"
+                if attempt >= self.max_retries or self._stopping.is_set():
+                    logger.warning("Write-behind sink %s failed %d times: %s", state.name, attempt + 1, exc)
+                    return False
+                delay = min(self.backoff_max_s, self.backoff_base_s * (2 ** attempt))
+                attempt += 1
+                state.retries += 1
+                time.sleep(delay)
+
+    def _flush(self, state: _SinkState, batch: List[Dict[str, Any]]) -> None:
+        if time.time() < state.down_until:
+            # Sink failed recently; don't hammer it, park the batch on disk.
+            self._spool(state, batch)
+        elif self._write_with_retries(state, batch):
+            state.flushed += len(batch)
+            state.batches += 1
+            state.last_flush_at = datetime.utcnow().isoformat()
+            state.down_until = 0.0
+            self._replay(state)
+        else:
+            state.down_until = time.time() + self.backoff_max_s
+            self._spool(state, batch)
+        state.in_flight_since = None
+
+    def _run(self, state: _SinkState) -> None:
+        # Replay anything left in the spool by a previous run.
+        self._replay(state)
+        while True:
+            batch = self._take_batch(state)
+            if batch:
+                self._flush(state, batch)
+            elif self._stopping.is_set():
+                return
+            elif time.time() >= state.down_until and self._spool_size(state):
+                # Idle with a backlog on disk (possibly left by another
+                # process): probe the sink by replaying it.
+                self._replay(state)
+
+    # ----------------------------------------------------------------- spool
+
+    def _spool(self, state: _SinkState, items: List[Dict[str, Any]]) -> bool:
+        try:
+            with state.spool_lock.exclusive():
+                with open(state.spool_path, "a") as f:
+                    for item in items:
+                        f.write(json.dumps(item, default=str) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                state.spool_pending += len(items)
+            state.spooled += len(items)
+            return True
+        except Exception as exc:
+            state.dropped += len(items)
+            logger.error("Dropping %d write(s) for %s, spool unavailable: %s", len(items), state.name, exc)
+            return False
+
+    @staticmethod
+    def _spool_size(state: _SinkState) -> int:
+        try:
+            return os.path.getsize(state.spool_path)
+        except OSError:
+            return 0
+
+    def _read_spool(self, state: _SinkState) -> List[Dict[str, Any]]:
+        if not os.path.exists(state.spool_path):
+            return []
+        items = []
+        with open(state.spool_path, "r") as f:
+            for line in f:
+                if line.strip():
+                    try:
+                        items.append(json.loads(line))
+                    except ValueError:
+                        continue
+        return items
+
+    def _replay(self, state: _SinkState) -> None:
+        if not self._spool_size(state):
+            state.spool_pending = 0
+            return
+        # A second process waits here and then sees the trimmed spool, so
+        # no batch is sent by two replayers.
+        with state.replay_lock.exclusive():
+            with state.spool_lock.shared():
+                items = self._read_spool(state)
+            if not items:
+                state.spool_pending = 0
+                return
+            done = 0
+            for start in range(0, len(items), self.batch_size):
+                batch = items[start:start + self.batch_size]
+                try:
+                    state.write_batch(batch)
+                except Exception as exc:
+                    state.last_error = f"{type(exc).__name__}: {exc}"
+                    state.down_until = time.time() + self.backoff_max_s
+                    break
+                done += len(batch)
+            if done:
+                with state.spool_lock.exclusive():
+                    # Only the replayer removes items and appends go to the
+                    # tail, so the first `done` items are still the ones sent.
+                    current = self._read_spool(state)
+                    atomic_write_lines(state.spool_path, (json.dumps(i, default=str) + "\n" for i in current[done:]))
+                    state.spool_pending = len(current) - done
+        if done:
+            state.replayed += done
+            state.flushed += done
+            logger.info("Replayed %d spooled write(s) to %s", done, state.name)
+
+    # ----------------------------------------------------------------- lifecycle
+
+    def drain(self, timeout: float = 10.0) -> None:
+        """Flush everything queued, then stop the workers.
+
+        Whatever cannot be written before ``timeout`` is spooled to disk.
+        """
+        self._stopping.set()
+        deadline = time.time() + timeout
+        for state in self._sinks.values():
+            with state.cond:
+                state.cond.notify_all()
+        for state in self._sinks.values():
+            if state.thread is not None:
+                state.thread.join(max(0.0, deadline - time.time()))
+        for state in self._sinks.values():
+            with state.cond:
+                leftover = [item for _, item in state.queue]
+                state.queue.clear()
+            if leftover:
+                self._spool(state, leftover)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        sinks = {}
+        for name, state in self._sinks.items():
+            with state.cond:
+                depth = len(state.queue)
+                oldest = state.queue[0][0] if state.queue else None
+            if state.in_flight_since is not None:
+                oldest = min(oldest or now, state.in_flight_since)
+            sinks[name] = {
+                "queue_depth": depth,
+                "queue_capacity": self.queue_size,
+                "flush_lag_ms": round((now - oldest) * 1000, 1) if oldest else 0.0,
+                "enqueued": state.enqueued,
+                "flushed": state.flushed,
+                "batches": state.batches,
+                "retries": state.retries,
+                "spooled": state.spooled,
+                "replayed": state.replayed,
+                "dropped": state.dropped,
+                "spool_pending": state.spool_pending,
+                "last_flush_at": state.last_flush_at,
+                "last_error": state.last_error,
+                "healthy": now >= state.down_until,
+            }
+        return {"sinks": sinks}
@@ -0,0 +1,224 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Work:
+    """One item travelling through the pipeline."""
+
+    __slots__ = ("payload", "future", "enqueued_at")
+
+    def __init__(self, payload: Any, future: Future) -> None:
+        self.payload = payload
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class StageStats:
+    """Counters for a single stage, safe to update from worker threads."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.errors = 0
+        self.busy_ms = 0.0
+        self.max_ms = 0.0
+        self.wait_ms = 0.0
+        self.batches = 0
+
+    def record(self, items: int, busy_ms: float, wait_ms: float, errors: int = 0) -> None:
+        with self._lock:
+            self.processed += items
+            self.errors += errors
+            self.busy_ms += busy_ms
+            self.max_ms = max(self.max_ms, busy_ms)
+            self.wait_ms += wait_ms
+            self.batches += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            batches = self.batches or 1
+            processed = self.processed or 1
+            return {
+                "processed": self.processed,
+                "errors": self.errors,
+                "batches": self.batches,
+                "avg_batch_size": round(self.processed / batches, 2),
+                "avg_busy_ms": round(self.busy_ms / batches, 2),
+                "max_busy_ms": round(self.max_ms, 2),
+                "avg_queue_wait_ms": round(self.wait_ms / processed, 2),
+            }
+
+
+class Stage:
+    """A pipeline stage: a bounded input queue drained by worker threads.
+
+    ``handler`` receives a list of payloads and returns a list of results of
+    the same length. Plain stages hand it one payload at a time; batching
+    stages (``max_batch > 1``) collect up to ``max_batch`` payloads, waiting
+    at most ``max_wait_ms`` after the first one arrives.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[List[Any]], List[Any]],
+        workers: int = 1,
+        queue_size: int = 64,
+        max_batch: int = 1,
+        max_wait_ms: float = 0.0,
+    ) -> None:
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.queue: "queue.Queue[Optional[_Work]]" = queue.Queue(maxsize=max(1, int(queue_size)))
+        self.stats = StageStats()
+        self.next_stage: Optional["Stage"] = None
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._run,
+                name=f"pipeline-{self.name}-{index}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, work: _Work, timeout: Optional[float] = None) -> None:
+        work.enqueued_at = time.perf_counter()
+        self.queue.put(work, timeout=timeout)
+
+    def stop(self) -> None:
+        for _ in self._threads:
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def _collect(self, first: _Work) -> List[_Work]:
+        batch = [first]
+        if self.max_batch == 1:
+            return batch
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                work = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if work is None:
+                # Put the stop marker back so the worker exits after this batch.
+                self.queue.put(None)
+                break
+            batch.append(work)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            first = self.queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            started = time.perf_counter()
+            wait_ms = sum((started - work.enqueued_at) * 1000 for work in batch)
+            live = [work for work in batch if not work.future.cancelled()]
+            if not live:
+                continue
+
+            try:
+                results = self.handler([work.payload for work in live])
+                if len(results) != len(live):
+                    raise RuntimeError(
+                        f"Stage {self.name} returned {len(results)} results for {len(live)} items"
+                    )
+            except Exception as exc:
+                busy_ms = (time.perf_counter() - started) * 1000
+                self.stats.record(len(live), busy_ms, wait_ms, errors=len(live))
+                logger.error("Pipeline stage %s failed: %s", self.name, exc)
+                for work in live:
+                    if not work.future.done():
+                        work.future.set_exception(exc)
+                continue
+
+            busy_ms = (time.perf_counter() - started) * 1000
+            self.stats.record(len(live), busy_ms, wait_ms)
+            for work, result in zip(live, results):
+                work.payload = result
+                if self.next_stage is None:
+                    if not work.future.done():
+                        work.future.set_result(result)
+                else:
+                    # Blocking put: a slow downstream stage applies backpressure here.
+                    self.next_stage.put(work)
+
+    def snapshot(self) -> Dict[str, Any]:
+        data = self.stats.snapshot()
+        data.update({
+            "workers": self.workers,
+            "max_batch": self.max_batch,
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+        })
+        return data
+
+
+class StagedPipeline:
+    """Chain of stages connected by bounded queues.
+
+    Each submitted payload flows through every stage in order and the
+    returned future resolves with the output of the last stage. Stages of
+    different submissions run concurrently, so throughput is bounded by the
+    slowest stage rather than the sum of all of them.
+    """
+
+    def __init__(self, stages: List[Stage]) -> None:
+        if not stages:
+            raise ValueError("StagedPipeline needs at least one stage")
+        self.stages = stages
+        for current, following in zip(stages, stages[1:]):
+            current.next_stage = following
+        self._started = False
+        self._lock = threading.Lock()
+
+    def start(self) -> "StagedPipeline":
+        with self._lock:
+            if not self._started:
+                for stage in self.stages:
+                    stage.start()
+                self._started = True
+        return self
+
+    def stop(self) -> None:
+        with self._lock:
+            if not self._started:
+                return
+            for stage in self.stages:
+                stage.stop()
+            self._started = False
+
+    def submit(self, payload: Any, timeout: Optional[float] = None) -> Future:
+        """Queue ``payload`` for processing.
+
+        Raises ``queue.Full`` if the first stage stays full for ``timeout``
+        seconds, which lets callers shed load instead of piling up threads.
+        """
+        self.start()
+        future: Future = Future()
+        work = _Work(payload, future)
+        self.stages[0].put(work, timeout=timeout)
+        return future
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._started,
+            "stages": {stage.name: stage.snapshot() for stage in self.stages},
+        }
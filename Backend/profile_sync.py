@@ -0,0 +1,142 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FIELDS = ("uid", "email", "name", "picture")
+
+
+def profile_fingerprint(user: Dict[str, Any]) -> str:
+    """Digest of the auth fields that end up in the user's profile document."""
+    raw = json.dumps([user.get(field) for field in PROFILE_FIELDS], default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ProfileSync:
+    """Keeps Firestore user profiles in step with auth claims without a write per request.
+
+    ``sync`` is called on every authenticated request. It remembers the
+    fingerprint last written for each uid and does nothing while the claims
+    are unchanged and younger than ``refresh_interval_s``. Otherwise the user
+    is queued; a background thread writes the queue every
+    ``flush_interval_s`` through ``write_batch``, so repeated requests from
+    one session collapse into a single write. A failed flush is not
+    recorded, and the next request for that uid queues it again.
+    """
+
+    def __init__(
+        self,
+        write_batch: Callable[[List[Dict[str, Any]]], Any],
+        refresh_interval_s: float = 3600.0,
+        flush_interval_s: float = 1.0,
+        max_entries: int = 10000,
+    ) -> None:
+        self.write_batch = write_batch
+        self.refresh_interval_s = refresh_interval_s
+        self.flush_interval_s = flush_interval_s
+        self.max_entries = max(1, max_entries)
+        self._written: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._cond = threading.Condition()
+        self._stopping = threading.Event()
+        self.requests = 0
+        self.skipped = 0
+        self.coalesced = 0
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self._thread = threading.Thread(target=self._run, name="profile-sync", daemon=True)
+        self._thread.start()
+
+    def sync(self, user: Dict[str, Any]) -> bool:
+        """Queue ``user`` for a profile write if needed; returns True if queued."""
+        uid = user.get("uid")
+        if not uid:
+            return False
+        fingerprint = profile_fingerprint(user)
+        now = time.time()
+        with self._cond:
+            self.requests += 1
+            last = self._written.get(uid)
+            if last is not None and last[0] == fingerprint and now - last[1] < self.refresh_interval_s:
+                self._written.move_to_end(uid)
+                self.skipped += 1
+                return False
+            if uid in self._pending:
+                self.coalesced += 1
+            self._pending[uid] = dict(user)
+            return True
+
+    def mark_written(self, user: Dict[str, Any]) -> None:
+        """Record a profile written synchronously elsewhere, e.g. by a profile update."""
+        uid = user.get("uid")
+        if not uid:
+            return
+        with self._cond:
+            self._pending.pop(uid, None)
+            self._remember(uid, profile_fingerprint(user), time.time())
+
+    def _remember(self, uid: str, fingerprint: str, written_at: float) -> None:
+        self._written[uid] = (fingerprint, written_at)
+        self._written.move_to_end(uid)
+        while len(self._written) > self.max_entries:
+            self._written.popitem(last=False)
+
+    # ----------------------------------------------------------------- worker
+
+    def flush(self) -> int:
+        """Write everything queued now; returns the number of profiles written."""
+        with self._cond:
+            users = list(self._pending.values())
+            self._pending.clear()
+        if not users:
+            return 0
+        try:
+            self.write_batch(users)
+        except Exception as exc:
+            self.failures += 1
+            self.last_error = f"{type(exc).__name__}: {exc}"
+            logger.warning("Profile sync failed for %d user(s): %s", len(users), exc)
+            return 0
+        now = time.time()
+        with self._cond:
+            for user in users:
+                # A newer version queued meanwhile must still be written.
+                if user["uid"] not in self._pending:
+                    self._remember(user["uid"], profile_fingerprint(user), now)
+            self.written += len(users)
+            self.batches += 1
+        return len(users)
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            with self._cond:
+                self._cond.wait(self.flush_interval_s)
+            self.flush()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopping.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "requests": self.requests,
+                "skipped": self.skipped,
+                "coalesced": self.coalesced,
+                "written": self.written,
+                "batches": self.batches,
+                "failures": self.failures,
+                "pending": len(self._pending),
+                "tracked_users": len(self._written),
+                "last_error": self.last_error,
+            }
@@ -0,0 +1,204 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+PROFILE_MODES = ("cpu", "torch", "alloc")
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another one is running."""
+
+
+class ProfilerUnavailable(Exception):
+    """Raised when a mode cannot run in this process (e.g. no PyTorch)."""
+
+
+def _frame_label(code: Any) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)})"
+
+
+def render_collapsed(stacks: Dict[str, int]) -> str:
+    """``frame;frame;frame count`` lines, as read by flamegraph.pl and speedscope."""
+    ordered = sorted(stacks.items(), key=lambda item: item[1], reverse=True)
+    return "".join(f"{stack} {count}\n" for stack, count in ordered)
+
+
+class LiveProfiler:
+    """Time-boxed profiles of the running process, one session at a time.
+
+    - ``cpu``: samples every thread's Python stack through
+      ``sys._current_frames()`` every ``interval_ms``. This is wall-clock
+      sampling, so threads blocked on a queue or socket show up where they
+      wait.
+    - ``torch``: ``torch.profiler`` over all threads, which covers the
+      inference thread of the upload pipeline; operators are aggregated by
+      self CPU time and stacked by how they nest.
+    - ``alloc``: two ``tracemalloc`` snapshots ``seconds`` apart; reports
+      the memory allocated in between and still alive at the end.
+      tracemalloc is only switched on for the session unless it was
+      already tracing.
+
+    ``run`` blocks the calling thread for ``seconds`` and returns
+    ``{"mode", "seconds", "samples", "top", "collapsed"}`` where
+    ``collapsed`` maps ``;``-joined stacks (root first) to sample counts,
+    microseconds or bytes. A second ``run`` while one is active raises
+    ``ProfilerBusy``.
+    """
+
+    def __init__(self, max_seconds: int = 60, interval_ms: int = 5, alloc_frames: int = 25) -> None:
+        self.max_seconds = max(1, max_seconds)
+        self.interval_s = max(1, interval_ms) / 1000.0
+        self.alloc_frames = max(1, alloc_frames)
+        self._lock = threading.Lock()
+        self.active: Optional[Dict[str, Any]] = None
+        self.completed = 0
+
+    def run(self, mode: str, seconds: float, top: int = 30) -> Dict[str, Any]:
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"mode must be one of {', '.join(PROFILE_MODES)}")
+        seconds = max(0.1, min(float(seconds), float(self.max_seconds)))
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("another profile is already running")
+        try:
+            self.active = {"mode": mode, "seconds": seconds, "started_at": time.time()}
+            result = getattr(self, f"_profile_{mode}")(seconds, max(1, top))
+            self.completed += 1
+            return {"mode": mode, "seconds": seconds, **result}
+        finally:
+            self.active = None
+            self._lock.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"active": dict(self.active) if self.active else None, "completed": self.completed}
+
+    # ----------------------------------------------------------------- cpu
+
+    def _profile_cpu(self, seconds: float, top: int) -> Dict[str, Any]:
+        stacks: Dict[str, int] = {}
+        self_counts: Dict[str, int] = {}
+        total_counts: Dict[str, int] = {}
+        samples = 0
+        # The thread waiting for this profile would only ever show up asleep.
+        skip = {threading.get_ident()}
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident in skip:
+                    continue
+                frames: List[str] = []
+                while frame is not None:
+                    frames.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                if not frames:
+                    continue
+                frames.reverse()
+                key = ";".join([names.get(ident, f"thread-{ident}")] + frames)
+                stacks[key] = stacks.get(key, 0) + 1
+                self_counts[frames[-1]] = self_counts.get(frames[-1], 0) + 1
+                for label in set(frames):
+                    total_counts[label] = total_counts.get(label, 0) + 1
+            samples += 1
+            time.sleep(self.interval_s)
+
+        ranked = sorted(self_counts.items(), key=lambda item: item[1], reverse=True)[:top]
+        return {
+            "samples": samples,
+            "interval_ms": round(self.interval_s * 1000, 3),
+            "top": [
+                {
+                    "function": label,
+                    "self_samples": count,
+                    "total_samples": total_counts[label],
+                    "self_pct": round(100.0 * count / max(1, sum(self_counts.values())), 2),
+                }
+                for label, count in ranked
+            ],
+            "collapsed": stacks,
+        }
+
+    # ----------------------------------------------------------------- torch
+
+    def _profile_torch(self, seconds: float, top: int) -> Dict[str, Any]:
+        try:
+            from torch.profiler import ProfilerActivity, profile
+            from torch._C._profiler import _ExperimentalConfig
+        except ImportError:
+            raise ProfilerUnavailable("PyTorch is not installed")
+        try:
+            # Inference runs on pipeline threads, not the one asking for the profile.
+            config = _ExperimentalConfig(profile_all_threads=True)
+        except TypeError:
+            raise ProfilerUnavailable("this PyTorch version cannot profile other threads")
+
+        with profile(activities=[ProfilerActivity.CPU], experimental_config=config) as prof:
+            time.sleep(seconds)
+
+        averages = prof.key_averages()
+        ranked = sorted(averages, key=lambda event: event.self_cpu_time_total, reverse=True)[:top]
+        # Python stacks are not recorded for other threads, so the flame
+        # graph is built from operator nesting, weighted by self time (us).
+        stacks: Dict[str, int] = {}
+        for event in prof.events():
+            names = []
+            parent = event
+            while parent is not None:
+                names.append(parent.name)
+                parent = parent.cpu_parent
+            names.append(f"thread-{event.thread}")
+            key = ";".join(reversed(names))
+            stacks[key] = stacks.get(key, 0) + int(event.self_cpu_time_total)
+        return {
+            "samples": sum(event.count for event in averages),
+            "top": [
+                {
+                    "operator": event.key,
+                    "calls": event.count,
+                    "self_cpu_ms": round(event.self_cpu_time_total / 1000.0, 3),
+                    "cpu_total_ms": round(event.cpu_time_total / 1000.0, 3),
+                }
+                for event in ranked
+            ],
+            "collapsed": stacks,
+        }
+
+    # ----------------------------------------------------------------- alloc
+
+    def _profile_alloc(self, seconds: float, top: int) -> Dict[str, Any]:
+        started_here = not tracemalloc.is_tracing()
+        if started_here:
+            tracemalloc.start(self.alloc_frames)
+        try:
+            ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+            before = tracemalloc.take_snapshot().filter_traces(ignore)
+            time.sleep(seconds)
+            after = tracemalloc.take_snapshot().filter_traces(ignore)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            if started_here:
+                tracemalloc.stop()
+
+        by_line = [stat for stat in after.compare_to(before, "lineno") if stat.size_diff > 0][:top]
+        stacks: Dict[str, int] = {}
+        for stat in after.compare_to(before, "traceback"):
+            if stat.size_diff <= 0:
+                continue
+            key = ";".join(f"{os.path.basename(frame.filename)}:{frame.lineno}" for frame in stat.traceback)
+            stacks[key] = stacks.get(key, 0) + stat.size_diff
+        return {
+            "samples": len(after.traces),
+            "peak_traced_kb": round(peak / 1024.0, 1),
+            "top": [
+                {
+                    "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    "size_diff_kb": round(stat.size_diff / 1024.0, 1),
+                    "count_diff": stat.count_diff,
+                    "size_kb": round(stat.size / 1024.0, 1),
+                }
+                for stat in by_line
+            ],
+            "collapsed": stacks,
+        }
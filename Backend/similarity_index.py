@@ -0,0 +1,398 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+META_DTYPE = np.dtype([
+    ("log_id", "S40"),
+    ("user_id", "S40"),
+    ("filename", "S160"),
+    ("prediction", "S8"),
+    ("confidence", "<f4"),
+    ("timestamp", "S32"),
+])
+
+
+def _kmeans(data: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means over L2-normalized rows; returns normalized centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _nearest(data, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, data)
+        counts = np.bincount(assignments, minlength=k)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty clusters from random points so every list gets used.
+            sums[empty] = data[rng.choice(len(data), size=int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.maximum(norms, 1e-12)
+    return centroids.astype(np.float32)
+
+
+def _nearest(data: np.ndarray, centroids: np.ndarray, chunk: int = 16384) -> np.ndarray:
+    out = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), chunk):
+        block = np.asarray(data[start:start + chunk], dtype=np.float32)
+        out[start:start + chunk] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+class SimilarityIndex:
+    """Append-only, memory-mapped IVF index over cosine-normalized embeddings.
+
+    Vectors are stored as float16 rows in ``vectors.f16`` with one fixed-width
+    metadata record per row in ``meta.bin``; both are memory-mapped, so
+    opening an index with millions of rows only stats a few files. Until
+    ``train_size`` vectors exist, searches scan every row. After that a
+    coarse k-means quantizer with ``nlist`` centroids is trained in the
+    background and queries only scan the ``nprobe`` closest inverted lists.
+    Rows of deleted logs are tombstoned in ``removed.i32`` and skipped by
+    searches; their vectors stay on disk.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        dim: int = 512,
+        nlist: int = 1024,
+        nprobe: int = 8,
+        train_size: Optional[int] = None,
+    ) -> None:
+        self.directory = directory
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_size = train_size or nlist * 32
+        self._lock = threading.RLock()
+        self._vec_path = os.path.join(directory, "vectors.f16")
+        self._meta_path = os.path.join(directory, "meta.bin")
+        self._assign_path = os.path.join(directory, "assign.i32")
+        self._centroids_path = os.path.join(directory, "centroids.npy")
+        self._info_path = os.path.join(directory, "index.json")
+        self._removed_path = os.path.join(directory, "removed.i32")
+        self._row_bytes = dim * 2
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: Optional[List[np.ndarray]] = None
+        self._pending: Dict[int, List[int]] = {}
+        self._maps: Dict[str, Any] = {}
+        self._id_rows: Optional[Dict[bytes, int]] = None
+        self._dead = np.zeros(0, dtype=bool)
+        self.removed = 0
+        self._training = False
+        self.count = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._open()
+
+    # ----------------------------------------------------------------- storage
+
+    def _open(self) -> None:
+        info = {}
+        if os.path.exists(self._info_path):
+            with open(self._info_path, "r") as f:
+                info = json.load(f)
+        if info.get("dim", self.dim) != self.dim:
+            raise ValueError(f"Index at {self.directory} has dim {info['dim']}, expected {self.dim}")
+
+        if os.path.exists(self._centroids_path):
+            self._centroids = np.load(self._centroids_path)
+            self.nlist = len(self._centroids)
+
+        counts = [
+            self._file_rows(self._vec_path, self._row_bytes),
+            self._file_rows(self._meta_path, META_DTYPE.itemsize),
+        ]
+        if self._centroids is not None:
+            counts.append(self._file_rows(self._assign_path, 4))
+        self.count = min(counts)
+
+        # A crash between the per-file appends can leave a partial row at the
+        # tail of some files; trim everything back to the last complete row.
+        self._truncate(self._vec_path, self.count * self._row_bytes)
+        self._truncate(self._meta_path, self.count * META_DTYPE.itemsize)
+        if self._centroids is not None:
+            self._truncate(self._assign_path, self.count * 4)
+
+        with open(self._info_path, "w") as f:
+            json.dump({"dim": self.dim, "nlist": self.nlist}, f)
+
+        if os.path.exists(self._removed_path):
+            removed = np.fromfile(self._removed_path, dtype=np.int32)
+            self._dead_rows(self.count)[removed[removed < self.count]] = True
+            self.removed = int(self._dead.sum())
+
+    @staticmethod
+    def _file_rows(path: str, row_bytes: int) -> int:
+        if not os.path.exists(path):
+            return 0
+        return os.path.getsize(path) // row_bytes
+
+    @staticmethod
+    def _truncate(path: str, size: int) -> None:
+        if os.path.exists(path) and os.path.getsize(path) != size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+
+    def _map(self, name: str, path: str, dtype: Any, shape: tuple, count: int) -> Any:
+        cached = self._maps.get(name)
+        if cached is not None and cached[0] == count:
+            return cached[1]
+        if count == 0:
+            return np.empty((0,) + shape[1:], dtype=dtype)
+        mapped = np.memmap(path, dtype=dtype, mode="r", shape=shape)
+        self._maps[name] = (count, mapped)
+        return mapped
+
+    def _vectors(self, count: int) -> np.ndarray:
+        return self._map("vectors", self._vec_path, np.float16, (count, self.dim), count)
+
+    def _meta(self, count: int) -> np.ndarray:
+        return self._map("meta", self._meta_path, META_DTYPE, (count,), count)
+
+    # ----------------------------------------------------------------- writes
+
+    def _normalize(self, vector: Any) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if vector.shape[0] != self.dim:
+            raise ValueError(f"Expected a {self.dim}-d embedding, got {vector.shape[0]}")
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else vector
+
+    def add(self, embedding: Any, metadata: Dict[str, Any]) -> int:
+        """Append one embedding with its log metadata; returns the row number."""
+        vector = self._normalize(embedding)
+        record = np.zeros(1, dtype=META_DTYPE)
+        record["log_id"] = str(metadata.get("log_id") or "").encode()[:40]
+        record["user_id"] = str(metadata.get("user_id") or "").encode()[:40]
+        record["filename"] = str(metadata.get("filename") or "").encode()[:160]
+        record["prediction"] = str(metadata.get("prediction") or "").encode()[:8]
+        record["confidence"] = float(metadata.get("confidence") or 0)
+        record["timestamp"] = str(metadata.get("timestamp") or "").encode()[:32]
+
+        with self._lock:
+            row = self.count
+            with open(self._vec_path, "ab") as f:
+                f.write(vector.astype(np.float16).tobytes())
+            with open(self._meta_path, "ab") as f:
+                f.write(record.tobytes())
+            if self._centroids is not None:
+                list_id = int(np.argmax(self._centroids @ vector))
+                with open(self._assign_path, "ab") as f:
+                    f.write(np.int32(list_id).tobytes())
+                if self._lists is not None:
+                    self._pending.setdefault(list_id, []).append(row)
+            self.count = row + 1
+            if self._id_rows is not None and record["log_id"][0]:
+                self._id_rows[bytes(record["log_id"][0])] = row
+
+            should_train = self._centroids is None and not self._training and self.count >= self.train_size
+            if should_train:
+                self._training = True
+        if should_train:
+            threading.Thread(target=self.train, name="similarity-index-train", daemon=True).start()
+        return row
+
+    def _dead_rows(self, count: int) -> np.ndarray:
+        """Tombstone mask covering at least ``count`` rows; caller holds the lock."""
+        if len(self._dead) < count:
+            grown = np.zeros(max(count, len(self._dead) * 2), dtype=bool)
+            grown[:len(self._dead)] = self._dead
+            self._dead = grown
+        return self._dead
+
+    def _tombstone(self, rows: np.ndarray) -> int:
+        dead = self._dead_rows(self.count)
+        rows = rows[~dead[rows]]
+        if len(rows):
+            with open(self._removed_path, "ab") as f:
+                f.write(rows.astype(np.int32).tobytes())
+            dead[rows] = True
+            self.removed += len(rows)
+        return len(rows)
+
+    def remove(self, log_id: str) -> bool:
+        """Hide the row of a deleted log from searches."""
+        with self._lock:
+            row = self.row_for_log_id(log_id)
+            if row is None:
+                return False
+            return self._tombstone(np.array([row], dtype=np.int64)) > 0
+
+    def remove_where(self, user_id: Optional[str] = None) -> int:
+        """Hide every row of ``user_id`` (all rows when None); returns how many."""
+        with self._lock:
+            count = self.count
+            if user_id is None:
+                rows = np.arange(count, dtype=np.int64)
+            else:
+                rows = np.flatnonzero(self._meta(count)["user_id"] == str(user_id).encode()[:40])
+            return self._tombstone(rows)
+
+    def train(self) -> None:
+        """Fit the coarse quantizer and assign every stored vector to a list."""
+        started = time.time()
+        try:
+            with self._lock:
+                count = self.count
+            vectors = self._vectors(count)
+            sample_size = min(count, self.nlist * 64)
+            rng = np.random.default_rng(0)
+            sample_rows = np.sort(rng.choice(count, size=sample_size, replace=False))
+            sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+            nlist = min(self.nlist, max(1, sample_size // 8))
+            centroids = _kmeans(sample, nlist)
+            assignments = _nearest(vectors, centroids)
+
+            with self._lock:
+                # Rows added while training ran get assigned here, under the lock.
+                if self.count > count:
+                    extra = _nearest(self._vectors(self.count)[count:], centroids)
+                    assignments = np.concatenate([assignments, extra])
+                tmp_path = self._assign_path + ".tmp"
+                assignments.astype(np.int32).tofile(tmp_path)
+                os.replace(tmp_path, self._assign_path)
+                np.save(self._centroids_path, centroids)
+                self._centroids = centroids
+                self.nlist = nlist
+                self._lists = None
+                self._pending = {}
+                with open(self._info_path, "w") as f:
+                    json.dump({"dim": self.dim, "nlist": self.nlist}, f)
+            logger.info(
+                "Similarity index trained: %d lists over %d vectors in %.1fs",
+                nlist, len(assignments), time.time() - started,
+            )
+        except Exception as exc:
+            logger.error("Similarity index training failed: %s", exc)
+        finally:
+            self._training = False
+
+    # ----------------------------------------------------------------- reads
+
+    def _inverted_lists(self) -> List[np.ndarray]:
+        # Built from self.count under the lock: rows appended after this point
+        # go to _pending, so every row is in exactly one of the two.
+        if self._lists is None:
+            assignments = np.fromfile(self._assign_path, dtype=np.int32, count=self.count)
+            order = np.argsort(assignments, kind="stable").astype(np.int64)
+            bounds = np.searchsorted(assignments[order], np.arange(self.nlist + 1))
+            self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(self.nlist)]
+            self._pending = {}
+        return self._lists
+
+    def _candidates(self, query: np.ndarray, count: int, nprobe: int) -> Optional[np.ndarray]:
+        with self._lock:
+            if self._centroids is None:
+                return None
+            lists = self._inverted_lists()
+            probes = np.argsort(-(self._centroids @ query))[:nprobe]
+            parts = [lists[p] for p in probes]
+            parts.extend(np.asarray(self._pending.get(int(p), []), dtype=np.int64) for p in probes)
+        rows = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+        rows = rows[rows < count]
+        rows.sort()
+        return rows
+
+    def row_for_log_id(self, log_id: str) -> Optional[int]:
+        with self._lock:
+            count = self.count
+            if self._id_rows is None:
+                ids = self._meta(count)["log_id"]
+                self._id_rows = {bytes(value): row for row, value in enumerate(ids) if value}
+            row = self._id_rows.get(str(log_id).encode()[:40])
+            if row is None or self._dead_rows(count)[row]:
+                return None
+            return row
+
+    def vector(self, row: int) -> np.ndarray:
+        return np.asarray(self._vectors(self.count)[row], dtype=np.float32)
+
+    def search(
+        self,
+        embedding: Any,
+        k: int = 10,
+        user_id: Optional[str] = None,
+        exclude_log_id: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Return the ``k`` most similar stored items by cosine similarity.
+
+        The user and exclusion filters apply before ranking. When the
+        ``nprobe`` closest lists hold fewer than ``k`` matching rows (e.g. a
+        user with few uploads), more lists are probed, doubling each time.
+        """
+        query = self._normalize(embedding)
+        with self._lock:
+            count = self.count
+            # Tombstones are only ever set, so a view is safe to read unlocked.
+            dead = self._dead_rows(count)[:count] if self.removed else None
+        if count == 0:
+            return []
+
+        vectors = self._vectors(count)
+        meta = self._meta(count)
+        user_key = user_id.encode()[:40] if user_id else None
+        exclude_key = exclude_log_id.encode()[:40] if exclude_log_id else None
+
+        def matching(rows: np.ndarray) -> np.ndarray:
+            if dead is not None:
+                rows = rows[~dead[rows]]
+            if user_key is not None and len(rows):
+                rows = rows[meta["user_id"][rows] == user_key]
+            if exclude_key is not None and len(rows):
+                rows = rows[meta["log_id"][rows] != exclude_key]
+            return rows
+
+        nprobe = self.nprobe
+        while True:
+            rows = self._candidates(query, count, nprobe)
+            if rows is None:
+                rows = matching(np.arange(count))
+                break
+            rows = matching(rows)
+            if len(rows) >= k or nprobe >= self.nlist:
+                break
+            nprobe *= 2
+
+        scores = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), 65536):
+            block = np.asarray(vectors[rows[start:start + 65536]], dtype=np.float32)
+            scores[start:start + len(block)] = block @ query
+
+        if len(scores) > k:
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for position in top:
+            record = meta[int(rows[position])]
+            results.append({
+                "log_id": record["log_id"].decode(),
+                "filename": record["filename"].decode(),
+                "prediction": record["prediction"].decode(),
+                "confidence": round(float(record["confidence"]), 2),
+                "timestamp": record["timestamp"].decode(),
+                "score": round(float(scores[position]), 4),
+            })
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "vectors": self.count,
+            "removed": self.removed,
+            "dim": self.dim,
+            "trained": self._centroids is not None,
+            "training": self._training,
+            "nlist": self.nlist if self._centroids is not None else 0,
+            "nprobe": self.nprobe,
+            "train_size": self.train_size,
+        }
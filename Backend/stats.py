@@ -0,0 +1,421 @@
+import json
+import logging
+import math
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from log_store import FileLock, atomic_write_lines, parse_utc
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = {"minute": 16, "hour": 13}  # bucket key = ISO timestamp prefix
+DIMENSIONS = ("prediction", "threat_level", "source_type")
+ALL_USERS = ""
+
+
+class LatencyHistogram:
+    """Log-bucketed histogram with bounded relative error (DDSketch-style).
+
+    A value ``v`` lands in bucket ``ceil(log(v) / log(gamma))``, so every
+    quantile is reported within ``relative_accuracy`` of a real sample.
+    Histograms merge by adding bucket counts, which is what lets per-minute
+    buckets roll up into any time range.
+    """
+
+    relative_accuracy = 0.01
+    gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+    _log_gamma = math.log(gamma)
+    min_value = 0.001
+
+    @classmethod
+    def index(cls, value: float) -> int:
+        return int(math.ceil(math.log(max(value, cls.min_value)) / cls._log_gamma))
+
+    @classmethod
+    def value(cls, index: int) -> float:
+        return 2 * cls.gamma ** index / (cls.gamma + 1)
+
+    @classmethod
+    def quantiles(cls, counts: Dict[int, int], qs: Iterable[float]) -> Dict[str, Optional[float]]:
+        total = sum(counts.values())
+        ordered = sorted(counts.items())
+        result: Dict[str, Optional[float]] = {}
+        for q in qs:
+            key = f"p{int(round(q * 100))}"
+            if not total:
+                result[key] = None
+                continue
+            rank = q * (total - 1)
+            seen = 0
+            for index, count in ordered:
+                seen += count
+                if seen > rank:
+                    result[key] = round(cls.value(index), 2)
+                    break
+        return result
+
+
+def _empty_bucket() -> Dict[str, Any]:
+    bucket: Dict[str, Any] = {"total": 0, "latency": {}}
+    for dimension in DIMENSIONS:
+        bucket[dimension] = {}
+    return bucket
+
+
+def _add_counts(into: Dict[Any, int], other: Dict[Any, int]) -> None:
+    for key, count in other.items():
+        merged = into.get(key, 0) + count
+        # Deletions are negative counts; a value that drops to zero goes away.
+        if merged:
+            into[key] = merged
+        else:
+            into.pop(key, None)
+
+
+def _merge_bucket(into: Dict[str, Any], other: Dict[str, Any]) -> None:
+    into["total"] += other["total"]
+    for dimension in DIMENSIONS:
+        _add_counts(into[dimension], other[dimension])
+    _add_counts(into["latency"], other["latency"])
+
+
+def _merge_rollups(into: Dict[str, Any], other: Dict[str, Any]) -> None:
+    for granularity, scopes in other.items():
+        for scope, buckets in scopes.items():
+            target = into.setdefault(granularity, {}).setdefault(scope, {})
+            for key, bucket in buckets.items():
+                merged = target.setdefault(key, _empty_bucket())
+                _merge_bucket(merged, bucket)
+                if not merged["total"]:
+                    del target[key]
+
+
+def _bucket_time(timestamp: Any) -> str:
+    """Naive-UTC ISO timestamp of an entry; entries without one count as now."""
+    return (parse_utc(timestamp) or datetime.utcnow()).isoformat()
+
+
+class DetectionStats:
+    """Per-minute and per-hour detection rollups, updated as logs are written.
+
+    Each bucket counts detections by prediction, threat level and source type
+    and keeps a latency histogram of ``processing_time_ms``. Buckets exist for
+    all users together and for each user, so ``/api/stats`` costs
+    O(buckets) whatever the size of the log.
+
+    Rollups are kept in one JSON file shared by all worker processes. Each
+    process records into an in-memory delta and merges it into the file under
+    an exclusive ``FileLock`` every ``flush_interval_s``. Reads combine the
+    file, reloaded when another process changed it, with the local delta.
+    ``remove`` takes a deleted entry back out of its buckets.
+
+    ``rebuild`` recomputes everything from the raw log and bumps the
+    ``generation`` stored in the file. A delta recorded under an older
+    generation describes entries the rebuild already read from the log, so
+    ``flush`` drops it instead of merging it. Records made in other
+    processes between the rebuild and their next flush are lost with it; a
+    rebuild is rare enough for that to be the better trade than counting
+    entries twice. The log is streamed without holding the record lock;
+    local records and removals made meanwhile are kept aside and folded in
+    by entry id, so each entry counts once whether or not the stream saw it.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        minute_retention_hours: int = 24,
+        hour_retention_days: int = 90,
+        flush_interval_s: float = 5.0,
+    ) -> None:
+        self.path = path
+        self.retention = {
+            "minute": timedelta(hours=minute_retention_hours),
+            "hour": timedelta(days=hour_retention_days),
+        }
+        self.flush_interval_s = flush_interval_s
+        self.file_lock = FileLock(path + ".lock")
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()  # one rebuild at a time per process
+        self._base: Dict[str, Any] = {}
+        self._delta: Dict[str, Any] = {}
+        self._flushing: Dict[str, Any] = {}  # delta being merged into the file
+        self._loaded_mtime_ns: Optional[int] = None
+        self._generation = 0  # rebuild generation the local delta belongs to
+        self._rebuild_events: Optional[List[Tuple[int, Dict[str, Any]]]] = None  # made during a rebuild's read
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self.rebuilt_at: Optional[str] = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._reload()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    # ----------------------------------------------------------------- writes
+
+    @staticmethod
+    def _add(rollups: Dict[str, Any], entry: Dict[str, Any], sign: int = 1) -> None:
+        moment = _bucket_time(entry.get("timestamp"))
+        latency = entry.get("processing_time_ms")
+        scopes = [ALL_USERS]
+        if entry.get("user_id"):
+            scopes.append(str(entry["user_id"]))
+        for granularity, width in GRANULARITIES.items():
+            key = moment[:width]
+            for scope in scopes:
+                bucket = rollups.setdefault(granularity, {}).setdefault(scope, {}).setdefault(key, _empty_bucket())
+                bucket["total"] += sign
+                for dimension in DIMENSIONS:
+                    value = str(entry.get(dimension) or "unknown")
+                    bucket[dimension][value] = bucket[dimension].get(value, 0) + sign
+                if isinstance(latency, (int, float)) and latency > 0:
+                    index = LatencyHistogram.index(float(latency))
+                    bucket["latency"][index] = bucket["latency"].get(index, 0) + sign
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            if self._rebuild_events is not None:
+                self._rebuild_events.append((1, entry))
+            else:
+                self._add(self._delta, entry)
+
+    def remove(self, entry: Dict[str, Any]) -> None:
+        """Subtract a deleted log entry from the buckets it was counted in."""
+        with self._lock:
+            if self._rebuild_events is not None:
+                self._rebuild_events.append((-1, entry))
+            else:
+                self._add(self._delta, entry, sign=-1)
+
+    # ----------------------------------------------------------------- persistence
+
+    def _read_file(self) -> Tuple[Dict[str, Any], int]:
+        """Rollups in the file and the rebuild generation they belong to."""
+        try:
+            with open(self.path, "r") as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            return {}, 0
+        except (OSError, ValueError) as exc:
+            logger.warning("Ignoring unreadable stats file %s: %s", self.path, exc)
+            return {}, 0
+        self.rebuilt_at = raw.get("rebuilt_at", self.rebuilt_at)
+        rollups = raw.get("rollups", {})
+        for scopes in rollups.values():
+            for buckets in scopes.values():
+                for bucket in buckets.values():
+                    bucket["latency"] = {int(i): c for i, c in bucket["latency"].items()}
+        return rollups, int(raw.get("generation", 0))
+
+    def _mtime_ns(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _reload(self) -> None:
+        with self.file_lock.shared():
+            mtime_ns = self._mtime_ns()
+            rollups, generation = self._read_file()
+        with self._lock:
+            self._base = rollups
+            self._loaded_mtime_ns = mtime_ns
+            self._adopt_generation(generation)
+
+    def _adopt_generation(self, generation: int) -> None:
+        """Follow a rebuild made elsewhere; the local delta predates it. Caller holds ``_lock``."""
+        if generation != self._generation:
+            if self._delta:
+                logger.info("Dropping detection stats recorded before rebuild generation %d", generation)
+            self._delta = {}
+            self._generation = generation
+
+    def _prune(self, rollups: Dict[str, Any], now: datetime) -> None:
+        for granularity, scopes in rollups.items():
+            width = GRANULARITIES.get(granularity)
+            if width is None:
+                continue
+            cutoff = (now - self.retention[granularity]).isoformat()[:width]
+            for scope in list(scopes):
+                buckets = scopes[scope]
+                for key in [k for k in buckets if k < cutoff]:
+                    del buckets[key]
+                if not buckets:
+                    del scopes[scope]
+
+    def _write(self, rollups: Dict[str, Any], generation: int) -> None:
+        payload = {"version": 1, "generation": generation, "rebuilt_at": self.rebuilt_at, "rollups": rollups}
+        atomic_write_lines(self.path, [json.dumps(payload, separators=(",", ":"))])
+
+    def flush(self) -> None:
+        """Merge this process's new records into the shared file."""
+        with self._lock:
+            delta, self._delta = self._delta, {}
+            generation = self._generation
+            self._flushing = delta
+        if not delta:
+            return
+        try:
+            with self.file_lock.exclusive():
+                rollups, file_generation = self._read_file()
+                if file_generation == generation:
+                    _merge_rollups(rollups, delta)
+                    self._prune(rollups, datetime.utcnow())
+                    self._write(rollups, generation)
+                else:
+                    logger.info("Dropping detection stats recorded before rebuild generation %d", file_generation)
+                mtime_ns = self._mtime_ns()
+        except Exception:
+            with self._lock:
+                _merge_rollups(self._delta, delta)
+                self._flushing = {}
+            raise
+        with self._lock:
+            self._base = rollups
+            self._flushing = {}
+            self._loaded_mtime_ns = mtime_ns
+            self._adopt_generation(file_generation)
+
+    def rebuild(self, read_entries: Callable[[], Iterable[Dict[str, Any]]]) -> int:
+        """Replace all rollups with ones computed from ``read_entries()``.
+
+        ``read_entries`` should stream the log; only the ids of the entries
+        read are kept. ``record`` and ``remove`` calls made while it runs are
+        queued, then applied to the new rollups unless the stream already
+        reflected them. Concurrent rebuilds in one process run one after another.
+        """
+        with self._rebuild_lock:
+            with self._lock:
+                # The delta so far describes entries the stream is about to read.
+                self._delta = {}
+                self._flushing = {}
+                self._rebuild_events = []
+            rollups: Dict[str, Any] = {}
+            counted: Set[str] = set()
+            count = 0
+            try:
+                for entry in read_entries():
+                    self._add(rollups, entry)
+                    if entry.get("id"):
+                        counted.add(str(entry["id"]))
+                    count += 1
+            except Exception:
+                with self._lock:
+                    for sign, entry in self._rebuild_events:
+                        self._add(self._delta, entry, sign=sign)
+                    self._rebuild_events = None
+                raise
+
+            with self.file_lock.exclusive():
+                _, generation = self._read_file()
+                generation += 1
+                late: Dict[str, Any] = {}
+                with self._lock:
+                    for sign, entry in self._rebuild_events:
+                        log_id = str(entry.get("id") or "")
+                        if sign > 0 and log_id in counted:
+                            continue  # appended before the stream reached it
+                        if sign < 0 and log_id and log_id not in counted:
+                            continue  # deleted before the stream reached it
+                        self._add(late, entry, sign=sign)
+                        if sign > 0:
+                            counted.add(log_id)
+                        else:
+                            counted.discard(log_id)
+                    self._rebuild_events = None
+                    self._delta = {}
+                    self._generation = generation
+                _merge_rollups(rollups, late)
+                self._prune(rollups, datetime.utcnow())
+                self.rebuilt_at = datetime.utcnow().isoformat()
+                self._write(rollups, generation)
+                mtime_ns = self._mtime_ns()
+            with self._lock:
+                self._base = rollups
+                self._loaded_mtime_ns = mtime_ns
+        logger.info("Rebuilt detection stats from %d log entries (generation %d)", count, generation)
+        return count
+
+    def start(self) -> None:
+        if self._flusher is not None:
+            return
+
+        def run() -> None:
+            while not self._stop.wait(self.flush_interval_s):
+                try:
+                    self.flush()
+                except Exception as exc:
+                    logger.warning("Detection stats flush failed: %s", exc)
+
+        self._flusher = threading.Thread(target=run, name="detection-stats-flush", daemon=True)
+        self._flusher.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        try:
+            self.flush()
+        except Exception as exc:
+            logger.warning("Detection stats flush failed: %s", exc)
+
+    # ----------------------------------------------------------------- reads
+
+    def summary(
+        self,
+        user_id: Optional[str] = None,
+        granularity: str = "hour",
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        """Buckets between ``since`` and ``until`` (naive UTC) plus their totals."""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {sorted(GRANULARITIES)}")
+        if self._mtime_ns() != self._loaded_mtime_ns:
+            self._reload()
+
+        width = GRANULARITIES[granularity]
+        until = until or datetime.utcnow()
+        since = since or until - (timedelta(hours=1) if granularity == "minute" else timedelta(days=1))
+        low, high = since.isoformat()[:width], until.isoformat()[:width]
+        scope = str(user_id) if user_id else ALL_USERS
+
+        selected: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for source in (self._base, self._flushing, self._delta):
+                for key, bucket in source.get(granularity, {}).get(scope, {}).items():
+                    if low <= key <= high:
+                        _merge_bucket(selected.setdefault(key, _empty_bucket()), bucket)
+
+        totals = _empty_bucket()
+        series: List[Dict[str, Any]] = []
+        for key in sorted(selected):
+            bucket = selected[key]
+            if bucket["total"] <= 0:
+                continue
+            _merge_bucket(totals, bucket)
+            series.append(self._render(key, bucket))
+        return {
+            "granularity": granularity,
+            "since": since.isoformat(),
+            "until": until.isoformat(),
+            "buckets": series,
+            "totals": self._render(None, totals),
+            "rebuilt_at": self.rebuilt_at,
+        }
+
+    @staticmethod
+    def _render(key: Optional[str], bucket: Dict[str, Any]) -> Dict[str, Any]:
+        latency = bucket["latency"]
+        rendered: Dict[str, Any] = {"total": bucket["total"]}
+        if key is not None:
+            rendered = {"bucket": key, **rendered}
+        for dimension in DIMENSIONS:
+            rendered[dimension] = dict(bucket[dimension])
+        rendered["latency_ms"] = {
+            "count": sum(latency.values()),
+            **LatencyHistogram.quantiles(latency, (0.5, 0.95, 0.99)),
+        }
+        return rendered
@@ -0,0 +1,299 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "verifixia-backend"
+
+
+class _Trace:
+    """Spans of one sampled trace, shared by every span in it."""
+
+    __slots__ = ("trace_id", "spans")
+
+    def __init__(self, trace_id: str) -> None:
+        self.trace_id = trace_id
+        self.spans: List[Dict[str, Any]] = []
+
+
+class Span:
+    """A timed operation; use ``tracer.span()`` rather than building one."""
+
+    __slots__ = ("tracer", "trace", "span_id", "parent_id", "name", "kind", "attributes", "start_ns", "error", "_token")
+
+    def __init__(self, tracer: "Tracer", trace: _Trace, parent_id: Optional[str], name: str, kind: str, attributes: Dict[str, Any]) -> None:
+        self.tracer = tracer
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.error: Optional[str] = None
+        self._token: Optional[contextvars.Token] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def __enter__(self) -> "Span":
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        if exc is not None and self.error is None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+        self.end()
+
+    def end(self) -> None:
+        self.tracer._finish(self, time.time_ns())
+
+
+class _NoopSpan:
+    """Returned when the current request is not sampled; every call is free."""
+
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("verifixia_span", default=None)
+
+
+class _MultiSpan:
+    """One span under each of several parents (a batch serving several traces)."""
+
+    def __init__(self, spans: List[Span]) -> None:
+        self.spans = spans
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        for span in self.spans:
+            span.set_attribute(key, value)
+
+    def __enter__(self) -> "_MultiSpan":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        for span in self.spans:
+            if exc is not None:
+                span.error = f"{exc_type.__name__}: {exc}"
+            span.end()
+
+
+class Tracer:
+    """Head-sampled spans kept in an in-memory ring buffer.
+
+    ``start_trace`` decides once per request whether it is traced
+    (``sample_rate``). Inside a sampled request ``span()`` records child
+    spans through a ``ContextVar``; outside one it returns ``NOOP_SPAN``
+    after a single context lookup, which is the whole cost when sampling is
+    off. Work handed to other threads carries ``current()`` along and
+    re-enters it with ``span(..., parent=...)``.
+
+    Finished spans go into a ring buffer of the last ``buffer_size`` spans.
+    With ``export_path``, every finished trace is also appended to that file
+    as one OTLP/JSON ``ExportTraceServiceRequest`` per line, which the
+    OpenTelemetry Collector's ``otlpjsonfile`` receiver can read.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, buffer_size: int = 5000, export_path: Optional[str] = None) -> None:
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.export_path = export_path
+        self._spans: Deque[Dict[str, Any]] = deque(maxlen=max(1, buffer_size))
+        self._export_lock = threading.Lock()
+        self.started = 0
+        self.sampled = 0
+        self.exported = 0
+
+    # ----------------------------------------------------------------- recording
+
+    def start_trace(self, name: str, **attributes: Any) -> Any:
+        """Root span for a request, or ``NOOP_SPAN`` if it is not sampled."""
+        self.started += 1
+        if self.sample_rate <= 0.0 or random.random() >= self.sample_rate:
+            return NOOP_SPAN
+        self.sampled += 1
+        trace = _Trace(os.urandom(16).hex())
+        return Span(self, trace, None, name, "server", attributes)
+
+    def span(self, name: str, parent: Optional[Span] = None, **attributes: Any) -> Any:
+        """Child span of ``parent`` or of the current span, if that is sampled."""
+        if parent is None:
+            parent = _current.get()
+            if parent is None:
+                return NOOP_SPAN
+        return Span(self, parent.trace, parent.span_id, name, "internal", attributes)
+
+    def batch_span(self, name: str, parents: Iterable[Optional[Span]], **attributes: Any) -> Any:
+        """A span under every sampled parent, for work shared by several requests."""
+        spans = [
+            Span(self, parent.trace, parent.span_id, name, "internal", dict(attributes))
+            for parent in parents
+            if parent is not None
+        ]
+        if not spans:
+            return NOOP_SPAN
+        return spans[0] if len(spans) == 1 else _MultiSpan(spans)
+
+    @staticmethod
+    def current() -> Optional[Span]:
+        return _current.get()
+
+    def traced(self, name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+        """Decorator form of ``span`` for hot functions."""
+        def decorate(fn: Callable[..., Any]) -> Callable[..., Any]:
+            @functools.wraps(fn)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                if _current.get() is None:
+                    return fn(*args, **kwargs)
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def _finish(self, span: Span, end_ns: int) -> None:
+        record = {
+            "trace_id": span.trace.trace_id,
+            "span_id": span.span_id,
+            "parent_span_id": span.parent_id,
+            "name": span.name,
+            "kind": span.kind,
+            "start_ns": span.start_ns,
+            "end_ns": end_ns,
+            "duration_ms": round((end_ns - span.start_ns) / 1e6, 3),
+            "attributes": span.attributes,
+            "error": span.error,
+        }
+        self._spans.append(record)
+        span.trace.spans.append(record)
+        if span.parent_id is None and self.export_path:
+            self._export(span.trace.spans)
+
+    # ----------------------------------------------------------------- reading
+
+    def traces(self, limit: int = 20, trace_id: Optional[str] = None, min_duration_ms: float = 0.0) -> List[Dict[str, Any]]:
+        """Buffered traces, newest first, each with its spans in start order."""
+        by_trace: Dict[str, List[Dict[str, Any]]] = {}
+        for record in list(self._spans):
+            if trace_id is None or record["trace_id"] == trace_id:
+                by_trace.setdefault(record["trace_id"], []).append(record)
+        result = []
+        for tid, spans in by_trace.items():
+            spans.sort(key=lambda record: record["start_ns"])
+            root = next((s for s in spans if s["parent_span_id"] is None), None)
+            duration = root["duration_ms"] if root else max(s["end_ns"] for s in spans) / 1e6 - spans[0]["start_ns"] / 1e6
+            if duration < min_duration_ms:
+                continue
+            result.append({
+                "trace_id": tid,
+                "name": root["name"] if root else spans[0]["name"],
+                "start_ns": spans[0]["start_ns"],
+                "duration_ms": round(duration, 3),
+                "spans": spans,
+            })
+        result.sort(key=lambda trace: trace["start_ns"], reverse=True)
+        return result[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sample_rate": self.sample_rate,
+            "requests_seen": self.started,
+            "requests_sampled": self.sampled,
+            "buffered_spans": len(self._spans),
+            "buffer_size": self._spans.maxlen,
+            "export_path": self.export_path,
+            "exported_traces": self.exported,
+        }
+
+    # ----------------------------------------------------------------- OTLP
+
+    def _export(self, spans: List[Dict[str, Any]]) -> None:
+        line = json.dumps(to_otlp(spans), separators=(",", ":")) + "\n"
+        try:
+            with self._export_lock, open(self.export_path, "a") as f:
+                f.write(line)
+            self.exported += 1
+        except OSError as exc:
+            logger.warning("Could not export trace to %s: %s", self.export_path, exc)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+_OTLP_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+
+def to_otlp(spans: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Span records as an OTLP/JSON ``ExportTraceServiceRequest``."""
+    otlp_spans = []
+    for record in spans:
+        span = {
+            "traceId": record["trace_id"],
+            "spanId": record["span_id"],
+            "name": record["name"],
+            "kind": _OTLP_KINDS.get(record["kind"], 1),
+            "startTimeUnixNano": str(record["start_ns"]),
+            "endTimeUnixNano": str(record["end_ns"]),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in record["attributes"].items()],
+            "status": {"code": 2, "message": record["error"]} if record["error"] else {"code": 1},
+        }
+        if record["parent_span_id"]:
+            span["parentSpanId"] = record["parent_span_id"]
+        otlp_spans.append(span)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": SERVICE_NAME}},
+                {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+            ]},
+            "scopeSpans": [{"scope": {"name": "verifixia.tracing"}, "spans": otlp_spans}],
+        }]
+    }
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+tracer = Tracer(
+    sample_rate=_env_float("TRACE_SAMPLE_RATE", 0.0),
+    buffer_size=int(_env_float("TRACE_BUFFER_SPANS", 5000)),
+    export_path=os.getenv("TRACE_EXPORT_FILE") or None,
+)
+span = tracer.span
+traced = tracer.traced
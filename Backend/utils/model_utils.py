@@ -7,7 +7,9 @@ from PIL import Image
 import numpy as np
 import os
 import time
-from typing import Dict, Tuple, Optional, Any
+from typing import Dict, List, Tuple, Optional, Any
+
+from tracing import traced
 
 class DeepfakeDetector(nn.Module):
     """Xception-based deepfake detection model"""
@@ -37,7 +39,8 @@ class DeepfakeDetector(nn.Module):
         self.fc = nn.Linear(512, 1)
         self.sigmoid = nn.Sigmoid()
 
-    def forward(self, x):
+    def forward_features(self, x):
+        """Return the 512-d global-pooled embedding that feeds the classifier"""
         # Entry flow
         x = self.relu(self.bn1(self.conv1(x)))
         x = self.relu(self.bn2(self.conv2(x)))
@@ -50,11 +53,16 @@ class DeepfakeDetector(nn.Module):
         x = self.relu(self.bn5(self.conv5(x)))
 
         x = self.global_pool(x)
-        x = x.view(x.size(0), -1)
-        x = self.dropout(x)
+        return x.view(x.size(0), -1)
+
+    def classify(self, features):
+        x = self.dropout(features)
         x = self.fc(x)
         return self.sigmoid(x)
 
+    def forward(self, x):
+        return self.classify(self.forward_features(x))
+
 
 class ModelUtils:
     """Utility class for model operations"""
@@ -80,6 +88,7 @@ class ModelUtils:
         return model, device
 
     @staticmethod
+    @traced("model.preprocess")
     def preprocess_image(image_path: str, image_size: int = 299) -> Tuple[torch.Tensor, float]:
         """Preprocess image for model input and return preprocessing time"""
         start_time = time.time()
@@ -97,18 +106,8 @@ class ModelUtils:
         return tensor, preprocessing_time
 
     @staticmethod
-    def predict_image(model: DeepfakeDetector, image_tensor: torch.Tensor, device: torch.device) -> Dict[str, Any]:
-        """Make prediction with detailed information"""
-        start_time = time.time()
-        
-        image_tensor = image_tensor.to(device)
-
-        with torch.no_grad():
-            output = model(image_tensor)
-            confidence_raw = output.item()
-            
-        inference_time = time.time() - start_time
-        
+    def summarize_output(confidence_raw: float) -> Dict[str, Any]:
+        """Turn a raw sigmoid output into prediction, confidence and threat level"""
         # Determine prediction
         prediction = "Fake" if confidence_raw > 0.5 else "Real"
         
@@ -131,9 +130,72 @@ class ModelUtils:
             "confidence": confidence_percent,
             "confidence_raw": confidence_raw,
             "threat_level": threat_level,
-            "inference_time_ms": round(inference_time * 1000, 2)
         }
 
+    @staticmethod
+    @traced("model.predict")
+    def predict_image(model: DeepfakeDetector, image_tensor: torch.Tensor, device: torch.device) -> Dict[str, Any]:
+        """Make prediction with detailed information"""
+        start_time = time.time()
+        
+        image_tensor = image_tensor.to(device)
+
+        with torch.no_grad():
+            output = model(image_tensor)
+            confidence_raw = output.item()
+            
+        inference_time = time.time() - start_time
+        
+        result = ModelUtils.summarize_output(confidence_raw)
+        result["inference_time_ms"] = round(inference_time * 1000, 2)
+        return result
+
+    @staticmethod
+    @traced("model.predict_batch")
+    def predict_batch(
+        model: DeepfakeDetector,
+        image_tensors: List[torch.Tensor],
+        device: torch.device,
+        return_embeddings: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Run one forward pass over several preprocessed images.
+
+        Each tensor is the (1, C, H, W) output of ``preprocess_image``. The
+        batch wall time is reported on every result, together with the
+        batch size so callers can amortise it. With ``return_embeddings``
+        each result also carries the pooled feature vector as a float32
+        NumPy array under ``"embedding"``.
+        """
+        if not image_tensors:
+            return []
+
+        start_time = time.time()
+        batch = torch.cat(image_tensors, dim=0).to(device)
+
+        with torch.no_grad():
+            features = model.forward_features(batch)
+            outputs = model.classify(features).view(-1).tolist()
+
+        inference_time_ms = round((time.time() - start_time) * 1000, 2)
+        embeddings = features.cpu().numpy().astype(np.float32) if return_embeddings else None
+
+        results = []
+        for index, confidence_raw in enumerate(outputs):
+            result = ModelUtils.summarize_output(confidence_raw)
+            result["inference_time_ms"] = inference_time_ms
+            result["batch_size"] = len(outputs)
+            if embeddings is not None:
+                result["embedding"] = embeddings[index]
+            results.append(result)
+        return results
+
+    @staticmethod
+    def embed_image(model: DeepfakeDetector, image_tensor: torch.Tensor, device: torch.device) -> np.ndarray:
+        """Return the pooled feature vector for one preprocessed image"""
+        with torch.no_grad():
+            features = model.forward_features(image_tensor.to(device))
+        return features[0].cpu().numpy().astype(np.float32)
+
     @staticmethod
     def get_model_info(model_path: str) -> Dict[str, Any]:
         """Get comprehensive information about the model"""
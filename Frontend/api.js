@@ -152,6 +152,70 @@ export async function clearDetectionLogs(sourceType = "") {
   return data;
 }
 
+export async function fetchDetectionStats(params = {}) {
+  const query = new URLSearchParams();
+  Object.entries(params).forEach(([key, value]) => {
+    if (value === undefined || value === null || value === "") return;
+    query.set(key, String(value));
+  });
+  const headers = await buildAuthHeaders();
+  const url = query.toString() ? `${API_BASE}/api/stats?${query.toString()}` : `${API_BASE}/api/stats`;
+  const res = await fetch(url, { headers });
+  const data = await res.json();
+  if (!res.ok || data?.error) {
+    throw new Error(data?.error || `Backend error: ${res.status}`);
+  }
+  return data;
+}
+
+// Calls onEntry for every new log entry and onReset when the client should refetch
+// /api/logs. Resolves to a function that closes the stream. The token travels in the
+// URL, so after an error the stream is reopened with a freshly read token and resumes
+// from the last event it saw.
+const LOG_STREAM_RETRY_MS = 3000;
+
+export async function subscribeDetectionLogs({ sourceType, onEntry, onReset } = {}) {
+  let source = null;
+  let retryTimer = null;
+  let lastEventId = null;
+  let closed = false;
+
+  const open = async () => {
+    const query = new URLSearchParams();
+    if (sourceType) query.set("source_type", sourceType);
+    if (lastEventId) query.set("last_event_id", lastEventId);
+    const token = await getAuthToken();
+    if (token) query.set("access_token", token);
+    if (closed) return;
+    source = new EventSource(`${API_BASE}/api/logs/stream?${query.toString()}`);
+    source.addEventListener("log", (event) => {
+      if (event.lastEventId) lastEventId = event.lastEventId;
+      onEntry?.(JSON.parse(event.data));
+    });
+    source.addEventListener("reset", (event) => {
+      if (event.lastEventId) lastEventId = event.lastEventId;
+      onReset?.();
+    });
+    source.addEventListener("error", () => {
+      // The browser would retry with the same, possibly expired, token.
+      source.close();
+      if (!closed && !retryTimer) {
+        retryTimer = setTimeout(() => {
+          retryTimer = null;
+          open();
+        }, LOG_STREAM_RETRY_MS);
+      }
+    });
+  };
+
+  await open();
+  return () => {
+    closed = true;
+    clearTimeout(retryTimer);
+    source?.close();
+  };
+}
+
 export async function logLiveEvent(payload) {
   const headers = await buildAuthHeaders({ "Content-Type": "application/json" });
   const res = await fetch(`${API_BASE}/api/live-events`, {